@@ -1,7 +1,8 @@
+import hmac
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from jose import jwt, JWTError
 
 from settings import settings
@@ -10,6 +11,7 @@ from auth.auth import oauth2_scheme
 from auth.schema import TokenData
 from user.schema import UserInDB
 from user.model import DBUser, UserType
+from lpr.model import DBLpr
 
 
 
@@ -64,3 +66,17 @@ async def get_admin_or_staff_user(current_user: DBUser = Depends(get_current_act
             detail="You do not have permission to perform this action"
         )
     return current_user
+
+
+async def get_authenticated_lpr(
+    x_lpr_id: int = Header(...),
+    x_lpr_token: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Authenticates an LPR calling the API with the auth_token it uses on the TCP channel.
+    """
+    lpr = await db.get(DBLpr, x_lpr_id)
+    if lpr is None or not lpr.is_active or not hmac.compare_digest(lpr.auth_token.encode(), x_lpr_token.encode()):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Authorization Error: Could not validate LPR credentials")
+    return lpr
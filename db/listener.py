@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from db.engine import engine
+
+logger = logging.getLogger(__name__)
+
+
+RECONNECT_DELAY = 2.0
+HEALTH_CHECK_INTERVAL = 5.0
+# Channel the gate access lists listen on; users, gates and cameras notify it
+ACCESS_CHANGES_CHANNEL = "access_changes"
+
+
+async def notify_channel(session: AsyncSession, channel: str, payload) -> None:
+    """
+    Queues a Postgres notification on the session's transaction. Listeners
+    receive it only once the transaction commits, and never if it rolls back.
+    """
+    await session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": str(payload)},
+    )
+
+
+class NotificationListener:
+    """
+    Dispatches Postgres LISTEN/NOTIFY messages to in-process handlers.
+
+    Keeps one dedicated connection per process. Notifications sent while the
+    connection was down are lost, so handlers can register an ``on_reconnect``
+    coroutine to resynchronise their state from the database.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Callable[[str], Awaitable]]] = {}
+        self.reconnect_handlers: List[Callable[[], Awaitable]] = []
+        self.connection: Optional[AsyncConnection] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str, handler: Callable[[str], Awaitable], on_reconnect: Optional[Callable[[], Awaitable]] = None):
+        self.handlers.setdefault(channel, []).append(handler)
+        if on_reconnect is not None:
+            self.reconnect_handlers.append(on_reconnect)
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def _dispatch(self, connection, pid, channel, payload):
+        for handler in self.handlers.get(channel, []):
+            asyncio.ensure_future(handler(payload))
+
+    async def _run(self):
+        first_connect = True
+        while True:
+            try:
+                connection = await engine.connect()
+                # Notifications are only delivered between transactions, so never sit inside one
+                self.connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+                raw_connection = await self.connection.get_raw_connection()
+                driver_connection = raw_connection.driver_connection
+                for channel in self.handlers:
+                    await driver_connection.add_listener(channel, self._dispatch)
+                logger.info(f"Listening for database notifications on {list(self.handlers)}")
+
+                if not first_connect:
+                    for handler in self.reconnect_handlers:
+                        await handler()
+                first_connect = False
+
+                while not driver_connection.is_closed():
+                    await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+                    await self.connection.execute(text("SELECT 1"))
+            except asyncio.CancelledError:
+                await self._close()
+                raise
+            except Exception as error:
+                logger.error(f"Database notification listener failed: {error}")
+            await self._close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _close(self):
+        if self.connection is None:
+            return
+        try:
+            # Listeners belong to the session; never hand it back to the pool with them attached
+            await self.connection.invalidate()
+        except Exception:
+            pass
+        self.connection = None
+
+
+db_listener = NotificationListener()
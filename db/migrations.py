@@ -0,0 +1,156 @@
+import logging
+from typing import List, Tuple
+from sqlalchemy import text
+
+from db.engine import engine
+
+logger = logging.getLogger(__name__)
+
+
+# Serialises migrations across workers that start at the same time
+MIGRATION_LOCK_KEY = 0x4D4947
+
+# Schema changes that Base.metadata.create_all cannot apply to existing
+# tables. Append only, never edit an applied migration: each one runs once
+# per database, in order, and every statement must also be harmless on a
+# database that create_all just built from the current models.
+MIGRATIONS: List[Tuple[str, List[str]]] = [
+    # Filling the components of existing vehicles and building the search and trigram
+    # indexes is left to python -m db.prepare_vehicle_search, which does it online.
+    ("0001_vehicle_plate_components", [
+        "ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS plate_first VARCHAR",
+        "ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS plate_letter VARCHAR",
+        "ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS plate_second VARCHAR",
+        "ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS plate_city_code INTEGER",
+        "ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS plate_type VARCHAR",
+    ]),
+    # The existing heap becomes the first partition of a new range-partitioned
+    # table as is, without copying rows; later rows go to daily/monthly partitions.
+    # On a large table run python -m db.prepare_traffic_partitioning first, which
+    # does the scans online; this then only takes brief locks.
+    ("0003_partition_traffic", [
+        """
+        DO $$
+        DECLARE
+            cutoff TIMESTAMP;
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'traffic'::regclass) THEN
+                RETURN;
+            END IF;
+
+            -- Covered by the primary key and the keyset indexes of 0004
+            DROP INDEX IF EXISTS ix_traffic_id, ix_traffic_camera_id, ix_traffic_vehicle_id;
+            ALTER TABLE traffic RENAME TO traffic_legacy;
+            ALTER TABLE traffic_legacy DROP CONSTRAINT IF EXISTS traffic_vehicle_id_fkey;
+            ALTER TABLE traffic_legacy DROP CONSTRAINT IF EXISTS traffic_pkey;
+            IF EXISTS (
+                SELECT 1 FROM pg_constraint
+                WHERE conrelid = 'traffic_legacy'::regclass AND conname = 'traffic_legacy_bounds' AND convalidated
+            ) THEN
+                -- Prepared online: the validated CHECKs spare SET NOT NULL and ATTACH their scans
+                SELECT substring(pg_get_constraintdef(oid) FROM '[0-9]{4}-[^'']+')::timestamp INTO cutoff
+                FROM pg_constraint WHERE conrelid = 'traffic_legacy'::regclass AND conname = 'traffic_legacy_bounds';
+                ALTER TABLE traffic_legacy ALTER COLUMN timestamp SET NOT NULL;
+                ALTER TABLE traffic_legacy ADD CONSTRAINT traffic_legacy_pkey PRIMARY KEY USING INDEX traffic_legacy_pkey;
+            ELSE
+                UPDATE traffic_legacy SET timestamp = 'epoch' WHERE timestamp IS NULL;
+                ALTER TABLE traffic_legacy ALTER COLUMN timestamp SET NOT NULL;
+                ALTER TABLE traffic_legacy ADD CONSTRAINT traffic_legacy_pkey PRIMARY KEY (id, timestamp);
+                SELECT greatest(date_trunc('day', now()), date_trunc('day', max(timestamp))) + interval '1 day'
+                INTO cutoff FROM traffic_legacy;
+                -- Validated once here, so ATTACH does not scan the table a second time
+                EXECUTE format(
+                    'ALTER TABLE traffic_legacy ADD CONSTRAINT traffic_legacy_bounds CHECK (timestamp < %L)',
+                    cutoff
+                );
+            END IF;
+
+            CREATE TABLE traffic (
+                id INTEGER NOT NULL DEFAULT nextval('traffic_id_seq'),
+                camera_id VARCHAR,
+                vehicle_id INTEGER REFERENCES vehicles (id),
+                timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                ocr_accuracy FLOAT,
+                vision_speed FLOAT,
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp);
+            ALTER SEQUENCE traffic_id_seq OWNED BY traffic.id;
+            ALTER TABLE traffic_legacy ALTER COLUMN id DROP DEFAULT;
+
+            EXECUTE format(
+                'ALTER TABLE traffic ATTACH PARTITION traffic_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+                cutoff
+            );
+        END
+        $$
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_traffic_timestamp_brin ON traffic USING brin (timestamp)",
+    ]),
+    ("0004_traffic_keyset_indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_traffic_camera_id_timestamp ON traffic (camera_id, timestamp DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_traffic_vehicle_id_timestamp ON traffic (vehicle_id, timestamp DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_traffic_timestamp_id ON traffic (timestamp DESC, id DESC)",
+    ]),
+    # The LPR's string camera id moves to source_camera_id; camera_id becomes a real FK.
+    # Existing rows are resolved by python -m traffic.backfill_camera_ids, in batches
+    # outside of startup; new rows get camera_id at ingest.
+    ("0005_traffic_camera_fk", [
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'traffic' AND column_name = 'source_camera_id'
+            ) THEN
+                RETURN;
+            END IF;
+
+            ALTER TABLE traffic RENAME COLUMN camera_id TO source_camera_id;
+            ALTER INDEX IF EXISTS ix_traffic_camera_id_timestamp RENAME TO ix_traffic_source_camera_id_timestamp;
+            ALTER TABLE traffic ADD COLUMN camera_id INTEGER REFERENCES cameras (id) ON DELETE SET NULL;
+        END
+        $$
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_traffic_camera_id_timestamp ON traffic (camera_id, timestamp DESC, id DESC)",
+    ]),
+    # Single-column indexes the primary key (id, timestamp) and the keyset indexes lead with;
+    # they only slowed down inserts. Left behind by create_all of older models and earlier runs
+    # of 0003 and 0005.
+    ("0006_drop_redundant_traffic_indexes", [
+        "DROP INDEX IF EXISTS ix_traffic_id, ix_traffic_camera_id, ix_traffic_source_camera_id, ix_traffic_vehicle_id",
+        "DROP INDEX IF EXISTS ix_traffic_legacy_id, ix_traffic_legacy_camera_id, ix_traffic_legacy_vehicle_id",
+    ]),
+]
+
+
+async def run_migrations():
+    """
+    Applies pending migrations, each in its own transaction, so a failing
+    one keeps those before it. Run after create_all.
+    """
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        await connection.commit()
+        try:
+            async with connection.begin():
+                await connection.execute(text(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                    "name VARCHAR PRIMARY KEY, applied_at TIMESTAMP NOT NULL DEFAULT now())"
+                ))
+                result = await connection.execute(text("SELECT name FROM schema_migrations"))
+                applied = set(result.scalars().all())
+
+            for name, statements in MIGRATIONS:
+                if name in applied:
+                    continue
+                logger.info(f"Applying migration {name}")
+                async with connection.begin():
+                    for statement in statements:
+                        await connection.execute(text(statement))
+                    await connection.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": name})
+                print(f"[INFO] Applied migration {name}")
+        finally:
+            await connection.rollback()
+            # The connection goes back to the pool, so drop the session lock explicitly
+            await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            await connection.commit()
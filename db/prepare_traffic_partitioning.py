@@ -0,0 +1,84 @@
+"""
+Does the slow part of migration 0003_partition_traffic online, so that on a
+large traffic table the migration run at startup only takes brief locks.
+
+    python -m db.prepare_traffic_partitioning --days 7
+
+Run it against the unpartitioned table while the API keeps serving, then
+restart within ``--days`` days: rows timestamped at or after the cutoff
+(midnight that many days ahead) are refused until the migration has turned
+the table into the legacy partition. Rerunning it is harmless.
+
+Steps, none of which blocks reads or inserts for long:
+  * NULL timestamps are set to the epoch in id ranges of one transaction each
+  * CHECK constraints for "timestamp IS NOT NULL" and "timestamp < cutoff" are
+    added NOT VALID and then validated, which scans under a lock that lets
+    writes through; the migration then sets NOT NULL and attaches the table
+    as a partition without scanning it again
+  * the (id, timestamp) index of the new primary key is built CONCURRENTLY
+"""
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+from db.engine import engine
+
+
+async def prepare_traffic_partitioning(days: int, batch: int):
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        partitioned = await connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'traffic'::regclass)"
+        ))
+        if partitioned.scalar():
+            print("[INFO] traffic is already partitioned, nothing to prepare")
+            await engine.dispose()
+            return
+
+        bounds = await connection.execute(text("SELECT min(id), max(id) FROM traffic"))
+        first, last = bounds.one()
+        start = first
+        while first is not None and start <= last:
+            result = await connection.execute(
+                text("UPDATE traffic SET timestamp = 'epoch' WHERE id >= :start AND id < :end AND timestamp IS NULL"),
+                {"start": start, "end": start + batch},
+            )
+            if result.rowcount:
+                print(f"[INFO] Set {result.rowcount} missing timestamps of ids {start}-{start + batch - 1}")
+            start += batch
+
+        cutoff = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=days)
+        await connection.execute(text("ALTER TABLE traffic DROP CONSTRAINT IF EXISTS traffic_legacy_bounds"))
+        await connection.execute(text("ALTER TABLE traffic DROP CONSTRAINT IF EXISTS traffic_timestamp_not_null"))
+        await connection.execute(text(
+            "ALTER TABLE traffic ADD CONSTRAINT traffic_timestamp_not_null CHECK (timestamp IS NOT NULL) NOT VALID"
+        ))
+        await connection.execute(text(
+            f"ALTER TABLE traffic ADD CONSTRAINT traffic_legacy_bounds CHECK (timestamp < '{cutoff.isoformat()}') NOT VALID"
+        ))
+        await connection.execute(text("ALTER TABLE traffic VALIDATE CONSTRAINT traffic_timestamp_not_null"))
+        await connection.execute(text("ALTER TABLE traffic VALIDATE CONSTRAINT traffic_legacy_bounds"))
+        print(f"[INFO] Validated the legacy partition bound, timestamps before {cutoff.isoformat()}")
+
+        # An index left invalid by an interrupted concurrent build would be reused as is
+        await connection.execute(text(
+            "DROP INDEX CONCURRENTLY IF EXISTS traffic_legacy_pkey"
+        ))
+        await connection.execute(text(
+            "CREATE UNIQUE INDEX CONCURRENTLY traffic_legacy_pkey ON traffic (id, timestamp)"
+        ))
+        print("[INFO] Built the (id, timestamp) primary key index; restart the API to run the migration")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare a large traffic table for partitioning without downtime")
+    parser.add_argument("--days", type=int, default=7, help="days ahead the legacy partition accepts rows for")
+    parser.add_argument("--batch", type=int, default=50000, help="ids per transaction when filling timestamps")
+    args = parser.parse_args()
+    asyncio.run(prepare_traffic_partitioning(args.days, args.batch))
+
+
+if __name__ == "__main__":
+    main()
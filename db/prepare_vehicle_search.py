@@ -0,0 +1,96 @@
+"""
+Fills the plate components of existing vehicles and builds the indexes of
+vehicle search online, so migration 0001 at startup only adds columns.
+
+    python -m db.prepare_vehicle_search --batch 50000
+
+Safe to run while ingest is writing and to rerun after an interruption:
+  * plate_first/letter/second are recovered from the concatenated plate of
+    rows that lack them, in id ranges of one transaction each
+  * the component indexes and the trigram index of fuzzy plate search are
+    built CONCURRENTLY; one left invalid by an interrupted build is rebuilt
+  * without the pg_trgm extension, which needs superuser rights or a
+    trusted install, the trigram index is skipped and fuzzy search answers
+    503 until the extension is installed and this is run again
+"""
+import asyncio
+import argparse
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from db.engine import engine
+from traffic.fuzzy import CONFUSABLE_FROM, CONFUSABLE_TO
+
+
+FILL_STATEMENT = text(r"""
+    UPDATE vehicles
+    SET plate_first = parsed.parts[1], plate_letter = parsed.parts[2], plate_second = parsed.parts[3]
+    FROM (
+        SELECT id, regexp_match(plate_number, '^(\d+)(\D+)(\d+)$') AS parts
+        FROM vehicles
+        WHERE id >= :start AND id < :end AND plate_first IS NULL
+    ) AS parsed
+    WHERE vehicles.id = parsed.id AND parsed.parts IS NOT NULL
+""")
+
+COMPONENT_INDEXES = {
+    "ix_vehicles_plate_first": "vehicles (plate_first)",
+    "ix_vehicles_plate_letter": "vehicles (plate_letter)",
+    "ix_vehicles_plate_second": "vehicles (plate_second)",
+    "ix_vehicles_plate_city_code": "vehicles (plate_city_code)",
+    "ix_vehicles_plate_type": "vehicles (plate_type)",
+}
+# Must match the expression TrafficOperation.fuzzy_search_vehicles queries
+TRIGRAM_INDEX = (
+    "ix_vehicles_plate_number_trgm",
+    f"vehicles USING gin (translate(lower(plate_number), '{CONFUSABLE_FROM}', '{CONFUSABLE_TO}') gin_trgm_ops)",
+)
+
+
+async def build_index(connection, name: str, definition: str):
+    result = await connection.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": name},
+    )
+    valid = result.scalar()
+    if valid:
+        return
+    if valid is not None:
+        await connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    await connection.execute(text(f"CREATE INDEX CONCURRENTLY {name} ON {definition}"))
+    print(f"[INFO] Built index {name}")
+
+
+async def prepare_vehicle_search(batch: int):
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        bounds = await connection.execute(text("SELECT min(id), max(id) FROM vehicles WHERE plate_first IS NULL"))
+        first, last = bounds.one()
+        start = first
+        while first is not None and start <= last:
+            result = await connection.execute(FILL_STATEMENT, {"start": start, "end": start + batch})
+            if result.rowcount:
+                print(f"[INFO] Filled plate components of {result.rowcount} vehicles with ids {start}-{start + batch - 1}")
+            start += batch
+
+        for name, definition in COMPONENT_INDEXES.items():
+            await build_index(connection, name, definition)
+
+        try:
+            await connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except DBAPIError as error:
+            print(f"[WARNING] Couldn't install pg_trgm, skipping the trigram index of fuzzy plate search: {error}")
+        else:
+            await build_index(connection, *TRIGRAM_INDEX)
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare vehicle search on an existing vehicles table without downtime")
+    parser.add_argument("--batch", type=int, default=50000, help="ids per transaction when filling plate components")
+    args = parser.parse_args()
+    asyncio.run(prepare_vehicle_search(args.batch))
+
+
+if __name__ == "__main__":
+    main()
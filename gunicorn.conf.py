@@ -2,7 +2,7 @@
 
 # Server Socket
 bind = "0.0.0.0:8000"
-workers = 1  # Number of workers (adjust based on your server's CPU cores)
+workers = 1  # Number of workers (adjust based on your server's CPU cores); more than one needs INGEST_MODE=external and ingest.py
 worker_class = "uvicorn.workers.UvicornWorker"
 threads = 2  # Number of threads per worker (for IO-heavy applications)
 
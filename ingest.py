@@ -0,0 +1,111 @@
+import reactor_setup
+import asyncio
+import signal
+import logging
+
+from settings import settings
+from logging_config import setup_logging
+from lifespan import initialize_lpr_connections
+from tcp.ownership import lpr_ownership
+from db.listener import db_listener
+from tcp.ipc import IngestIPCServer
+from tcp.manager import connection_manager
+from tcp.tcp_client import configure_event_sinks
+from tcp.frame_store import close_frame_stores
+from tcp.recorder import close_frame_recorder
+from tcp.consensus import plate_consensus
+from fastapi.encoders import jsonable_encoder
+from traffic.persistence import journal_status, start_persistence, stop_persistence, visit_tracker
+from watchlist.matcher import watchlist_matcher
+from tcp.access_control import gate_access_control
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+async def handle_send_command(payload: dict):
+    await connection_manager.send_command(payload["client_id"], payload["command"])
+    return {"status": "Command sent"}
+
+
+async def handle_warmup_status(payload: dict):
+    return lpr_ownership.readiness()
+
+
+async def handle_connections(payload: dict):
+    return connection_manager.snapshot()
+
+
+async def handle_occupancy(payload: dict):
+    return visit_tracker.occupancy_snapshot(payload.get("building_id"))
+
+
+async def handle_recent_visits(payload: dict):
+    return jsonable_encoder(visit_tracker.recent_visits(payload.get("building_id"), payload.get("limit", 50)))
+
+
+async def handle_journal_status(payload: dict):
+    return journal_status()
+
+
+async def handle_access_metrics(payload: dict):
+    return gate_access_control.stats.snapshot()
+
+
+async def run_ingest():
+    """
+    Owns the LPR TCP connections outside of the API workers.
+
+    Decoded events are published to the API workers over the IPC socket at
+    INGEST_IPC_PATH, and commands coming back from them are executed against
+    the connections held here. Run the API with INGEST_MODE=external.
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    ipc_server = IngestIPCServer(settings.INGEST_IPC_PATH)
+    ipc_server.register("send_command", handle_send_command)
+    ipc_server.register("warmup_status", handle_warmup_status)
+    ipc_server.register("connections", handle_connections)
+    ipc_server.register("occupancy", handle_occupancy)
+    ipc_server.register("recent_visits", handle_recent_visits)
+    ipc_server.register("journal_status", handle_journal_status)
+    ipc_server.register("access_metrics", handle_access_metrics)
+    await ipc_server.start()
+    configure_event_sinks(ipc_server.publish_event, ipc_server.publish_live_frame)
+
+    await db_listener.start()
+    await start_persistence()
+    await watchlist_matcher.reload()
+    await gate_access_control.start()
+    await initialize_lpr_connections()
+    logger.info("Ingest process running")
+    print("[INFO] Ingest process running")
+
+    await stop_event.wait()
+
+    logger.info("Ingest process stopping")
+    await lpr_ownership.stop()
+    # Open vehicle tracks still go to the journal before it closes
+    plate_consensus.flush()
+    await gate_access_control.stop()
+    await stop_persistence()
+    await db_listener.stop()
+    await ipc_server.stop()
+    close_frame_stores()
+    close_frame_recorder()
+
+
+def main():
+    """
+    Entry point for the standalone LPR ingest process.
+    """
+    # The Twisted reactor was installed on this loop by reactor_setup
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(run_ingest())
+
+
+if __name__ == "__main__":
+    main()
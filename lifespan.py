@@ -7,12 +7,26 @@ from fastapi import FastAPI
 from twisted.internet import reactor
 from sqlalchemy.future import select
 
+from settings import settings
 from db.engine import engine, Base, async_session
 from utils.db_utils import create_default_admin, initialize_defaults
 from lpr.model import DBLpr
 from tcp.tcp_client import connect_to_server, send_command_to_server
 from tcp.router import tcp_factories, tcp_factory_lock
 from tcp.manager import connection_manager
+from tcp.ownership import lpr_ownership
+from db.listener import db_listener
+from db.migrations import run_migrations
+from traffic.partitions import maintain_traffic_partitions, run_partition_maintenance
+from tcp.frame_store import close_frame_stores
+from tcp.recorder import close_frame_recorder
+from tcp.consensus import plate_consensus
+from tcp.socket_management import emit_to_requested_sids, emit_live_frame
+from tcp.ipc import IngestIPCClient
+from traffic.persistence import start_persistence, stop_persistence
+from watchlist.matcher import watchlist_matcher
+from tcp.access_control import gate_access_control
+from tcp import ipc
 
 logger = logging.getLogger(__name__)
 
@@ -35,30 +49,14 @@ logger = logging.getLogger(__name__)
 
 async def initialize_lpr_connections():
     """
-    Initialize TCP clients for all LPRs and store their factory in the connection manager.
+    Start claiming LPR shards. Connections are opened for every LPR in the
+    shards this process wins, so each LPR is connected by exactly one process
+    even when several workers run this lifespan.
     """
     logger.info("Initializing LPR connections...")
     print("Initializing LPR connections...")
     try:
-        async with async_session() as session:
-            try:
-                result = await session.execute(select(DBLpr))
-                lprs = result.scalars().unique().all()
-                logger.info(f"Found {len(lprs)} LPRs for initialization.")
-                print(f"Found {len(lprs)} LPRs for initialization.")
-
-                for lpr in lprs:
-                    factory = connect_to_server(
-                        server_ip=lpr.ip,
-                        port=lpr.port,
-                        auth_token=lpr.auth_token
-                    )
-                    await connection_manager.add_connection(lpr.id, factory)
-                    logger.info(f"Initialized connection for LPR with ID: {lpr.id}, IP: {lpr.ip}, Port: {lpr.port}")
-                    print(f"Initialized connection for LPR with ID: {lpr.id}, IP: {lpr.ip}, Port: {lpr.port}")
-            except Exception as error:
-                await session.rollback()
-                print(f"Error: {error}")
+        await lpr_ownership.start()
     except Exception as error:
         logger.error(f"Failed to initialize LPR connections: {error}")
         print(f"Failed to initialize LPR connections: {error}")
@@ -93,6 +91,11 @@ async def lifespan(app: FastAPI):
         await conn.run_sync(Base.metadata.create_all)
         logger.info("Database tables created successfully")
         print("[INFO] Database tables created")
+    # Bring tables that existed before the current models up to date
+    await run_migrations()
+    # Traffic rows need a partition to land in before ingest starts
+    await maintain_traffic_partitions()
+    partition_task = asyncio.create_task(run_partition_maintenance())
 
     # Create default admin user and defaults
     async with async_session() as session:
@@ -106,8 +109,22 @@ async def lifespan(app: FastAPI):
             print(f"error: {error}")
 
 
-    # Start the Twisted reactor in a separate thread
-    await initialize_lpr_connections()
+    await db_listener.start()
+
+    if settings.INGEST_MODE == "external":
+        # LPR sockets are owned by ingest.py; only relay its events to Socket.IO
+        ipc.ingest_client = IngestIPCClient(settings.INGEST_IPC_PATH, emit_to_requested_sids, emit_live_frame)
+        await ipc.ingest_client.start()
+        logger.info(f"Using external ingest process at {settings.INGEST_IPC_PATH}")
+    else:
+        # Refuses to start when another worker already holds the LPR connections
+        await lpr_ownership.claim_embedded(settings.LPR_EMBEDDED_LOCK_TIMEOUT)
+        await start_persistence()
+        # Reads are matched from the first frame on
+        await watchlist_matcher.reload()
+        await gate_access_control.start()
+        # Start the Twisted reactor in a separate thread
+        await initialize_lpr_connections()
     # reactor_thread = threading.Thread(target=start_reactor, daemon=True)
     # reactor_thread.start()
     # await asyncio.sleep(5)
@@ -147,9 +164,22 @@ async def lifespan(app: FastAPI):
     yield
     logger.info("Application lifespan ending - cleaning up resources")
     # Clean up resources
+    if ipc.ingest_client is not None:
+        await ipc.ingest_client.stop()
+        ipc.ingest_client = None
+    partition_task.cancel()
+    # Release LPR shards while the lock session is still usable
+    await lpr_ownership.stop()
+    # Open vehicle tracks still go to the journal before it closes
+    plate_consensus.flush()
+    await gate_access_control.stop()
+    await stop_persistence()
+    await db_listener.stop()
     await engine.dispose()
     logger.info("Database connection closed")
     # Close all TCP clients
     reactor.callFromThread(reactor.stop)
+    close_frame_stores()
+    close_frame_recorder()
 
     print("[INFO] Lifespan ended")
@@ -26,12 +26,14 @@ from lpr.schema import (
     LprSettingInstanceCreate,
     LprSettingInstanceUpdate,
 )
-from tcp.tcp_client import connect_to_server
-from tcp.manager import connection_manager
+from db.listener import ACCESS_CHANGES_CHANNEL, notify_channel
 
 
 logger = logging.getLogger(__name__)
 
+# Postgres channel the LPR connection owners listen on
+LPR_CHANGES_CHANNEL = "lpr_changes"
+LPR_CONNECTION_FIELDS = ("ip", "port", "auth_token", "is_active")
 
 
 class CrudOperation:
@@ -118,6 +120,10 @@ class BuildingOperation(CrudOperation):
             db_building = await self.get_building(building_id)
             try:
                 db_building = await self.db_session.merge(db_building)
+                # Gates and their LPRs go with the building; their connections must be closed too
+                for gate in db_building.gates:
+                    for lpr in gate.lprs:
+                        await notify_channel(self.db_session, LPR_CHANGES_CHANNEL, lpr.id)
                 await self.db_session.delete(db_building)
                 await self.db_session.commit()
                 return db_building
@@ -205,6 +211,7 @@ class GateOperation(CrudOperation):
                     if key != "building_id":
                         setattr(db_gate, key, value)
 
+                await notify_channel(self.db_session, ACCESS_CHANGES_CHANNEL, f"gate:{gate_id}")
                 await self.db_session.commit()
                 await self.db_session.refresh(db_gate)
                 return db_gate
@@ -217,6 +224,9 @@ class GateOperation(CrudOperation):
             db_gate = await self.get_gate(gate_id)
             try:
                 db_gate = await self.db_session.merge(db_gate)
+                for lpr in db_gate.lprs:
+                    await notify_channel(self.db_session, LPR_CHANGES_CHANNEL, lpr.id)
+                await notify_channel(self.db_session, ACCESS_CHANGES_CHANNEL, f"gate:{gate_id}")
                 await self.db_session.delete(db_gate)
                 await self.db_session.commit()
                 return db_gate
@@ -408,6 +418,7 @@ class CameraOperation(CrudOperation):
                 #     self.db_session.add(db_camera)
                     # await self.db_session.commit()
 
+                await notify_channel(self.db_session, ACCESS_CHANGES_CHANNEL, f"camera:{db_camera.id}")
                 await self.db_session.commit()
                 await self.db_session.refresh(db_camera)
                 return db_camera
@@ -441,6 +452,7 @@ class CameraOperation(CrudOperation):
                     if key not in ["gate_id", "lpr_ids"]:
                         setattr(db_camera, key, value)
 
+                await notify_channel(self.db_session, ACCESS_CHANGES_CHANNEL, f"camera:{camera_id}")
                 await self.db_session.commit()
                 await self.db_session.refresh(db_camera)
                 return db_camera
@@ -553,6 +565,7 @@ class CameraOperation(CrudOperation):
             db_camera = await self.get_camera(camera_id)
             try:
 
+                await notify_channel(self.db_session, ACCESS_CHANGES_CHANNEL, f"camera:{camera_id}")
                 await self.db_session.delete(db_camera)
                 await self.db_session.commit()
                 return db_camera
@@ -734,6 +747,7 @@ class LprOperation(CrudOperation):
                         default_setting_id=setting.id
                     )
                     self.db_session.add(setting_instance)
+                await notify_channel(self.db_session, LPR_CHANGES_CHANNEL, new_lpr.id)
                 await self.db_session.commit()
                 await self.db_session.refresh(new_lpr)
                 return new_lpr
@@ -753,10 +767,17 @@ class LprOperation(CrudOperation):
                     await GateOperation(self.db_session).get_gate(gate_id)
                     db_lpr.gate_id = gate_id
 
+                connection_changed = any(
+                    key in update_data and update_data[key] != getattr(db_lpr, key)
+                    for key in LPR_CONNECTION_FIELDS
+                )
                 for key, value in update_data.items():
                     if key not in ["gate_id", "lpr_ids"]:
                         setattr(db_lpr, key, value)
 
+                if connection_changed:
+                    # Only this LPR is reconnected by whichever process owns it
+                    await notify_channel(self.db_session, LPR_CHANGES_CHANNEL, db_lpr.id)
                 await self.db_session.commit()
                 await self.db_session.refresh(db_lpr)
                 return db_lpr
@@ -869,6 +890,7 @@ class LprOperation(CrudOperation):
         # async with self.db_session as session:
             db_lpr = await self.get_lpr(lpr_id)
             try:
+                await notify_channel(self.db_session, LPR_CHANGES_CHANNEL, db_lpr.id)
                 await self.db_session.delete(db_lpr)
                 await self.db_session.commit()
                 return db_lpr
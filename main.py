@@ -12,6 +12,8 @@ from auth.router import auth_router
 from user.router import user_router
 from lpr.router import building_router, gate_router, camera_settings_router, camera_router, lpr_setting_router, lpr_router
 from tcp.router import tcp_router
+from traffic.router import traffic_router
+from watchlist.router import watchlist_router
 from tcp.socket_management import tcp_sio
 # from tcp.socket_test import tcp_sio, start_emitter, set_event_loop
 # from tcp.test_data import emit_plates_data_periodically
@@ -46,6 +48,8 @@ app.include_router(camera_router, tags=["Cameras"])
 app.include_router(lpr_setting_router, tags=["Lpr settings"])
 app.include_router(lpr_router, tags=["Lprs"])
 app.include_router(tcp_router, tags=["tcp"])
+app.include_router(traffic_router, tags=["Traffic"])
+app.include_router(watchlist_router, tags=["Watchlist"])
 logger.info("All routers added")
 
 logger.info("Starting Web Socket along with FastAPI application")
@@ -26,6 +26,84 @@ class Settings(BaseSettings):
     CLIENT_KEY_PATH: Optional[str] = None
     CLIENT_CERT_PATH: Optional[str] = None
     CA_CERT_PATH: Optional[str] = None
+    LIVE_FRAME_SHM_NAME: Optional[str] = None
+    LIVE_FRAME_SHM_SLOTS: int=64
+    LIVE_FRAME_SHM_SLOT_SIZE: int=4 * 1024 * 1024
+    # "embedded" keeps LPR connections in the API process, "external" leaves them to ingest.py.
+    # Only one API process may run embedded; several workers need "external".
+    INGEST_MODE: str="embedded"
+    # Seconds an embedded API process waits for a previous one to release the LPR connections
+    LPR_EMBEDDED_LOCK_TIMEOUT: float=10.0
+    # One ingest process per host: it refuses to start while another one answers on this socket
+    INGEST_IPC_PATH: str="/tmp/lpr_ingest.sock"
+    # LPRs are split into shards by the building of their gate; one process owns each shard
+    LPR_SHARD_COUNT: int=1
+    LPR_OWNERSHIP_POLL_INTERVAL: float=2.0
+    LPR_OWNERSHIP_TAKEOVER_GRACE: float=5.0
+    LPR_WARMUP_CONCURRENCY: int=20
+    LPR_WARMUP_SPACING: float=0.05
+    LPR_WARMUP_JITTER: float=0.05
+    LPR_WARMUP_AUTH_TIMEOUT: float=15.0
+    # Opt-in: only tcp/lpr_server.py is known to answer "heartbeat" messages, and an LPR
+    # that ignores them would be reconnected every INTERVAL * MAX_MISSED idle seconds
+    LPR_HEARTBEAT_INTERVAL: float=0
+    LPR_HEARTBEAT_MAX_MISSED: int=3
+    LPR_DEDUP_WINDOW: float=300.0
+    LPR_DEDUP_MAX_IDS: int=10000
+    # Plate reads are journaled here before being persisted; unset to disable persistence
+    JOURNAL_DIR: Optional[str] = "journal"
+    JOURNAL_SEGMENT_MAX_BYTES: int=64 * 1024 * 1024
+    JOURNAL_SEGMENT_MAX_AGE: float=3600.0
+    JOURNAL_FSYNC_INTERVAL: float=1.0
+    JOURNAL_CONSUMER_BATCH_SIZE: int=500
+    JOURNAL_CONSUMER_POLL_INTERVAL: float=0.5
+    JOURNAL_CONSUMER_RETRY_DELAY: float=5.0
+    # Tries of a single failing record before it goes to the consumer's dead-letter file;
+    # Postgres or MinIO being unreachable is retried without limit and not counted
+    JOURNAL_CONSUMER_MAX_ATTEMPTS: int=5
+    # Raw LPR frames are recorded here for tcp/replay.py when set
+    TCP_RECORD_PATH: Optional[str] = None
+    # Reads of one vehicle are merged until none arrived for this many seconds; 0 publishes every read
+    PLATE_CONSENSUS_WINDOW: float=1.5
+    PLATE_CONSENSUS_SIMILARITY: float=0.6
+    # A vehicle that stays in view is published every this many reads or seconds
+    PLATE_CONSENSUS_MAX_TRACK_READS: int=50
+    PLATE_CONSENSUS_MAX_TRACK_AGE: float=10.0
+    VEHICLE_ATTRIBUTE_FLUSH_INTERVAL: float=30.0
+    VEHICLE_ATTRIBUTE_MIN_WEIGHT: float=1.5
+    VEHICLE_ATTRIBUTE_MAX_VEHICLES: int=100000
+    FUZZY_PLATE_MIN_SIMILARITY: float=0.3
+    FUZZY_PLATE_CANDIDATES: int=200
+    # "day" or "month"
+    TRAFFIC_PARTITION_GRANULARITY: str="day"
+    TRAFFIC_PARTITIONS_AHEAD: int=7
+    # Partitions entirely older than this are dropped; 0 keeps everything
+    TRAFFIC_RETENTION_DAYS: int=0
+    TRAFFIC_PARTITION_MAINTENANCE_INTERVAL: float=3600.0
+    CAMERA_DIRECTORY_TTL: float=60.0
+    TRAFFIC_ANALYTICS_CACHE_TTL: float=60.0
+    TRAFFIC_ANALYTICS_CACHE_MAX_ENTRIES: int=256
+    # Rows fetched from the server-side cursor and written per chunk of an export
+    TRAFFIC_EXPORT_CHUNK_ROWS: int=5000
+    # messageIds are remembered this long to drop messages that arrive twice; 0 keeps them forever
+    INGESTED_MESSAGE_RETENTION_DAYS: int=2
+    # Limit of a decompressed bulk upload, and plate reads stored per transaction
+    BULK_INGEST_MAX_BYTES: int=256 * 1024 * 1024
+    BULK_INGEST_BATCH_READS: int=2000
+    # Reads of a plate closer together than this are one pass through a gate
+    VISIT_REENTRY_GAP: float=300.0
+    # Visits without a read for this long are closed without an exit
+    VISIT_MAX_DWELL: float=7 * 24 * 3600.0
+    # Closed visits are stored and open ones snapshotted with the journal offset this often
+    VISIT_FLUSH_INTERVAL: float=10.0
+    VISIT_RECENT_MAX: int=1000
+    # Opens ENTRANCE gates for plates of active vehicles straight from the read (opt-in)
+    ACCESS_CONTROL_ENABLED: bool=False
+    ACCESS_RELAY_COMMAND_TYPE: str="open_relay"
+    ACCESS_RELAY_DURATION: int=3
+    # Seconds before the same plate opens the same gate again
+    ACCESS_CONTROL_COOLDOWN: float=10.0
+    ACCESS_CONTROL_RELOAD_INTERVAL: float=60.0
 
 
     class Config:
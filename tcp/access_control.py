@@ -0,0 +1,176 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, FrozenSet, Optional
+
+from sqlalchemy.future import select
+
+from settings import settings
+from db.engine import async_session
+from db.listener import ACCESS_CHANGES_CHANNEL, db_listener
+from lpr.model import DBCamera, DBGate, GateType
+from traffic.model import Vehicle
+from user.model import DBUser
+
+logger = logging.getLogger(__name__)
+
+
+LATENCY_SAMPLES = 1024
+
+
+class AccessControlStats:
+    """
+    Decision counters and read-to-command latencies, in seconds from the
+    frame's arrival in dataReceived until the relay command was written.
+    """
+
+    def __init__(self):
+        self.granted = 0
+        self.denied = 0
+        self.suppressed = 0
+        self.not_sent = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record_latency(self, latency: float):
+        self.latencies.append(latency)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.latencies)
+
+        def at(fraction):
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 3)
+
+        return {
+            "granted": self.granted,
+            "denied": self.denied,
+            "suppressed": self.suppressed,
+            "not_sent": self.not_sent,
+            "latency_samples": len(ordered),
+            "latency_p50_ms": at(0.50),
+            "latency_p99_ms": at(0.99),
+            "latency_max_ms": round(ordered[-1] * 1000, 3) if ordered else None,
+        }
+
+
+class GateAccessControl:
+    """
+    Opens ENTRANCE gates for authorized plates straight from the read.
+
+    Keeps, per ENTRANCE gate, the set of plates of active vehicles owned by
+    active users, and the cameras watching those gates. A read is checked
+    with dict and set lookups only and, when allowed, the LPR that sent it
+    gets the relay command on the same connection, so no database round
+    trip sits between the read and the gate opening. Plates match exactly
+    (case-insensitive); unlike the watchlist, OCR confusions are not folded,
+    since a near miss must not open a gate.
+
+    The lists are rebuilt when users, gates or cameras change, after the
+    listener reconnects, and every ACCESS_CONTROL_RELOAD_INTERVAL seconds
+    for vehicle ownership changed outside the API.
+    """
+
+    def __init__(self, cooldown: float):
+        self.cooldown = cooldown
+        self.entrance_cameras: Dict[str, int] = {}
+        self.allowed: Dict[int, FrozenSet[str]] = {}
+        # (gate id, plate) -> monotonic time of the last command, so a car read many times opens the gate once
+        self.last_opened: Dict[tuple, float] = {}
+        self.stats = AccessControlStats()
+        self.task: Optional[asyncio.Task] = None
+        # Set by tcp_client to send_command_to_server, which would be a circular import here
+        self.send_command = None
+
+    async def reload(self, payload=None):
+        try:
+            async with async_session() as session:
+                cameras = await session.execute(
+                    select(DBCamera.id, DBCamera.gate_id)
+                    .join(DBGate, DBCamera.gate_id == DBGate.id)
+                    .where(DBGate.gate_type == GateType.ENTRANCE, DBGate.is_active.is_(True), DBCamera.is_active.is_(True))
+                )
+                plates = await session.execute(
+                    select(Vehicle.plate_number)
+                    .join(DBUser, Vehicle.owner_id == DBUser.id)
+                    .where(Vehicle.is_active.is_(True), DBUser.is_active.is_(True))
+                )
+                camera_rows = cameras.all()
+                allowed_plates = frozenset(plate.lower() for plate in plates.scalars().all())
+        except Exception as error:
+            # Keep deciding with the previous lists
+            logger.error(f"Couldn't reload gate access lists: {error}")
+            return
+        # Every owner may use every entrance until per-gate permissions exist; the lists are kept per gate for them
+        self.allowed = {row.gate_id: allowed_plates for row in camera_rows}
+        self.entrance_cameras = {str(row.id): row.gate_id for row in camera_rows}
+        logger.info(f"Loaded access lists of {len(self.allowed)} entrance gates with {len(allowed_plates)} plates")
+
+    async def _reload_periodically(self):
+        while True:
+            await asyncio.sleep(settings.ACCESS_CONTROL_RELOAD_INTERVAL)
+            await self.reload()
+
+    async def start(self):
+        if settings.ACCESS_CONTROL_ENABLED and self.task is None:
+            await self.reload()
+            self.task = asyncio.create_task(self._reload_periodically())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def check(self, factory, message_body: dict, received_at: Optional[float]):
+        """
+        Sends the relay command through the reading LPR when a car at an
+        ENTRANCE camera is on that gate's list. Runs inline in the read path.
+        """
+        if self.task is None:
+            return
+        camera_id = message_body.get("camera_id")
+        gate_id = self.entrance_cameras.get(str(camera_id))
+        if gate_id is None:
+            return
+        allowed = self.allowed.get(gate_id, frozenset())
+        for car in message_body.get("cars", []):
+            plate_number = car.get("plate", {}).get("plate")
+            if not plate_number:
+                continue
+            plate_number = plate_number.lower()
+            if plate_number not in allowed:
+                self.stats.denied += 1
+                continue
+            now = time.monotonic()
+            if now - self.last_opened.get((gate_id, plate_number), float("-inf")) < self.cooldown:
+                self.stats.suppressed += 1
+                continue
+            self._open(factory, camera_id, gate_id, plate_number, received_at, now)
+
+    def _open(self, factory, camera_id, gate_id: int, plate_number: str, received_at: Optional[float], now: float):
+        if not factory.authenticated:
+            self.stats.not_sent += 1
+            logger.error(f"Couldn't open gate {gate_id} for {plate_number}: LPR {factory.server_ip} is not authenticated")
+            return
+        self.send_command(factory, {
+            "commandType": settings.ACCESS_RELAY_COMMAND_TYPE,
+            "cameraId": str(camera_id),
+            "duration": settings.ACCESS_RELAY_DURATION,
+        })
+        self.stats.granted += 1
+        if len(self.last_opened) > 10000:
+            self.last_opened = {key: at for key, at in self.last_opened.items() if now - at < self.cooldown}
+        self.last_opened[(gate_id, plate_number)] = now
+        if received_at is not None:
+            latency = time.monotonic() - received_at
+            self.stats.record_latency(latency)
+            logger.info(f"Opened gate {gate_id} for {plate_number} {latency * 1000:.1f}ms after the read arrived")
+
+
+gate_access_control = GateAccessControl(settings.ACCESS_CONTROL_COOLDOWN)
+db_listener.subscribe(ACCESS_CHANGES_CHANNEL, gate_access_control.reload, on_reconnect=gate_access_control.reload)
@@ -0,0 +1,223 @@
+"""
+End-to-end benchmark of the LPR ingest and Socket.IO fan-out.
+
+Starts a fleet of simulated LPRs, connects SimpleTCPClient factories to
+them, serves tcp_sio in-process and attaches Socket.IO test clients. No
+database is involved, so the numbers reflect tcp/ and socket_management.
+
+    python -m tcp.bench --lprs 20 --clients 10 --duration 30 --output bench.json
+
+Requires aiohttp for the Socket.IO test clients.
+"""
+import reactor_setup
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import resource
+from datetime import datetime, timezone
+
+import socketio
+import uvicorn
+
+from settings import settings
+from tcp.socket_management import tcp_sio
+from tcp.simulator import LIVE_TIMESTAMP, start_simulated_fleet
+from tcp.tcp_client import connect_to_server, disconnect_from_server
+from tcp.frame_store import close_frame_stores
+from tcp.consensus import plate_consensus
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentiles(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": at(0.50),
+        "p90_ms": at(0.90),
+        "p99_ms": at(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+class BenchClient:
+    """
+    Socket.IO test client recording the latency of every event it receives.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.measuring = False
+        self.received = {"plates_data": 0, "live": 0}
+        self.latencies = {"plates_data": [], "live": []}
+        self.client.on("plates_data", self.on_plates)
+        self.client.on("live", self.on_live)
+
+    async def connect(self):
+        await self.client.connect(self.url, transports=["websocket"])
+        for request_type in ("plates_data", "live"):
+            await self.client.emit("subscribe", {"request_type": request_type, "camera_id": "1"})
+
+    async def on_plates(self, data):
+        if not self.measuring:
+            return
+        self.received["plates_data"] += 1
+        sent_at = datetime.fromisoformat(data["timestamp"])
+        self.latencies["plates_data"].append((datetime.now(timezone.utc) - sent_at).total_seconds())
+
+    async def on_live(self, data):
+        if not self.measuring:
+            return
+        self.received["live"] += 1
+        image = data.get("live_image")
+        # Without the shared frame store the image is replaced by a placeholder string
+        if isinstance(image, (bytes, bytearray)) and len(image) >= LIVE_TIMESTAMP.size:
+            self.latencies["live"].append(time.time() - LIVE_TIMESTAMP.unpack_from(image)[0])
+
+
+async def run_bench(args) -> dict:
+    logging.basicConfig(level=logging.WARNING)
+    for name in ("socketio", "engineio", "tcp", "uvicorn"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    tcp_sio.logger.setLevel(logging.WARNING)
+    tcp_sio.eio.logger.setLevel(logging.WARNING)
+
+    settings.CLIENT_CERT_PATH = settings.CLIENT_CERT_PATH or "cert/client.crt"
+    settings.CLIENT_KEY_PATH = settings.CLIENT_KEY_PATH or "cert/client.key"
+    settings.CA_CERT_PATH = settings.CA_CERT_PATH or "cert/ca.crt"
+    settings.TCP_RECORD_PATH = None
+    # Consensus holds reads back for its window, which would dominate plate latency
+    plate_consensus.window = args.consensus_window
+    if not args.no_shm:
+        settings.LIVE_FRAME_SHM_NAME = f"lpr_bench_{os.getpid()}"
+
+    fleet = start_simulated_fleet(
+        args.lprs, args.lpr_port,
+        plates_rate=args.plates_rate,
+        live_rate=args.live_rate,
+        full_image_size=args.full_image_size,
+        plate_image_size=args.plate_image_size,
+        live_image_size=args.live_image_size,
+    )
+
+    server = uvicorn.Server(uvicorn.Config(
+        socketio.ASGIApp(tcp_sio, socketio_path="/socket.io"),
+        host="127.0.0.1", port=args.sio_port, log_level="warning",
+    ))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    clients = [BenchClient(f"http://127.0.0.1:{args.sio_port}") for _ in range(args.clients)]
+    await asyncio.gather(*(client.connect() for client in clients))
+
+    factories = [connect_to_server("127.0.0.1", port, "bench-token", delay=0) for port, _ in fleet]
+    authenticated = await asyncio.gather(*(factory.wait_authenticated(15.0) for factory in factories))
+
+    await asyncio.sleep(args.warmup)
+
+    def ingested():
+        return sum(sum(factory.stats.messages.values()) for factory in factories)
+
+    def sent():
+        return sum(lpr.plates_sent + lpr.live_sent for _, lpr in fleet)
+
+    rss_start = current_rss()
+    ingested_start, sent_start = ingested(), sent()
+    for client in clients:
+        client.measuring = True
+    started_at = time.monotonic()
+    await asyncio.sleep(args.duration)
+    for client in clients:
+        client.measuring = False
+    elapsed = time.monotonic() - started_at
+    rss_end = current_rss()
+    ingested_count, sent_count = ingested() - ingested_start, sent() - sent_start
+
+    results = {
+        "config": vars(args),
+        "authenticated_lprs": sum(authenticated),
+        "duration_s": round(elapsed, 3),
+        "ingest": {
+            "sent": sent_count,
+            "ingested": ingested_count,
+            "messages_per_s": round(ingested_count / elapsed, 2),
+            "parse_errors": sum(factory.stats.parse_errors for factory in factories),
+        },
+        "fanout": {
+            event: {
+                "received": sum(client.received[event] for client in clients),
+                "latency": percentiles([sample for client in clients for sample in client.latencies[event]]),
+            }
+            for event in ("plates_data", "live")
+        },
+        "memory": {
+            "rss_start_bytes": rss_start,
+            "rss_end_bytes": rss_end,
+            "rss_growth_bytes": rss_end - rss_start,
+            "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        },
+    }
+
+    for factory in factories:
+        disconnect_from_server(factory)
+    await asyncio.gather(*(client.client.disconnect() for client in clients), return_exceptions=True)
+    server.should_exit = True
+    await server_task
+    close_frame_stores()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LPR ingest and Socket.IO fan-out")
+    parser.add_argument("--lprs", type=int, default=10, help="number of simulated LPRs")
+    parser.add_argument("--clients", type=int, default=5, help="number of Socket.IO clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds before measuring")
+    parser.add_argument("--plates-rate", type=float, default=2.0, help="plates_data per second per LPR")
+    parser.add_argument("--live-rate", type=float, default=5.0, help="live frames per second per LPR")
+    parser.add_argument("--full-image-size", type=int, default=200_000)
+    parser.add_argument("--plate-image-size", type=int, default=10_000)
+    parser.add_argument("--live-image-size", type=int, default=100_000)
+    parser.add_argument("--lpr-port", type=int, default=19000, help="port of the first simulated LPR")
+    parser.add_argument("--sio-port", type=int, default=18000)
+    parser.add_argument("--consensus-window", type=float, default=0.0, help="PLATE_CONSENSUS_WINDOW for the run")
+    parser.add_argument("--no-shm", action="store_true", help="skip the shared frame store (no live latency)")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        sys.exit("tcp.bench needs aiohttp for its Socket.IO clients: pip install aiohttp")
+
+    # The Twisted reactor was installed on this loop by reactor_setup
+    loop = asyncio.get_event_loop()
+    results = loop.run_until_complete(run_bench(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
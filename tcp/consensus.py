@@ -0,0 +1,242 @@
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+# A new read is compared with this many of the latest reads of a track, not all of them
+SCORE_RECENT_READS = 8
+
+
+def edit_distance(first: str, second: str) -> int:
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (first_char != second_char),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def plate_similarity(first: str, second: str) -> float:
+    longest = max(len(first), len(second))
+    if longest == 0:
+        return 1.0
+    return 1.0 - edit_distance(first, second) / longest
+
+
+def boxes_continuous(first: Optional[dict], second: Optional[dict]) -> bool:
+    """
+    Whether two boxes could be the same plate a frame or two apart: they
+    overlap, or their centres are within two box sizes of each other.
+    """
+    if not first or not second:
+        return True
+    try:
+        width = max(first["right"] - first["left"], second["right"] - second["left"], 1)
+        height = max(first["bottom"] - first["top"], second["bottom"] - second["top"], 1)
+        dx = (first["left"] + first["right"] - second["left"] - second["right"]) / 2
+        dy = (first["top"] + first["bottom"] - second["top"] - second["bottom"]) / 2
+    except (KeyError, TypeError):
+        return True
+    return abs(dx) <= 2 * width and abs(dy) <= 2 * height
+
+
+class PlateRead:
+    __slots__ = ("message_id", "car_index", "body", "car", "plate", "weight")
+
+    def __init__(self, message_id, car_index, body, car):
+        self.message_id = message_id
+        self.car_index = car_index
+        self.body = body
+        self.car = car
+        self.plate = car.get("plate", {}).get("plate", "Unknown")
+        accuracy = car.get("ocr_accuracy")
+        self.weight = accuracy if isinstance(accuracy, (int, float)) and accuracy > 0 else 0.01
+
+
+class PlateTrack:
+    """
+    Reads of one vehicle passing one camera.
+    """
+
+    def __init__(self, camera_id, read: PlateRead):
+        self.camera_id = camera_id
+        self.reads: List[PlateRead] = [read]
+        # Cars of one message are different vehicles, however alike their plates
+        self.message_ids = {read.message_id}
+        self.started = time.monotonic()
+        self.last_seen = self.started
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def last_box(self):
+        return self.reads[-1].car.get("box")
+
+    def score(self, read: PlateRead) -> float:
+        """
+        Similarity of a read to this track, or 0 when it is another vehicle:
+        a car of a message already in the track, a plate too different, or a
+        box too far from the track's last one.
+        """
+        if read.message_id in self.message_ids:
+            return 0.0
+        similarity = max(plate_similarity(read.plate, known.plate) for known in self.reads[-SCORE_RECENT_READS:])
+        if similarity >= settings.PLATE_CONSENSUS_SIMILARITY and boxes_continuous(self.last_box, read.car.get("box")):
+            return similarity
+        return 0.0
+
+    def add(self, read: PlateRead):
+        self.reads.append(read)
+        self.message_ids.add(read.message_id)
+        self.last_seen = time.monotonic()
+
+    def consensus_plate(self) -> str:
+        """
+        Confidence-weighted vote: first on the plate length, then on every
+        character position among the reads of that length.
+        """
+        length_weights: Dict[int, float] = {}
+        for read in self.reads:
+            length_weights[len(read.plate)] = length_weights.get(len(read.plate), 0.0) + read.weight
+        length = max(length_weights, key=length_weights.get)
+
+        characters = []
+        for position in range(length):
+            votes: Dict[str, float] = {}
+            for read in self.reads:
+                if len(read.plate) == length:
+                    character = read.plate[position]
+                    votes[character] = votes.get(character, 0.0) + read.weight
+            characters.append(max(votes, key=votes.get))
+        return "".join(characters)
+
+    def consensus_event(self):
+        """
+        Builds one plates_data body for the track from its best read, with
+        the consensus plate. Returns (message_id, body).
+        """
+        plate_number = self.consensus_plate()
+        agreeing = [read for read in self.reads if read.plate == plate_number]
+        best = max(agreeing or self.reads, key=lambda read: read.weight)
+
+        plate = dict(best.car.get("plate", {}))
+        if best.plate != plate_number:
+            # Re-split the voted plate along the best read's component lengths
+            first_length = len(str(plate.get("first", "")))
+            letter_length = len(str(plate.get("letter", "")))
+            plate["first"] = plate_number[:first_length]
+            plate["letter"] = plate_number[first_length:first_length + letter_length]
+            plate["second"] = plate_number[first_length + letter_length:]
+        plate["plate"] = plate_number
+
+        car = dict(best.car)
+        car["plate"] = plate
+        car["consensus_reads"] = len(self.reads)
+        if agreeing:
+            car["ocr_accuracy"] = max(read.weight for read in agreeing)
+
+        body = {key: value for key, value in best.body.items() if key != "cars"}
+        body["cars"] = [car]
+        message_id = best.message_id if best.car_index == 0 else f"{best.message_id}-{best.car_index}"
+        return message_id, body
+
+
+class PlateConsensusTracker:
+    """
+    Collapses the many reads an LPR reports for an approaching vehicle into
+    one consensus read.
+
+    Reads are clustered per camera by plate similarity and box continuity.
+    A track is closed once no read joined it for PLATE_CONSENSUS_WINDOW
+    seconds, and its consensus read is handed to ``publish``. A car waiting
+    at a barrier or parked in view never goes quiet, so a track is also
+    closed once it holds ``max_reads`` reads or is ``max_age`` seconds old;
+    further reads start a new track.
+    """
+
+    def __init__(self, window: float, max_reads: int, max_age: float):
+        self.window = window
+        self.max_reads = max_reads
+        self.max_age = max_age
+        self.tracks: Dict[str, List[PlateTrack]] = {}
+        self.publish: Optional[Callable[[str, dict], None]] = None
+        self.reads_in = 0
+        self.reads_out = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.publish is not None
+
+    def add(self, message_id, body: dict):
+        camera_id = body.get("camera_id")
+        tracks = self.tracks.setdefault(camera_id, [])
+        for car_index, car in enumerate(body.get("cars", [])):
+            read = PlateRead(message_id, car_index, body, car)
+            self.reads_in += 1
+            best_track, best_score = None, 0.0
+            for track in tracks:
+                score = track.score(read)
+                if score > best_score:
+                    best_track, best_score = track, score
+            if best_track is not None:
+                best_track.add(read)
+                if self._is_full(best_track):
+                    best_track.timer.cancel()
+                    self._close(best_track)
+            else:
+                track = PlateTrack(camera_id, read)
+                tracks.append(track)
+                self._schedule_close(track, self.window)
+
+    def _is_full(self, track: PlateTrack) -> bool:
+        return len(track.reads) >= self.max_reads or track.last_seen - track.started >= self.max_age
+
+    def _schedule_close(self, track: PlateTrack, delay: float):
+        track.timer = asyncio.get_running_loop().call_later(delay, self._close_if_idle, track)
+
+    def _close_if_idle(self, track: PlateTrack):
+        idle = time.monotonic() - track.last_seen
+        if idle < self.window:
+            self._schedule_close(track, self.window - idle)
+            return
+        self._close(track)
+
+    def _close(self, track: PlateTrack):
+        tracks = self.tracks.get(track.camera_id, [])
+        if track in tracks:
+            tracks.remove(track)
+        if not tracks:
+            self.tracks.pop(track.camera_id, None)
+        try:
+            message_id, body = track.consensus_event()
+        except Exception as error:
+            logger.error(f"Failed to build consensus read for camera {track.camera_id}: {error}")
+            return
+        self.reads_out += 1
+        self.publish(message_id, body)
+
+    def flush(self):
+        """
+        Closes every open track immediately, e.g. on shutdown.
+        """
+        for tracks in list(self.tracks.values()):
+            for track in list(tracks):
+                if track.timer is not None:
+                    track.timer.cancel()
+                self._close(track)
+
+
+plate_consensus = PlateConsensusTracker(
+    window=settings.PLATE_CONSENSUS_WINDOW,
+    max_reads=settings.PLATE_CONSENSUS_MAX_TRACK_READS,
+    max_age=settings.PLATE_CONSENSUS_MAX_TRACK_AGE,
+)
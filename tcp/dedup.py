@@ -0,0 +1,57 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+MESSAGE_ID_PATTERN = re.compile(r'"messageId"\s*:\s*"([^"]+)"')
+
+
+def peek_message_id(message: str) -> Optional[str]:
+    """
+    Finds the messageId of a raw message without parsing it. LPRs put it
+    after the (potentially huge) messageBody, so the search starts at the end.
+    """
+    position = message.rfind('"messageId"')
+    if position == -1:
+        return None
+    match = MESSAGE_ID_PATTERN.match(message, position)
+    return match.group(1) if match else None
+
+
+class MessageDeduplicator:
+    """
+    Remembers message ids seen within the last ``window`` seconds.
+
+    Entries are kept in arrival order, so expiry and the ``max_size`` bound
+    both evict from the front in O(1).
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self.seen = OrderedDict()
+
+    def _expire(self, now: float):
+        while self.seen:
+            oldest_id, seen_at = next(iter(self.seen.items()))
+            if now - seen_at <= self.window:
+                break
+            self.seen.pop(oldest_id)
+
+    def contains(self, message_id: str) -> bool:
+        self._expire(time.monotonic())
+        return message_id in self.seen
+
+    def seen_before(self, message_id: str) -> bool:
+        """
+        Records the id and reports whether it was already seen in the window.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        if message_id in self.seen:
+            return True
+        self.seen[message_id] = now
+        if len(self.seen) > self.max_size:
+            self.seen.popitem(last=False)
+        return False
@@ -0,0 +1,177 @@
+import sys
+import struct
+import logging
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Slot header: sequence number, payload length, camera id (utf-8, NUL padded)
+SLOT_HEADER = struct.Struct("<QI32s")
+
+FrameNotification = namedtuple("FrameNotification", ["camera_id", "slot", "seq", "length"])
+
+
+def attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to an existing segment without registering it with this
+    process' resource tracker, which would unlink it from under the writer
+    and every other reader when this process exits.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class SharedFrameStore:
+    """
+    Ring of fixed-size frame slots in a shared memory segment.
+
+    A single writer (the LPR ingest process) copies each live frame into the
+    next slot and hands out a small ``FrameNotification``. Readers in other
+    processes attach to the same segment by name and get a zero-copy
+    ``memoryview`` of the frame. A slot is recycled once the ring wraps, so a
+    reader must check ``is_current`` after consuming the view.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, slot_size: int, owner: bool):
+        self.shm = shm
+        self.slots = slots
+        self.slot_size = slot_size
+        self.owner = owner
+        self.stride = SLOT_HEADER.size + slot_size
+        self.next_seq = 1
+
+    @classmethod
+    def create(cls, name: str, slots: int, slot_size: int) -> "SharedFrameStore":
+        size = slots * (SLOT_HEADER.size + slot_size)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a crashed writer; take it over instead of failing
+            shm = shared_memory.SharedMemory(name=name)
+            if shm.size < size:
+                shm.close()
+                shm.unlink()
+                shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            else:
+                # A fresh segment is zero-filled; a leftover one only needs its stale slot headers cleared
+                stride = SLOT_HEADER.size + slot_size
+                for slot in range(slots):
+                    SLOT_HEADER.pack_into(shm.buf, slot * stride, 0, 0, b"")
+        logger.info(f"Created shared frame store '{name}' with {slots} slots of {slot_size} bytes")
+        return cls(shm, slots, slot_size, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, slots: int, slot_size: int) -> "SharedFrameStore":
+        shm = attach_untracked(name)
+        logger.info(f"Attached to shared frame store '{name}'")
+        return cls(shm, slots, slot_size, owner=False)
+
+    def _offset(self, slot: int) -> int:
+        return slot * self.stride
+
+    def write(self, camera_id, data) -> Optional[FrameNotification]:
+        """
+        Copies a frame into the next slot and returns its notification.
+        Frames larger than a slot are rejected.
+        """
+        length = len(data)
+        if length > self.slot_size:
+            logger.warning(f"Frame of {length} bytes from camera {camera_id} exceeds slot size {self.slot_size}")
+            return None
+
+        seq = self.next_seq
+        self.next_seq += 1
+        slot = seq % self.slots
+        offset = self._offset(slot)
+        camera_key = str(camera_id).encode("utf-8")[:32]
+        buf = self.shm.buf
+
+        # Invalidate the slot first so a concurrent reader never validates a half-written frame
+        SLOT_HEADER.pack_into(buf, offset, 0, 0, b"")
+        start = offset + SLOT_HEADER.size
+        buf[start:start + length] = data
+        SLOT_HEADER.pack_into(buf, offset, seq, length, camera_key)
+        return FrameNotification(str(camera_id), slot, seq, length)
+
+    def is_current(self, slot: int, seq: int) -> bool:
+        current_seq, _, _ = SLOT_HEADER.unpack_from(self.shm.buf, self._offset(slot))
+        return current_seq == seq
+
+    def read(self, slot: int, seq: int, length: int) -> Optional[memoryview]:
+        """
+        Returns a zero-copy view of the frame, or None if the slot was already
+        reused for a newer frame.
+        """
+        if not self.is_current(slot, seq):
+            return None
+        start = self._offset(slot) + SLOT_HEADER.size
+        return self.shm.buf[start:start + length]
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+_writer_store: Optional[SharedFrameStore] = None
+_reader_store: Optional[SharedFrameStore] = None
+
+
+def get_frame_store_writer() -> Optional[SharedFrameStore]:
+    """
+    Returns this process' writer store, creating the segment on first use.
+    None when the shared-memory transport is disabled.
+    """
+    global _writer_store
+    if not settings.LIVE_FRAME_SHM_NAME:
+        return None
+    if _writer_store is None:
+        _writer_store = SharedFrameStore.create(
+            settings.LIVE_FRAME_SHM_NAME,
+            settings.LIVE_FRAME_SHM_SLOTS,
+            settings.LIVE_FRAME_SHM_SLOT_SIZE,
+        )
+    return _writer_store
+
+
+def get_frame_store_reader() -> Optional[SharedFrameStore]:
+    """
+    Returns a store to read notified frames from. Reuses the writer when the
+    ingest runs in this process, otherwise attaches to the existing segment.
+    """
+    global _reader_store
+    if not settings.LIVE_FRAME_SHM_NAME:
+        return None
+    if _writer_store is not None:
+        return _writer_store
+    if _reader_store is None:
+        try:
+            _reader_store = SharedFrameStore.attach(
+                settings.LIVE_FRAME_SHM_NAME,
+                settings.LIVE_FRAME_SHM_SLOTS,
+                settings.LIVE_FRAME_SHM_SLOT_SIZE,
+            )
+        except FileNotFoundError:
+            logger.warning(f"Shared frame store '{settings.LIVE_FRAME_SHM_NAME}' does not exist yet")
+            return None
+    return _reader_store
+
+
+def close_frame_stores():
+    global _writer_store, _reader_store
+    for store in (_writer_store, _reader_store):
+        if store is not None:
+            store.close()
+    _writer_store = None
+    _reader_store = None
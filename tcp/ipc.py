@@ -0,0 +1,242 @@
+import os
+import json
+import uuid
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException, status
+
+from tcp.frame_store import FrameNotification
+
+logger = logging.getLogger(__name__)
+
+
+# Lines carry whole decoded LPR messages, so allow far more than asyncio's 64KB default
+STREAM_LIMIT = 16 * 1024 * 1024
+# A worker that stops reading is dropped from fan-out instead of buffering without bound
+MAX_CLIENT_BUFFER = 8 * 1024 * 1024
+RECONNECT_DELAY = 1.0
+
+
+def _encode(message: dict) -> bytes:
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class IngestIPCServer:
+    """
+    Unix socket server run by the standalone ingest process.
+
+    API workers connect to it to receive decoded LPR events and to forward
+    commands to the LPR connections owned by the ingest process. Messages are
+    newline delimited JSON objects with a ``type`` of ``event``,
+    ``live_frame``, ``command`` or ``reply``.
+
+    The API workers of a host talk to exactly one ingest process, the one
+    listening on INGEST_IPC_PATH, so only one ingest process runs per host;
+    shards are spread across hosts, each with its own API workers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.inode: Optional[int] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.clients = set()
+        self.handlers: Dict[str, Callable[[dict], Awaitable]] = {}
+
+    def register(self, command: str, handler: Callable[[dict], Awaitable]):
+        self.handlers[command] = handler
+
+    async def start(self):
+        if os.path.exists(self.path):
+            await self._remove_stale_socket()
+        self.server = await asyncio.start_unix_server(self._handle_client, path=self.path, limit=STREAM_LIMIT)
+        self.inode = os.stat(self.path).st_ino
+        logger.info(f"Ingest IPC server listening on {self.path}")
+
+    async def _remove_stale_socket(self):
+        """
+        Removes the socket file a crashed ingest process left behind. A socket
+        that still accepts connections belongs to a running ingest process,
+        whose API workers would silently lose it if it were unlinked.
+        """
+        try:
+            _, writer = await asyncio.open_unix_connection(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            return
+        writer.close()
+        raise RuntimeError(f"Another ingest process is already listening on {self.path}")
+
+    async def stop(self):
+        for writer in list(self.clients):
+            writer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        # Leave the socket alone if another ingest process has taken the path over since
+        try:
+            if os.stat(self.path).st_ino == self.inode:
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients.add(writer)
+        logger.info(f"API worker connected to ingest IPC ({len(self.clients)} connected)")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError as error:
+                    logger.error(f"Invalid IPC message from API worker: {error}")
+                    continue
+                if message.get("type") == "command":
+                    asyncio.create_task(self._run_command(writer, message))
+        except (ConnectionError, ValueError) as error:
+            logger.warning(f"Dropping API worker connection: {error}")
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+            logger.info(f"API worker disconnected from ingest IPC ({len(self.clients)} connected)")
+
+    async def _run_command(self, writer: asyncio.StreamWriter, message: dict):
+        reply = {"type": "reply", "id": message.get("id")}
+        handler = self.handlers.get(message.get("command"))
+        if handler is None:
+            reply.update(ok=False, status_code=400, error=f"Unknown command: {message.get('command')}")
+        else:
+            try:
+                reply.update(ok=True, result=await handler(message.get("payload") or {}))
+            except HTTPException as error:
+                reply.update(ok=False, status_code=error.status_code, error=error.detail)
+            except Exception as error:
+                logger.error(f"IPC command '{message.get('command')}' failed: {error}")
+                reply.update(ok=False, status_code=500, error=str(error))
+        if not writer.is_closing():
+            writer.write(_encode(reply))
+
+    def _broadcast(self, message: dict):
+        if not self.clients:
+            return
+        data = _encode(message)
+        for writer in list(self.clients):
+            if writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                logger.warning("API worker is not keeping up with ingest events; dropping event")
+                continue
+            writer.write(data)
+
+    async def publish_event(self, event_name, data):
+        self._broadcast({"type": "event", "event": event_name, "data": data})
+
+    async def publish_live_frame(self, notification: FrameNotification):
+        self._broadcast({"type": "live_frame", "notification": list(notification)})
+
+
+class IngestIPCClient:
+    """
+    Connection from an API worker to the standalone ingest process.
+
+    Events received from the ingest process are handed to ``event_sink`` and
+    ``live_frame_sink``; commands are sent with ``request`` and resolved by the
+    matching reply. The client reconnects on its own if the ingest process
+    restarts.
+    """
+
+    def __init__(self, path: str, event_sink, live_frame_sink):
+        self.path = path
+        self.event_sink = event_sink
+        self.live_frame_sink = live_frame_sink
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if self.writer is not None:
+            self.writer.close()
+
+    async def _run(self):
+        while True:
+            try:
+                reader, self.writer = await asyncio.open_unix_connection(self.path, limit=STREAM_LIMIT)
+                logger.info(f"Connected to ingest process at {self.path}")
+                await self._read_loop(reader)
+            except (ConnectionError, FileNotFoundError, ValueError) as error:
+                logger.warning(f"Ingest process unavailable at {self.path}: {error}")
+            finally:
+                if self.writer is not None:
+                    self.writer.close()
+                self.writer = None
+                self._fail_pending("Connection to the ingest process was lost")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError as error:
+                logger.error(f"Invalid IPC message from ingest process: {error}")
+                continue
+
+            message_type = message.get("type")
+            if message_type == "event":
+                asyncio.create_task(self.event_sink(message["event"], message["data"]))
+            elif message_type == "live_frame":
+                asyncio.create_task(self.live_frame_sink(FrameNotification(*message["notification"])))
+            elif message_type == "reply":
+                future = self.pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+
+    def _fail_pending(self, reason: str):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, reason))
+        self.pending.clear()
+
+    async def request(self, command: str, payload: dict, timeout: float = 5.0):
+        """
+        Sends a command to the ingest process and waits for its reply.
+        """
+        if not self.connected:
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Ingest process is not connected")
+
+        request_id = str(uuid.uuid4())
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(_encode({"type": "command", "id": request_id, "command": command, "payload": payload}))
+        try:
+            reply = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status.HTTP_504_GATEWAY_TIMEOUT, f"Ingest process did not answer '{command}' in time")
+        finally:
+            self.pending.pop(request_id, None)
+
+        if not reply.get("ok"):
+            raise HTTPException(reply.get("status_code", 500), reply.get("error", "Command failed"))
+        return reply.get("result")
+
+
+# Set by the API lifespan when LPR connections are owned by the ingest process
+ingest_client: Optional[IngestIPCClient] = None
@@ -0,0 +1,404 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import fcntl
+import struct
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Record header: crc32 of the payload, sequence number, wall clock time, payload length
+RECORD_HEADER = struct.Struct("<IQdI")
+SEGMENT_SUFFIX = ".seg"
+# Each process appends to its own journal directory, claimed with a file lock
+MAX_JOURNALS = 64
+
+
+def read_segment(path: str, position: int, max_records: int) -> List[Tuple[int, float, bytes, int]]:
+    """
+    Reads up to ``max_records`` complete records of a segment through mmap,
+    starting at byte ``position``. Returns (seq, timestamp, payload, end)
+    tuples; a torn or corrupt tail record ends the read.
+    """
+    records = []
+    try:
+        with open(path, "rb") as segment:
+            size = os.fstat(segment.fileno()).st_size
+            if size <= position:
+                return records
+            with mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                while len(records) < max_records and position + RECORD_HEADER.size <= size:
+                    crc, seq, timestamp, length = RECORD_HEADER.unpack_from(view, position)
+                    start = position + RECORD_HEADER.size
+                    end = start + length
+                    if end > size:
+                        break
+                    payload = view[start:end]
+                    if zlib.crc32(payload) != crc:
+                        break
+                    records.append((seq, timestamp, payload, end))
+                    position = end
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class EventJournal:
+    """
+    Segmented, append-only log of decoded LPR events.
+
+    Every event gets a sequence number and is written to the active segment
+    before anything downstream sees it. Segments roll over by size and age
+    and are named after their first sequence number. Consumers read them
+    back through mmap and track their own offsets, so a slow or failing
+    consumer never blocks ingest and catches up on its own.
+    """
+
+    def __init__(self, root: str, segment_max_bytes: int, segment_max_age: float):
+        self.root = root
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+        self.directory: Optional[str] = None
+        self.lock_file = None
+        self.file = None
+        self.segment_base = 0
+        self.segment_size = 0
+        self.segment_opened_at = 0.0
+        self.next_seq = 1
+
+    @property
+    def is_open(self) -> bool:
+        return self.file is not None
+
+    def segment_bases(self) -> List[int]:
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def segment_path(self, base: int) -> str:
+        return os.path.join(self.directory, f"{base:020d}{SEGMENT_SUFFIX}")
+
+    def open(self):
+        for index in range(MAX_JOURNALS):
+            directory = os.path.join(self.root, f"journal-{index}")
+            os.makedirs(directory, exist_ok=True)
+            lock_file = open(os.path.join(directory, "LOCK"), "w")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            self.directory = directory
+            self.lock_file = lock_file
+            break
+        else:
+            raise RuntimeError(f"All {MAX_JOURNALS} journals under {self.root} are in use")
+
+        bases = self.segment_bases()
+        if bases:
+            self._recover(bases[-1])
+        else:
+            self._open_segment(self.next_seq)
+        logger.info(f"Opened event journal {self.directory} at sequence {self.next_seq}")
+
+    def _recover(self, base: int):
+        """
+        Finds the end of the last intact record of the newest segment and
+        drops anything after it, e.g. a record torn by a crash.
+        """
+        path = self.segment_path(base)
+        end = 0
+        self.next_seq = base
+        while True:
+            records = read_segment(path, end, 10000)
+            if not records:
+                break
+            self.next_seq = records[-1][0] + 1
+            end = records[-1][3]
+        with open(path, "r+b") as segment:
+            segment.truncate(end)
+        self.file = open(path, "ab")
+        self.segment_base = base
+        self.segment_size = end
+        self.segment_opened_at = time.monotonic()
+
+    def _open_segment(self, base: int):
+        self.file = open(self.segment_path(base), "ab")
+        self.segment_base = base
+        self.segment_size = 0
+        self.segment_opened_at = time.monotonic()
+
+    def _roll(self):
+        self.sync()
+        self.file.close()
+        self._open_segment(self.next_seq)
+
+    def roll_if_due(self):
+        if self.segment_size and time.monotonic() - self.segment_opened_at >= self.segment_max_age:
+            self._roll()
+
+    def append(self, event: dict) -> int:
+        """
+        Writes an event and returns its sequence number. The record reaches
+        the OS before returning, so it survives a crash of this process.
+        """
+        if self.segment_size >= self.segment_max_bytes:
+            self._roll()
+        else:
+            self.roll_if_due()
+
+        payload = json.dumps(event, separators=(",", ":")).encode("utf-8")
+        seq = self.next_seq
+        self.file.write(RECORD_HEADER.pack(zlib.crc32(payload), seq, time.time(), len(payload)))
+        self.file.write(payload)
+        self.file.flush()
+        self.next_seq += 1
+        self.segment_size += RECORD_HEADER.size + len(payload)
+        return seq
+
+    def sync(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def remove_segments_through(self, seq: int):
+        """
+        Deletes segments whose records all have a sequence number <= seq.
+        The active segment is always kept.
+        """
+        bases = self.segment_bases()
+        for base, next_base in zip(bases, bases[1:]):
+            if next_base - 1 <= seq and base != self.segment_base:
+                os.remove(self.segment_path(base))
+                logger.info(f"Removed consumed journal segment {base}")
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+
+def dead_letter_path(directory: str, name: str) -> str:
+    return os.path.join(directory, "deadletter", f"{name}.jsonl")
+
+
+def write_dead_letter(path: str, seq: int, payload: bytes, error: Exception):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {"seq": seq, "error": str(error), "payload": bytes(payload).decode("utf-8", "replace")}
+    with open(path, "a") as dead_letter_file:
+        dead_letter_file.write(json.dumps(entry) + "\n")
+
+
+async def replay_dead_letters(path: str, handler: Callable[[List[dict]], Awaitable]) -> Tuple[int, int]:
+    """
+    Feeds every record of a dead-letter file to ``handler`` again, one at a
+    time. Records that fail again are written back to the file with their new
+    error. Returns (replayed, failed).
+
+    The file is first renamed aside, so a running consumer keeps appending
+    to a fresh one; a replay interrupted before finishing is picked up again
+    from the renamed file by the next run.
+    """
+    replaying_path = f"{path}.replaying"
+    if not os.path.exists(replaying_path):
+        try:
+            os.replace(path, replaying_path)
+        except FileNotFoundError:
+            return 0, 0
+
+    with open(replaying_path) as replaying_file:
+        entries = [json.loads(line) for line in replaying_file if line.strip()]
+    replayed = failed = 0
+    for entry in entries:
+        try:
+            await handler([json.loads(entry["payload"])])
+            replayed += 1
+        except Exception as error:
+            write_dead_letter(path, entry["seq"], entry["payload"].encode("utf-8"), error)
+            failed += 1
+            logger.error(f"Dead-lettered sequence {entry['seq']} failed again: {error}")
+    os.remove(replaying_path)
+    return replayed, failed
+
+
+class JournalConsumer:
+    """
+    Feeds journal records to ``handler`` in batches and remembers how far it
+    got in its own offset file.
+
+    Failures ``is_transient`` recognises as a downstream outage are retried
+    for as long as the outage lasts, so no record is lost to it. Any other
+    failure of a batch retries its records one at a time, so a single bad
+    record only holds back itself. A record that still fails after
+    ``max_attempts`` such tries is written to the consumer's dead-letter file
+    and skipped; otherwise it would stop the offset, and with it the deletion
+    of every later segment, for good. ``replay_dead_letters`` feeds it back.
+    """
+
+    def __init__(self, journal: EventJournal, name: str, handler: Callable[[List[dict]], Awaitable],
+                 batch_size: int, poll_interval: float, retry_delay: float, max_attempts: int,
+                 is_transient: Callable[[Exception], bool]):
+        self.journal = journal
+        self.name = name
+        self.handler = handler
+        self.is_transient = is_transient
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.max_attempts = max(1, max_attempts)
+        self.dead_lettered = 0
+        self.committed = 0
+        self.segment_base: Optional[int] = None
+        self.position = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def offset_path(self) -> str:
+        return os.path.join(self.journal.directory, "offsets", self.name)
+
+    def _load_offset(self):
+        try:
+            with open(self.offset_path) as offset_file:
+                self.committed = int(offset_file.read().strip() or 0)
+        except FileNotFoundError:
+            self.committed = 0
+
+    def _commit(self, seq: int):
+        os.makedirs(os.path.dirname(self.offset_path), exist_ok=True)
+        temp_path = f"{self.offset_path}.tmp"
+        with open(temp_path, "w") as offset_file:
+            offset_file.write(str(seq))
+        os.replace(temp_path, self.offset_path)
+        self.committed = seq
+
+    def rewind(self, seq: int):
+        """
+        Makes the consumer resume after ``seq`` when it starts, if its offset
+        is ahead of that, e.g. to rebuild state from a snapshot taken at seq.
+        """
+        self._load_offset()
+        if seq < self.committed:
+            self._commit(seq)
+
+    @property
+    def dead_letter_path(self) -> str:
+        return dead_letter_path(self.journal.directory, self.name)
+
+    def _dead_letter(self, seq: int, payload: bytes, error: Exception):
+        write_dead_letter(self.dead_letter_path, seq, payload, error)
+        self.dead_lettered += 1
+        logger.error(
+            f"Journal consumer '{self.name}' gave up on sequence {seq} after {self.max_attempts} attempts, "
+            f"moved it to {self.dead_letter_path}: {error}"
+        )
+
+    @property
+    def lag(self) -> int:
+        return self.journal.next_seq - 1 - self.committed
+
+    def status(self) -> dict:
+        return {"name": self.name, "committed": self.committed, "lag": self.lag, "dead_lettered": self.dead_lettered}
+
+    def _read_batch(self) -> List[Tuple[int, bytes, int]]:
+        bases = self.journal.segment_bases()
+        if not bases:
+            return []
+        if self.segment_base is None or self.segment_base not in bases:
+            # Start from the segment holding the first uncommitted record
+            wanted = self.committed + 1
+            candidates = [base for base in bases if base <= wanted]
+            self.segment_base = candidates[-1] if candidates else bases[0]
+            self.position = 0
+
+        while True:
+            records = read_segment(self.journal.segment_path(self.segment_base), self.position, self.batch_size)
+            fresh = [(seq, payload, end) for seq, _, payload, end in records if seq > self.committed]
+            if fresh:
+                return fresh
+            if records:
+                # Skip records committed before a restart
+                self.position = records[-1][3]
+                continue
+            later = [base for base in bases if base > self.segment_base]
+            if not later:
+                return []
+            self.segment_base = later[0]
+            self.position = 0
+
+    async def start(self):
+        self._load_offset()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            batch = self._read_batch()
+            if not batch:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self.handler([json.loads(payload) for _, payload, _ in batch])
+            except Exception as error:
+                if self.is_transient(error):
+                    logger.error(
+                        f"Journal consumer '{self.name}' can't reach its downstream at sequence {batch[0][0]}, "
+                        f"retrying in {self.retry_delay}s: {error}"
+                    )
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+                logger.error(
+                    f"Journal consumer '{self.name}' failed at sequence {batch[0][0]}, "
+                    f"retrying record by record: {error}"
+                )
+                await self._run_one_by_one(batch)
+                continue
+            self.position = batch[-1][2]
+            self._commit(batch[-1][0])
+
+    async def _run_one_by_one(self, batch: List[Tuple[int, bytes, int]]):
+        for seq, payload, end in batch:
+            # Only failures of the record itself count towards max_attempts
+            attempt = 0
+            while True:
+                try:
+                    await self.handler([json.loads(payload)])
+                    break
+                except Exception as error:
+                    if not self.is_transient(error):
+                        attempt += 1
+                        if attempt >= self.max_attempts:
+                            self._dead_letter(seq, payload, error)
+                            break
+                    logger.error(f"Journal consumer '{self.name}' failed at sequence {seq} (attempt {attempt}): {error}")
+                    await asyncio.sleep(self.retry_delay)
+            self.position = end
+            self._commit(seq)
+
+
+event_journal = EventJournal(
+    root=settings.JOURNAL_DIR or "journal",
+    segment_max_bytes=settings.JOURNAL_SEGMENT_MAX_BYTES,
+    segment_max_age=settings.JOURNAL_SEGMENT_MAX_AGE,
+)
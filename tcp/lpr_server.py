@@ -0,0 +1,70 @@
+import json
+import uuid
+from typing import Optional
+from twisted.internet import protocol, ssl
+
+from settings import settings
+
+
+def lpr_server_context(cert_path: Optional[str] = None, key_path: Optional[str] = None) -> ssl.DefaultOpenSSLContextFactory:
+    """
+    TLS context for a stand-in LPR. The client certificate in cert/ is
+    signed by the same CA the TCP client verifies against, so it doubles
+    as the server certificate.
+    """
+    return ssl.DefaultOpenSSLContextFactory(
+        key_path or settings.CLIENT_KEY_PATH or "cert/client.key",
+        cert_path or settings.CLIENT_CERT_PATH or "cert/client.crt",
+    )
+
+
+class LprServerProtocol(protocol.Protocol):
+    """
+    Server side of the LPR protocol, as spoken to SimpleTCPClient: clients
+    send newline-delimited JSON, the LPR answers with <END>-delimited JSON.
+
+    Any token is accepted. Authentication and heartbeats are acknowledged;
+    subclasses decide what to stream once the client is authenticated.
+    """
+
+    def __init__(self):
+        self.buffer = b""
+        self.authenticated = False
+
+    def dataReceived(self, data):
+        self.buffer += data
+        while b"\n" in self.buffer:
+            line, self.buffer = self.buffer.split(b"\n", 1)
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            message_type = message.get("messageType")
+            if message_type in ("authentication", "heartbeat"):
+                self.acknowledge(message.get("messageId"))
+            if message_type == "authentication" and not self.authenticated:
+                self.authenticated = True
+                self.on_authenticated()
+            elif message_type not in ("authentication", "heartbeat"):
+                self.on_command(message)
+
+    def acknowledge(self, message_id):
+        self.send_message({
+            "messageId": str(uuid.uuid4()),
+            "messageType": "acknowledge",
+            "messageBody": {"replyTo": message_id},
+        })
+
+    def send_message(self, message: dict):
+        self.send_frame(json.dumps(message).encode("utf-8"))
+
+    def send_frame(self, frame: bytes):
+        self.transport.write(frame + b"<END>")
+
+    def on_authenticated(self):
+        pass
+
+    def on_command(self, message: dict):
+        pass
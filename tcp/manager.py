@@ -1,34 +1,102 @@
 import asyncio
-from typing import Dict, Optional
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional
+from fastapi import HTTPException
 from twisted.internet import protocol
-from threading import Lock
+
+from tcp.tcp_client import connect_to_server, disconnect_from_server, send_command_to_server
 
 class TCPConnectionManager:
+    """
+    Registry of the LPR connections owned by this process.
+
+    Writers serialise on an asyncio lock and publish a new immutable mapping,
+    so readers (command dispatch, the monitoring endpoint) never take a lock
+    and never observe a half-updated registry.
+    """
+
     def __init__(self):
-        # Using an asyncio lock to manage concurrent access to the connections
-        self.connections: Dict[int, protocol.ReconnectingClientFactory] = {}
-        self.lock = Lock()
+        self.connections: Mapping[int, protocol.ReconnectingClientFactory] = MappingProxyType({})
+        self.lock = asyncio.Lock()
+
+    def _publish(self, connections: Dict[int, protocol.ReconnectingClientFactory]):
+        self.connections = MappingProxyType(connections)
 
     async def add_connection(self, client_id: int, factory: protocol.ReconnectingClientFactory):
-        with self.lock:
+        async with self.lock:
             if client_id not in self.connections:
-                self.connections[client_id] = factory
+                self._publish({**self.connections, client_id: factory})
                 print(f"[INFO] Added connection for LPR {client_id}")
         print(f"-------all available connections are: {len(self.connections)}--------")
+
     async def remove_connection(self, client_id: int):
-        with self.lock:
+        async with self.lock:
             if client_id in self.connections:
-                del self.connections[client_id]
+                connections = dict(self.connections)
+                del connections[client_id]
+                self._publish(connections)
                 print(f"[INFO] Removed connection for LPR {client_id}")
 
     async def get_connection(self, client_id: int) -> Optional[protocol.ReconnectingClientFactory]:
-        with self.lock:
-            print(f"-------all available connections are: {self.connections}--------")
-            return self.connections.get(client_id)
+        return self.connections.get(client_id)
+
+    async def get_all_connections(self) -> Mapping[int, protocol.ReconnectingClientFactory]:
+        return self.connections
+
+    def snapshot(self) -> List[dict]:
+        """
+        Point-in-time state and counters of every connection, cheap enough
+        to serve on every poll of a monitoring dashboard.
+        """
+        return [
+            {
+                "lpr_id": client_id,
+                "ip": factory.server_ip,
+                "port": factory.port,
+                **factory.stats.snapshot(),
+            }
+            for client_id, factory in self.connections.items()
+        ]
+
+    async def open_connection(self, lpr, delay=None):
+        """
+        Connects to an LPR unless this process already holds a connection to it.
+        """
+        async with self.lock:
+            factory = self.connections.get(lpr.id)
+            if factory:
+                return factory
+            factory = connect_to_server(
+                server_ip=lpr.ip,
+                port=lpr.port,
+                auth_token=lpr.auth_token,
+                delay=delay
+            )
+            self._publish({**self.connections, lpr.id: factory})
+            print(f"[INFO] Added connection for LPR {lpr.id}")
+        return factory
+
+    async def close_connection(self, client_id: int):
+        """
+        Closes the connection to an LPR and forgets it.
+        """
+        async with self.lock:
+            connections = dict(self.connections)
+            factory = connections.pop(client_id, None)
+            self._publish(connections)
+        if factory:
+            disconnect_from_server(factory)
+            print(f"[INFO] Closed connection for LPR {client_id}")
+
+    async def send_command(self, client_id: int, command_data: dict):
+        factory = await self.get_connection(client_id)
+        if not factory:
+            raise HTTPException(status_code=404, detail="TCP client for the requested camera not found")
+
+        if not factory.authenticated:
+            raise HTTPException(status_code=400, detail=f"TCP client: {client_id} is not authenticated or connected")
 
-    async def get_all_connections(self) -> Dict[int, protocol.ReconnectingClientFactory]:
-        with self.lock:
-            return self.connections
+        send_command_to_server(factory, command_data)
 
 
 connection_manager = TCPConnectionManager()
@@ -0,0 +1,305 @@
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.future import select
+
+from settings import settings
+from db.engine import engine, async_session
+from lpr.model import DBGate, DBLpr
+from lpr.crud import LPR_CHANGES_CHANNEL
+from tcp.manager import connection_manager
+from tcp.warmup import lpr_warmup
+from db.listener import db_listener
+
+logger = logging.getLogger(__name__)
+
+
+# First key of the two-key advisory lock form; the second key is the shard number
+LPR_LOCK_NAMESPACE = 0x4C5052
+# Single-key advisory lock held by the one API process running ingest embedded
+EMBEDDED_INGEST_LOCK = 0x4C505245
+
+
+def building_shard(building_id: int, shard_count: int) -> int:
+    return building_id % shard_count
+
+
+class LprOwnershipCoordinator:
+    """
+    Makes sure every LPR is connected by exactly one process.
+
+    LPRs are split into LPR_SHARD_COUNT shards by the building of their gate,
+    so every read of a building reaches the same process and its visit
+    tracker sees both the entrance and the exit. Each shard is guarded by a
+    Postgres session-level advisory lock held on a dedicated connection.
+    A process claims one free shard right away and claims further free shards
+    only after they have stayed free for LPR_OWNERSHIP_TAKEOVER_GRACE seconds,
+    which spreads shards across workers that start together. When an owner
+    dies its database session ends, the lock is released and a surviving
+    process takes the shard over on its next poll.
+    """
+
+    def __init__(self, shard_count: int, poll_interval: float, takeover_grace: float):
+        self.shard_count = max(1, shard_count)
+        self.poll_interval = poll_interval
+        self.takeover_grace = takeover_grace
+        self.lock_connection: Optional[AsyncConnection] = None
+        self.owned_shards: Dict[int, Set[int]] = {}
+        self.free_since: Dict[int, float] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.reconcile_lock = asyncio.Lock()
+        self.embedded = False
+        self.embedded_locked = False
+
+    def owning_shard(self, lpr_id: int) -> Optional[int]:
+        for shard, lpr_ids in self.owned_shards.items():
+            if lpr_id in lpr_ids:
+                return shard
+        return None
+
+    def readiness(self) -> dict:
+        """
+        Warmup status of the owned shards. Not ready until this process has
+        claimed a shard and warmed it up, so a process that owns none is
+        never reported ready.
+        """
+        status = lpr_warmup.status()
+        status["owned_shards"] = sorted(self.owned_shards)
+        status["ready"] = bool(self.owned_shards) and status["ready"]
+        return status
+
+    async def claim_embedded(self, timeout: float):
+        """
+        Makes this the only API process running ingest embedded.
+
+        Events are emitted to the Socket.IO clients of the process holding the
+        connections only, and commands and status endpoints see only its own
+        connections, so a second embedded worker would serve clients that never
+        get any data. It is refused instead: several workers need
+        INGEST_MODE=external with ingest.py, which relays to every worker.
+        Waits up to ``timeout`` seconds for a previous process to go away.
+        """
+        self.embedded = True
+        await self._ensure_lock_connection()
+        deadline = time.monotonic() + timeout
+        while not await self._try_embedded_lock():
+            if time.monotonic() >= deadline:
+                raise RuntimeError(
+                    "Another API process already runs LPR ingest embedded; "
+                    "run several workers with INGEST_MODE=external and ingest.py"
+                )
+            await asyncio.sleep(self.poll_interval)
+
+    async def _try_embedded_lock(self) -> bool:
+        result = await self.lock_connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"),
+            {"key": EMBEDDED_INGEST_LOCK},
+        )
+        self.embedded_locked = bool(result.scalar())
+        return self.embedded_locked
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self._release_all()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._poll()
+            except SQLAlchemyError as error:
+                # Without a healthy lock session we can no longer prove ownership
+                logger.error(f"LPR ownership lock session failed: {error}")
+                await self._release_all()
+            except Exception as error:
+                logger.error(f"LPR ownership poll failed: {error}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _ensure_lock_connection(self):
+        if self.lock_connection is None:
+            connection = await engine.connect()
+            # Session-level locks outlive transactions; stay out of a long-running one
+            self.lock_connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        else:
+            await self.lock_connection.execute(text("SELECT 1"))
+
+    async def _poll(self):
+        await self._ensure_lock_connection()
+        # The embedded lock went with a failed lock session; take it back before any shard
+        if self.embedded and not self.embedded_locked and not await self._try_embedded_lock():
+            logger.error("Another API process runs LPR ingest embedded, not claiming LPR shards")
+            return
+
+        result = await self.lock_connection.execute(
+            text(
+                "SELECT objid FROM pg_locks "
+                "WHERE locktype = 'advisory' AND classid = :namespace AND objsubid = 2 AND granted "
+                "AND database = (SELECT oid FROM pg_database WHERE datname = current_database())"
+            ),
+            {"namespace": LPR_LOCK_NAMESPACE},
+        )
+        held = {row[0] for row in result}
+
+        now = time.monotonic()
+        for shard in range(self.shard_count):
+            if shard in held or shard in self.owned_shards:
+                self.free_since.pop(shard, None)
+                continue
+            free_since = self.free_since.setdefault(shard, now)
+            # Take one shard immediately; leave the rest to other workers for a grace period
+            if self.owned_shards and now - free_since < self.takeover_grace:
+                continue
+            if await self._try_lock(shard):
+                self.free_since.pop(shard, None)
+                try:
+                    await self._connect_shard(shard)
+                except Exception as error:
+                    # Give the shard back rather than hold it without connecting its LPRs
+                    logger.error(f"Couldn't connect the LPRs of shard {shard}: {error}")
+                    await self._release_shard(shard)
+
+    async def _try_lock(self, shard: int) -> bool:
+        result = await self.lock_connection.execute(
+            text("SELECT pg_try_advisory_lock(:namespace, :shard)"),
+            {"namespace": LPR_LOCK_NAMESPACE, "shard": shard},
+        )
+        acquired = bool(result.scalar())
+        if acquired:
+            logger.info(f"Acquired ownership of LPR shard {shard}/{self.shard_count}")
+            print(f"[INFO] Acquired ownership of LPR shard {shard}/{self.shard_count}")
+        return acquired
+
+    async def _release_shard(self, shard: int):
+        for lpr_id in self.owned_shards.pop(shard, ()):
+            await connection_manager.close_connection(lpr_id)
+        try:
+            await self.lock_connection.execute(
+                text("SELECT pg_advisory_unlock(:namespace, :shard)"),
+                {"namespace": LPR_LOCK_NAMESPACE, "shard": shard},
+            )
+        except Exception as error:
+            # The lock goes with the session once _run discards it
+            logger.warning(f"Couldn't release LPR shard {shard}: {error}")
+            return
+        logger.info(f"Released ownership of LPR shard {shard}")
+
+    async def _connect_shard(self, shard: int):
+        async with async_session() as session:
+            result = await session.execute(
+                select(DBLpr).join(DBGate, DBLpr.gate_id == DBGate.id).where(
+                    DBGate.building_id % self.shard_count == shard,
+                    DBLpr.is_active == True,
+                )
+            )
+            lprs = result.scalars().unique().all()
+
+        self.owned_shards[shard] = {lpr.id for lpr in lprs}
+        lpr_warmup.schedule(lprs)
+        logger.info(f"Shard {shard} owns {len(lprs)} LPRs, warming up connections")
+
+    async def on_lpr_changed(self, payload: str):
+        """
+        Handles an ``lpr_changes`` notification sent by the LPR CRUD operations.
+        """
+        try:
+            lpr_id = int(payload)
+        except ValueError:
+            logger.error(f"Invalid LPR change notification: {payload}")
+            return
+        # The shard follows the LPR's gate, which the change may have moved to another building
+        if self.owned_shards:
+            await self.reconcile(lpr_id)
+
+    async def reconcile(self, lpr_id: int):
+        """
+        Brings one LPR's connection in line with its database row: connects
+        new LPRs of owned shards, reconnects when ip, port or token changed
+        and closes deleted or deactivated ones and those whose gate moved to
+        a building of another shard. Other connections are untouched.
+        """
+        async with self.reconcile_lock:
+            async with async_session() as session:
+                result = await session.execute(
+                    select(DBLpr, DBGate.building_id)
+                    .join(DBGate, DBLpr.gate_id == DBGate.id)
+                    .where(DBLpr.id == lpr_id)
+                )
+                row = result.unique().one_or_none()
+            lpr, building_id = row if row is not None else (None, None)
+            shard = building_shard(building_id, self.shard_count) if lpr is not None else None
+            previous_shard = self.owning_shard(lpr_id)
+
+            factory = await connection_manager.get_connection(lpr_id)
+            if lpr is None or not lpr.is_active or shard not in self.owned_shards:
+                if previous_shard is not None:
+                    self.owned_shards[previous_shard].discard(lpr_id)
+                if factory:
+                    await connection_manager.close_connection(lpr_id)
+                    logger.info(f"Closed connection for removed, inactive or moved LPR {lpr_id}")
+                return
+            if previous_shard is not None and previous_shard != shard:
+                self.owned_shards[previous_shard].discard(lpr_id)
+
+            if factory and (factory.server_ip, factory.port, factory.auth_token) != (lpr.ip, lpr.port, lpr.auth_token):
+                await connection_manager.close_connection(lpr_id)
+                logger.info(f"Reconnecting LPR {lpr_id} to {lpr.ip}:{lpr.port} after a configuration change")
+                factory = None
+
+            self.owned_shards[shard].add(lpr_id)
+            if not factory:
+                lpr_warmup.schedule([lpr])
+
+    async def resync(self):
+        """
+        Reconciles every LPR of the owned shards, e.g. after change
+        notifications may have been missed.
+        """
+        for shard in list(self.owned_shards):
+            async with async_session() as session:
+                result = await session.execute(
+                    select(DBLpr.id)
+                    .join(DBGate, DBLpr.gate_id == DBGate.id)
+                    .where(DBGate.building_id % self.shard_count == shard)
+                )
+                lpr_ids = set(result.scalars().all())
+            for lpr_id in lpr_ids | set(self.owned_shards.get(shard, ())):
+                await self.reconcile(lpr_id)
+
+    async def _release_all(self):
+        await lpr_warmup.stop()
+        for shard, lpr_ids in list(self.owned_shards.items()):
+            for lpr_id in lpr_ids:
+                await connection_manager.close_connection(lpr_id)
+            logger.info(f"Released ownership of LPR shard {shard}")
+        self.owned_shards.clear()
+
+        if self.lock_connection is not None:
+            try:
+                # The connection goes back to the pool, so drop the locks explicitly
+                await self.lock_connection.execute(text("SELECT pg_advisory_unlock_all()"))
+                await self.lock_connection.close()
+            except Exception as error:
+                logger.warning(f"Discarding LPR ownership lock session: {error}")
+                await self.lock_connection.invalidate()
+            self.lock_connection = None
+        self.embedded_locked = False
+
+
+lpr_ownership = LprOwnershipCoordinator(
+    shard_count=settings.LPR_SHARD_COUNT,
+    poll_interval=settings.LPR_OWNERSHIP_POLL_INTERVAL,
+    takeover_grace=settings.LPR_OWNERSHIP_TAKEOVER_GRACE,
+)
+db_listener.subscribe(LPR_CHANGES_CHANNEL, lpr_ownership.on_lpr_changed, on_reconnect=lpr_ownership.resync)
@@ -0,0 +1,112 @@
+import mmap
+import time
+import struct
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+RECORDING_MAGIC = b"LPRREC\x01\n"
+# Record header: kind, stream index, wall clock time, payload length
+RECORD_HEADER = struct.Struct("<BHdI")
+KIND_STREAM = 0
+KIND_FRAME = 1
+
+
+class FrameRecorder:
+    """
+    Appends every raw frame received from the LPRs to a compact binary file.
+
+    The first frame of each LPR declares a stream ("ip:port") and later
+    frames refer to it by index, so a frame costs 15 bytes of overhead.
+    Frames are stored exactly as received, without the <END> delimiter.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "ab", buffering=1024 * 1024)
+        if self.file.tell() == 0:
+            self.file.write(RECORDING_MAGIC)
+        self.streams: Dict[str, int] = {}
+
+    def record(self, server_ip: str, port: int, frame: bytes):
+        name = f"{server_ip}:{port}"
+        stream = self.streams.get(name)
+        now = time.time()
+        if stream is None:
+            stream = self.streams[name] = len(self.streams)
+            encoded_name = name.encode("utf-8")
+            self.file.write(RECORD_HEADER.pack(KIND_STREAM, stream, now, len(encoded_name)))
+            self.file.write(encoded_name)
+        self.file.write(RECORD_HEADER.pack(KIND_FRAME, stream, now, len(frame)))
+        self.file.write(frame)
+
+    def close(self):
+        self.file.close()
+
+
+class Recording:
+    """
+    Index over a recording file. Frames are sliced out of an mmap on demand,
+    so even multi-gigabyte recordings replay without being loaded into memory.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.view = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.view[:len(RECORDING_MAGIC)] != RECORDING_MAGIC:
+            raise ValueError(f"{path} is not an LPR recording")
+        # Appended sessions each start with their own stream declarations
+        self.stream_names: List[str] = []
+        self.frames: Dict[str, List[Tuple[float, int, int]]] = {}
+
+        position = len(RECORDING_MAGIC)
+        stream_ids: Dict[int, str] = {}
+        size = len(self.view)
+        while position + RECORD_HEADER.size <= size:
+            kind, stream, timestamp, length = RECORD_HEADER.unpack_from(self.view, position)
+            start = position + RECORD_HEADER.size
+            if start + length > size:
+                break
+            if kind == KIND_STREAM:
+                if stream == 0:
+                    stream_ids = {}
+                name = self.view[start:start + length].decode("utf-8")
+                stream_ids[stream] = name
+                if name not in self.frames:
+                    self.stream_names.append(name)
+                    self.frames[name] = []
+            else:
+                self.frames[stream_ids[stream]].append((timestamp, start, length))
+            position = start + length
+
+    def frame(self, offset: int, length: int) -> bytes:
+        return self.view[offset:offset + length]
+
+    def close(self):
+        self.view.close()
+        self.file.close()
+
+
+frame_recorder: Optional[FrameRecorder] = None
+
+
+def get_frame_recorder() -> Optional[FrameRecorder]:
+    """
+    Returns the recorder for TCP_RECORD_PATH, or None when recording is off.
+    """
+    global frame_recorder
+    if frame_recorder is None and settings.TCP_RECORD_PATH:
+        frame_recorder = FrameRecorder(settings.TCP_RECORD_PATH)
+        logger.info(f"Recording LPR frames to {settings.TCP_RECORD_PATH}")
+    return frame_recorder
+
+
+def close_frame_recorder():
+    global frame_recorder
+    if frame_recorder is not None:
+        frame_recorder.close()
+        frame_recorder = None
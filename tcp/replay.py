@@ -0,0 +1,180 @@
+"""
+Plays a recording made with TCP_RECORD_PATH back over TLS.
+
+Every recorded LPR gets its own listening port, starting at --port, so the
+LPR rows of a test database can point at 127.0.0.1:<port>. A connecting
+client is authenticated like a real LPR and then receives that LPR's frames
+at their recorded pace, scaled by --speed (1, 10, ... or "max").
+
+Each connection gets the frames with fresh messageIds (the recorded id plus
+a per-connection suffix), so replaying the same recording again is not
+dropped as duplicates by the client's deduplication and ingested_messages.
+--keep-ids sends the recorded ids, e.g. to test that deduplication.
+--shift-timestamps moves the messageBody timestamps by the time since the
+recording, so reads land in current traffic partitions and visits.
+
+    python -m tcp.replay recording.lprrec --port 9000 --speed 10 --shift-timestamps
+"""
+import re
+import time
+import uuid
+import argparse
+from datetime import timedelta
+import dateutil.parser
+from twisted.internet import interfaces, protocol, reactor
+from zope.interface import implementer
+
+from tcp.lpr_server import LprServerProtocol, lpr_server_context
+from tcp.recorder import Recording
+
+
+MESSAGE_TYPE_PATTERN = re.compile(rb'"messageType"\s*:\s*"([^"]+)"')
+MESSAGE_ID_PATTERN = re.compile(rb'("messageId"\s*:\s*")([^"]*)(")')
+TIMESTAMP_PATTERN = re.compile(rb'("timestamp"\s*:\s*")([^"]+)(")')
+# Replies of the recorded LPR belong to the recorded session, not to this one
+SKIPPED_MESSAGE_TYPES = {b"acknowledge", b"command_response"}
+# Frames written per reactor turn at max speed, so other connections get a turn too
+MAX_SPEED_BATCH = 64
+
+
+def frame_message_type(frame: bytes):
+    position = frame.rfind(b'"messageType"')
+    if position == -1:
+        return None
+    match = MESSAGE_TYPE_PATTERN.match(frame, position)
+    return match.group(1) if match else None
+
+
+def rewrite_frame(frame: bytes, id_suffix, shift):
+    """
+    Gives a frame a fresh messageId and shifts its timestamp by ``shift``
+    seconds, without decoding the rest of it (images included).
+    """
+    if id_suffix is not None:
+        frame = MESSAGE_ID_PATTERN.sub(lambda match: match.group(1) + match.group(2) + id_suffix + match.group(3), frame, count=1)
+    if shift:
+        def shifted(match):
+            try:
+                moment = dateutil.parser.isoparse(match.group(2).decode("ascii"))
+            except ValueError:
+                return match.group(0)
+            return match.group(1) + (moment + timedelta(seconds=shift)).isoformat().encode("ascii") + match.group(3)
+        frame = TIMESTAMP_PATTERN.sub(shifted, frame, count=1)
+    return frame
+
+
+@implementer(interfaces.IPushProducer)
+class ReplayProtocol(LprServerProtocol):
+    """
+    Streams one recorded LPR. Registers as a producer, so at max speed
+    frames are only written while the TLS transport can take them.
+    """
+
+    def __init__(self, recording, stream_name, speed, fresh_ids=True, shift_timestamps=False):
+        super().__init__()
+        self.recording = recording
+        self.frames = recording.frames[stream_name]
+        self.stream_name = stream_name
+        self.speed = speed
+        self.id_suffix = f"-r{uuid.uuid4().hex[:8]}".encode("ascii") if fresh_ids else None
+        self.shift_timestamps = shift_timestamps
+        self.shift = 0.0
+        self.index = 0
+        self.paused = False
+        self.pending_call = None
+        self.started_at = None
+
+    def connectionMade(self):
+        self.transport.registerProducer(self, True)
+        print(f"[INFO] Client connected to {self.stream_name} replay from {self.transport.getPeer()}")
+
+    def connectionLost(self, reason):
+        if self.pending_call is not None and self.pending_call.active():
+            self.pending_call.cancel()
+        print(f"[INFO] Client left {self.stream_name} replay after {self.index}/{len(self.frames)} frames")
+
+    def on_authenticated(self):
+        self.started_at = time.monotonic()
+        if self.shift_timestamps and self.frames:
+            # Frames are recorded with wall clock times
+            self.shift = time.time() - self.frames[0][0]
+        self._send_next()
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        if self.started_at is not None and self.pending_call is None:
+            self._send_next()
+
+    def stopProducing(self):
+        self.paused = True
+
+    def _send_next(self):
+        self.pending_call = None
+        sent = 0
+        first_timestamp = self.frames[0][0] if self.frames else 0.0
+        while not self.paused and self.index < len(self.frames):
+            timestamp, offset, length = self.frames[self.index]
+            if self.speed is not None:
+                delay = self.started_at + (timestamp - first_timestamp) / self.speed - time.monotonic()
+                if delay > 0:
+                    self.pending_call = reactor.callLater(delay, self._send_next)
+                    return
+            elif sent >= MAX_SPEED_BATCH:
+                self.pending_call = reactor.callLater(0, self._send_next)
+                return
+            frame = self.recording.frame(offset, length)
+            self.index += 1
+            if frame_message_type(frame) not in SKIPPED_MESSAGE_TYPES:
+                self.send_frame(rewrite_frame(frame, self.id_suffix, self.shift))
+                sent += 1
+        if self.index >= len(self.frames):
+            elapsed = time.monotonic() - self.started_at
+            print(f"[INFO] Finished {self.stream_name} replay: {len(self.frames)} frames in {elapsed:.2f}s")
+
+
+class ReplayFactory(protocol.Factory):
+    def __init__(self, recording, stream_name, speed, fresh_ids=True, shift_timestamps=False):
+        self.recording = recording
+        self.stream_name = stream_name
+        self.speed = speed
+        self.fresh_ids = fresh_ids
+        self.shift_timestamps = shift_timestamps
+
+    def buildProtocol(self, addr):
+        replay = ReplayProtocol(self.recording, self.stream_name, self.speed, self.fresh_ids, self.shift_timestamps)
+        replay.factory = self
+        return replay
+
+
+def parse_speed(value: str):
+    return None if value == "max" else float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded LPR streams over TLS")
+    parser.add_argument("recording", help="file written with TCP_RECORD_PATH")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9000, help="port of the first recorded LPR")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help='playback speed factor, or "max"')
+    parser.add_argument("--keep-ids", action="store_true", help="send the recorded messageIds instead of fresh ones")
+    parser.add_argument("--shift-timestamps", action="store_true", help="move message timestamps to the replay time")
+    parser.add_argument("--cert", help="server certificate, defaults to CLIENT_CERT_PATH")
+    parser.add_argument("--key", help="server key, defaults to CLIENT_KEY_PATH")
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    context = lpr_server_context(args.cert, args.key)
+    for index, stream_name in enumerate(recording.stream_names):
+        port = args.port + index
+        factory = ReplayFactory(recording, stream_name, args.speed, not args.keep_ids, args.shift_timestamps)
+        reactor.listenSSL(port, factory, context, interface=args.host)
+        print(f"[INFO] {stream_name}: {len(recording.frames[stream_name])} frames on port {port}")
+    reactor.run()
+    recording.close()
+
+
+if __name__ == "__main__":
+    main()
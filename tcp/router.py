@@ -1,5 +1,6 @@
 import threading
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List
@@ -9,6 +10,9 @@ from lpr.model import DBLpr
 from tcp.schema import CommandRequest
 from tcp.tcp_client import send_command_to_server
 from tcp.manager import connection_manager
+from tcp.ownership import lpr_ownership
+from tcp.access_control import gate_access_control
+from tcp import ipc
 
 
 # servers = [
@@ -30,12 +34,6 @@ async def send_command(request: CommandRequest, db:AsyncSession=Depends(get_db))
     # global tcp_factories
 
     print(f"Received request from client: {request.client_id}")
-    factory = await connection_manager.get_connection(request.client_id)
-    if not factory:
-            raise HTTPException(status_code=404, detail="TCP client for the requested camera not found")
-
-    if not factory.authenticated:
-        raise HTTPException(status_code=400, detail=f"TCP client: {request.client_id} is not authenticated or connected")
 
 
     # lpr = await db.execute(select(LPR).where(LPR.id == request.lpr_id))
@@ -55,12 +53,52 @@ async def send_command(request: CommandRequest, db:AsyncSession=Depends(get_db))
 
     command_data = {
         "commandType": request.commandType,
-        "cameraId": request.cameraId,
+        "cameraId": request.camera_id,
         "duration": request.duration
     }
 
     print(f"Sending command to server {request.client_id}: {command_data}")
 
-    send_command_to_server(factory, command_data)
+    if ipc.ingest_client is not None:
+        # LPR sockets live in the standalone ingest process
+        await ipc.ingest_client.request("send_command", {"client_id": request.client_id, "command": command_data})
+    else:
+        await connection_manager.send_command(request.client_id, command_data)
 
     return {"status": "Command sent", "command": command_data, "server_id": request.client_id}
+
+
+@tcp_router.get("/readiness")
+async def readiness():
+    """
+    Reports whether this process owns LPR shards and has finished warming
+    up their connections. Startup does not wait for it, so orchestrators
+    can poll this instead.
+    """
+    if ipc.ingest_client is not None:
+        warmup = await ipc.ingest_client.request("warmup_status", {})
+    else:
+        warmup = lpr_ownership.readiness()
+    status_code = status.HTTP_200_OK if warmup["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=status_code, content=warmup)
+
+
+@tcp_router.get("/connections")
+async def connections():
+    """
+    State and counters of every LPR connection, served from an in-memory
+    snapshot without locking.
+    """
+    if ipc.ingest_client is not None:
+        return await ipc.ingest_client.request("connections", {})
+    return connection_manager.snapshot()
+
+
+@tcp_router.get("/access-control/metrics")
+async def access_control_metrics():
+    """
+    Gate access decisions and read-to-relay-command latency percentiles.
+    """
+    if ipc.ingest_client is not None:
+        return await ipc.ingest_client.request("access_metrics", {})
+    return gate_access_control.stats.snapshot()
@@ -0,0 +1,129 @@
+import os
+import time
+import uuid
+import base64
+import random
+import string
+import struct
+from datetime import datetime, timezone
+from twisted.internet import protocol, reactor, task
+
+from tcp.lpr_server import LprServerProtocol, lpr_server_context
+
+
+# Live images start with their send time, so receivers can measure latency
+LIVE_TIMESTAMP = struct.Struct("<d")
+PLATE_LETTERS = "bjdsthgmlnvyq"
+
+
+def random_plate() -> dict:
+    first = f"{random.randint(10, 99)}"
+    letter = random.choice(PLATE_LETTERS)
+    second = f"{random.randint(100, 999)}{random.randint(10, 99)}"
+    return {
+        "city_code": 0,
+        "first": first,
+        "letter": letter,
+        "plate": f"{first}{letter}{second}",
+        "plate_type": "IR",
+        "second": second,
+        "plate_image": "",
+    }
+
+
+class SimulatedLprProtocol(LprServerProtocol):
+    """
+    Behaves like an LPR once authenticated: emits plates_data and live
+    messages at the factory's rates, with images of the configured sizes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.loops = []
+
+    def on_authenticated(self):
+        factory = self.factory
+        if factory.plates_rate > 0:
+            plates_loop = task.LoopingCall(self.send_plates)
+            plates_loop.start(1.0 / factory.plates_rate, now=False)
+            self.loops.append(plates_loop)
+        if factory.live_rate > 0:
+            live_loop = task.LoopingCall(self.send_live)
+            live_loop.start(1.0 / factory.live_rate, now=False)
+            self.loops.append(live_loop)
+
+    def connectionLost(self, reason):
+        for loop in self.loops:
+            if loop.running:
+                loop.stop()
+        self.loops = []
+
+    def send_plates(self):
+        factory = self.factory
+        plate = random_plate()
+        plate["plate_image"] = factory.plate_image
+        self.send_message({
+            "messageId": str(uuid.uuid4()),
+            "messageType": "plates_data",
+            "messageBody": {
+                "camera_id": factory.camera_id,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "full_image": factory.full_image,
+                "cars": [{
+                    "box": {"bottom": 135, "left": 93, "right": 165, "top": 93},
+                    "direction": 0,
+                    "meta_data": "null",
+                    "ocr_accuracy": round(random.uniform(0.6, 1.0), 3),
+                    "plate": plate,
+                    "radar_speed": 0.0,
+                    "vehicle_class": {"class": random.randint(0, 3), "conf": 0.9},
+                    "vehicle_color": {"class": random.choice(string.digits), "conf": 0.8},
+                    "vehicle_type": {"class": random.randint(0, 3), "conf": 0.9},
+                    "vision_speed": round(random.uniform(0, 80), 1),
+                }],
+            },
+        })
+        factory.plates_sent += 1
+
+    def send_live(self):
+        factory = self.factory
+        image = LIVE_TIMESTAMP.pack(time.time()) + factory.live_filler
+        self.send_message({
+            "messageId": str(uuid.uuid4()),
+            "messageType": "live",
+            "messageBody": {
+                "camera_id": factory.camera_id,
+                "live_image": base64.b64encode(image).decode("ascii"),
+            },
+        })
+        factory.live_sent += 1
+
+
+class SimulatedLprFactory(protocol.Factory):
+    protocol = SimulatedLprProtocol
+
+    def __init__(self, camera_id: str, plates_rate: float, live_rate: float,
+                 full_image_size: int, plate_image_size: int, live_image_size: int):
+        self.camera_id = camera_id
+        self.plates_rate = plates_rate
+        self.live_rate = live_rate
+        # Images are random bytes generated once; only their size matters to the pipeline
+        self.full_image = base64.b64encode(os.urandom(full_image_size)).decode("ascii")
+        self.plate_image = base64.b64encode(os.urandom(plate_image_size)).decode("ascii")
+        self.live_filler = os.urandom(max(0, live_image_size - LIVE_TIMESTAMP.size))
+        self.plates_sent = 0
+        self.live_sent = 0
+
+
+def start_simulated_fleet(count: int, port: int, host: str = "127.0.0.1", **options):
+    """
+    Starts ``count`` simulated LPRs on consecutive TLS ports of this process'
+    reactor. LPR i reports camera_id str(i + 1). Returns (port, factory) pairs.
+    """
+    context = lpr_server_context()
+    fleet = []
+    for index in range(count):
+        factory = SimulatedLprFactory(camera_id=str(index + 1), **options)
+        reactor.listenSSL(port + index, factory, context, interface=host)
+        fleet.append((port + index, factory))
+    return fleet
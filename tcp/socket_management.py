@@ -3,6 +3,8 @@ import logging
 import asyncio
 from typing import Dict, List
 
+from tcp.frame_store import FrameNotification, get_frame_store_reader
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,7 +25,8 @@ tcp_sio = socketio.AsyncServer(
 # Maps to manage client subscriptions
 request_map = {
     "live": {},  # Format: {"sid": {cameraID1, cameraID2, ...}}
-    "plates_data": {}  # Format: {"sid": {cameraID1, cameraID2, ...}}
+    "plates_data": {},  # Format: {"sid": {cameraID1, cameraID2, ...}}
+    "alert": {}  # Every connected client receives alerts, whatever its cameras
 }
 
 sid_role_map = {}  # Maps SID to roles (e.g., {"sid1": "admin", "sid2": "operator"})
@@ -39,6 +42,7 @@ async def connect(sid, environ):
     logger.info(f"Client connected: {sid}")
     request_map["live"][sid] = set()
     request_map["plates_data"][sid] = set()
+    request_map["alert"][sid] = set()
     return True
 
 
@@ -52,6 +56,7 @@ async def disconnect(sid):
     sid_role_map.pop(sid, None)
     request_map["live"].pop(sid, None)
     request_map["plates_data"].pop(sid, None)
+    request_map["alert"].pop(sid, None)
 
 
 @tcp_sio.event
@@ -127,3 +132,35 @@ async def emit_to_requested_sids(event_name, data, camera_id=None):
     # Execute all emission tasks concurrently
     await asyncio.gather(*tasks, return_exceptions=True)
     logger.info(f"Emitted {event_name} to all subscribed clients")
+
+
+async def emit_live_frame(notification: FrameNotification):
+    """
+    Emits a live frame published through the shared-memory frame store.
+    Only the small notification crossed the process boundary; the frame
+    bytes are read straight from the shared segment.
+    """
+    store = get_frame_store_reader()
+    if store is None:
+        logger.error("Received a live frame notification but the shared frame store is unavailable")
+        return
+
+    view = store.read(notification.slot, notification.seq, notification.length)
+    if view is None:
+        logger.warning(f"Live frame {notification.seq} of camera {notification.camera_id} was overwritten before it was read")
+        return
+    try:
+        # Socket.IO needs an owned buffer, so this is the single copy out of shared memory
+        frame = bytes(view)
+    finally:
+        view.release()
+    if not store.is_current(notification.slot, notification.seq):
+        logger.warning(f"Live frame {notification.seq} of camera {notification.camera_id} was overwritten while reading")
+        return
+
+    live_data = {
+        "messageType": "live",
+        "live_image": frame,
+        "camera_id": notification.camera_id
+    }
+    await emit_to_requested_sids("live", live_data)
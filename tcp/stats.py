@@ -0,0 +1,92 @@
+import time
+from collections import deque
+from enum import Enum
+from typing import Dict, Optional
+
+
+class LprConnectionState(Enum):
+    CONNECTING = "connecting"
+    AUTHENTICATING = "authenticating"
+    READY = "ready"
+    BACKOFF = "backoff"
+    CLOSED = "closed"
+
+
+# Weight of the newest heartbeat RTT in the moving average
+RTT_EWMA_ALPHA = 0.2
+RTT_SAMPLES = 256
+
+
+class LprConnectionStats:
+    """
+    State and counters of one LPR connection.
+
+    Owned by the connection's factory so it survives reconnects. It is only
+    mutated from the event loop thread that runs the reactor, so readers can
+    take a snapshot without locking.
+    """
+
+    def __init__(self):
+        self.state = LprConnectionState.CONNECTING
+        self.state_since = time.time()
+        self.connects = 0
+        self.bytes_in = 0
+        self.messages: Dict[str, int] = {}
+        self.parse_errors = 0
+        self.duplicates_dropped = 0
+        self.last_message_at: Optional[float] = None
+        self.auth_sent_at: Optional[float] = None
+        self.auth_rtt: Optional[float] = None
+        self.heartbeats_sent = 0
+        self.heartbeat_timeouts = 0
+        self.rtt_ewma: Optional[float] = None
+        self.rtt_samples = deque(maxlen=RTT_SAMPLES)
+
+    def set_state(self, state: LprConnectionState):
+        if state is not self.state:
+            self.state = state
+            self.state_since = time.time()
+
+    def auth_sent(self):
+        self.auth_sent_at = time.monotonic()
+        self.set_state(LprConnectionState.AUTHENTICATING)
+
+    def auth_acknowledged(self):
+        if self.auth_sent_at is not None:
+            self.auth_rtt = time.monotonic() - self.auth_sent_at
+        self.set_state(LprConnectionState.READY)
+
+    def message_received(self, message_type):
+        self.messages[message_type] = self.messages.get(message_type, 0) + 1
+        self.last_message_at = time.time()
+
+    def record_rtt(self, rtt: float):
+        self.rtt_samples.append(rtt)
+        if self.rtt_ewma is None:
+            self.rtt_ewma = rtt
+        else:
+            self.rtt_ewma += RTT_EWMA_ALPHA * (rtt - self.rtt_ewma)
+
+    @property
+    def rtt_p99(self) -> Optional[float]:
+        if not self.rtt_samples:
+            return None
+        ordered = sorted(self.rtt_samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state.value,
+            "state_since": self.state_since,
+            "connects": self.connects,
+            "bytes_in": self.bytes_in,
+            "messages": dict(self.messages),
+            "parse_errors": self.parse_errors,
+            "duplicates_dropped": self.duplicates_dropped,
+            "last_message_at": self.last_message_at,
+            "auth_rtt": self.auth_rtt,
+            "heartbeats_sent": self.heartbeats_sent,
+            "heartbeat_timeouts": self.heartbeat_timeouts,
+            "rtt_ewma": self.rtt_ewma,
+            "rtt_p99": self.rtt_p99,
+        }
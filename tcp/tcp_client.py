@@ -1,23 +1,28 @@
 import os
+import time
 import json
 import uuid
+import base64
 import hmac
 import hashlib
 import asyncio
 import socketio
-import dateutil.parser
 import logging
 # from twisted.internet import asyncioreactor
 # asyncioreactor.install(asyncio.get_event_loop())
-from sqlalchemy.exc import SQLAlchemyError
-from twisted.internet import protocol, reactor, ssl
-from sqlalchemy.future import select
-
-from db.engine import async_session
-from tcp.socket_management import emit_to_requested_sids
+from twisted.internet import protocol, reactor, ssl, task
+
+from tcp.socket_management import emit_to_requested_sids, emit_live_frame
+from tcp.frame_store import get_frame_store_writer
+from tcp.stats import LprConnectionState, LprConnectionStats
+from tcp.dedup import MessageDeduplicator, peek_message_id
+from tcp.journal import event_journal
+from tcp.recorder import get_frame_recorder
+from tcp.consensus import plate_consensus
+from watchlist.matcher import watchlist_matcher
+from tcp.access_control import gate_access_control
 # from tcp.socket_test import enqueue_message
 from settings import settings
-from traffic.model import Vehicle, Traffic
 
 # Load environment variables from .env file
 
@@ -30,11 +35,90 @@ client_key_path = os.getenv("CLIENT_KEY_PATH","/app/cert/client.key")
 client_cert_path = os.getenv("CLIENT_CERT_PATH","/app/cert/client.crt")
 ca_cert_path = os.getenv("CA_CERT_PATH","/app/cert/ca.crt")
 
+# Destinations for decoded LPR events. The API process emits them straight to
+# Socket.IO; the standalone ingest process swaps in its IPC publisher.
+event_sink = emit_to_requested_sids
+live_frame_sink = emit_live_frame
+
+
+def configure_event_sinks(events, live_frames):
+    global event_sink, live_frame_sink
+    event_sink = events
+    live_frame_sink = live_frames
+
+
+async def broadcast_to_socketio(event_name, data):
+    """Efficiently broadcast a message to all subscribed clients for an event."""
+    # print(" in broadcast ...")
+    try:
+        await event_sink(event_name, data)
+        logger.info(f"[INFO] Emitted event '{event_name}' with data: {data}")
+        # print("send to socket... in broadcast ...")
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to emit event '{event_name}': {e}")
+        # print("couldn't send to socket... in broadcast ...")
+
+
+def publish_plates_data(message_id, message_body):
+    """
+    Journals a plate read for persistence and broadcasts it via Socket.IO.
+    """
+    if event_journal.is_open:
+        # Journaled before anything else, so persistence survives a slow or down Postgres/MinIO
+        event_journal.append({"message_id": message_id, **message_body})
+    socketio_message = {
+        "messageType": "plates_data",
+        "timestamp": message_body.get("timestamp"),
+        "camera_id": message_body.get("camera_id"),
+        # "full_image": message_body.get("full_image"),
+        "full_image": "sample_full_image",
+        "cars": [
+            {
+                "plate_number": car.get("plate", {}).get("plate", "Unknown"),
+                # "plate_image": car.get("plate", {}).get("plate_image", ""),
+                "plate_image": "sample_plate_image",
+                "ocr_accuracy": car.get("ocr_accuracy", "Unknown"),
+                "vision_speed": car.get("vision_speed", 0.0),
+                "vehicle_class": car.get("vehicle_class", {}),
+                "vehicle_type": car.get("vehicle_type", {}),
+                "vehicle_color": car.get("vehicle_color", {}),
+                "reads": car.get("consensus_reads", 1)
+            }
+            for car in message_body.get("cars", [])
+        ]
+    }
+    asyncio.ensure_future(broadcast_to_socketio("plates_data", socketio_message))
+
+
+def publish_watchlist_alerts(message_id, message_body, matches):
+    """
+    Broadcasts an alert to every Socket.IO client per watchlisted plate in a read.
+    """
+    for match in matches:
+        alert = {
+            "messageType": "alert",
+            "alert_type": "watchlist",
+            "message_id": message_id,
+            "camera_id": message_body.get("camera_id"),
+            "timestamp": message_body.get("timestamp"),
+            **match,
+        }
+        logger.warning(f"Watchlisted plate {match['plate_number']} read by camera {alert['camera_id']}")
+        asyncio.ensure_future(broadcast_to_socketio("alert", alert))
+
+
+plate_consensus.publish = publish_plates_data
+
+
 class SimpleTCPClient(protocol.Protocol):
     def __init__(self):
         self.auth_message_id = None
         self.incomplete_data = ""
         self.authenticated = False  # Track authentication status locally
+        self.heartbeat_loop = None
+        self.pending_heartbeats = {}
+        self.missed_heartbeats = 0
+        self.message_received_at = None
 
 
     def connectionMade(self):
@@ -54,6 +138,7 @@ class SimpleTCPClient(protocol.Protocol):
             self.auth_message_id = str(uuid.uuid4())
             auth_message = self._create_auth_message(self.auth_message_id, self.factory.auth_token)
             self._send_message(auth_message)
+            self.factory.stats.auth_sent()
             print(f"[INFO] Authentication message sent with ID: {self.auth_message_id}")
         except:
             print("Not Accesptable")
@@ -68,12 +153,13 @@ class SimpleTCPClient(protocol.Protocol):
             "messageBody": {"token": token}
         })
 
-    def _send_message(self, message):
+    def _send_message(self, message, log=True):
         """
         Sends a message to the server.
         """
         if self.transport and self.transport.connected:
-            print(f"[INFO] Sending message: {message}")
+            if log:
+                print(f"[INFO] Sending message: {message}")
             self.transport.write((message + '\n').encode('utf-8'))
         else:
             print("[ERROR] Transport is not connected. Message not sent.")
@@ -82,24 +168,45 @@ class SimpleTCPClient(protocol.Protocol):
     def dataReceived(self, data):
         """Accumulates and processes data received from the server."""
         # print("data is receiving ...")
+        self.factory.stats.bytes_in += len(data)
+        # Any traffic proves the link is alive, even from LPRs that never answer heartbeats
+        self.missed_heartbeats = 0
         self.incomplete_data += data.decode('utf-8')
+        frame_recorder = get_frame_recorder()
         while '<END>' in self.incomplete_data:
             full_message, self.incomplete_data = self.incomplete_data.split('<END>', 1)
             if full_message:
+                if frame_recorder is not None:
+                    frame_recorder.record(self.factory.server_ip, self.factory.port, full_message.encode('utf-8'))
                 # print(f"[DEBUG] Received message: {full_message[:100]}...")
                 # asyncio.create_task(self._process_message(full_message))
-                asyncio.ensure_future(self._process_message(full_message))
+                # Arrival time of the frame, for the read-to-relay latency of access control
+                asyncio.ensure_future(self._process_message(full_message, time.monotonic()))
                 # reactor.callInThread(self._process_message, full_message)
 
-    async def _process_message(self, message):
+    async def _process_message(self, message, received_at=None):
         """
         Processes the received message from the server.
         This runs in a separate thread.
         """
+        deduplicator = self.factory.deduplicator
+        # Cheap pre-check so a replayed frame is dropped before its JSON and images are decoded
+        message_id = peek_message_id(message)
+        if message_id and deduplicator.contains(message_id):
+            self.factory.stats.duplicates_dropped += 1
+            return
+
         try:
             # message = message.rstrip()
             parsed_message = json.loads(message)
             message_type = parsed_message.get("messageType")
+            self.factory.stats.message_received(message_type)
+
+            # Only plate reads are remembered; LPRs resend them after a reconnect
+            if message_type == "plates_data" and parsed_message.get("messageId"):
+                if deduplicator.seen_before(parsed_message["messageId"]):
+                    self.factory.stats.duplicates_dropped += 1
+                    return
             # print(f"type of the message is: {message_type}")
 
             handlers = {
@@ -110,9 +217,11 @@ class SimpleTCPClient(protocol.Protocol):
             }
 
             handler = handlers.get(message_type, self._handle_unknown_message)
+            self.message_received_at = received_at
             handler(parsed_message)
 
         except json.JSONDecodeError as e:
+            self.factory.stats.parse_errors += 1
             print(f"[ERROR] Failed to parse message: {e}")
 
     def _handle_acknowledgment(self, message):
@@ -123,21 +232,56 @@ class SimpleTCPClient(protocol.Protocol):
         if reply_to == self.auth_message_id:
             print("[INFO] Authentication successful.")
             self.authenticated = True
-            self.factory.authenticated = True
+            self.factory.stats.auth_acknowledged()
+            self.factory.mark_authenticated()
+            self._start_heartbeat()
             # self.factory.protocol_instance = self
+        elif reply_to in self.pending_heartbeats:
+            self.factory.stats.record_rtt(time.monotonic() - self.pending_heartbeats.pop(reply_to))
         else:
             print(f"[INFO] Acknowledgment for message: {reply_to} ...")
 
+    def _start_heartbeat(self):
+        if self.heartbeat_loop is None and settings.LPR_HEARTBEAT_INTERVAL > 0:
+            self.heartbeat_loop = task.LoopingCall(self._send_heartbeat)
+            self.heartbeat_loop.start(settings.LPR_HEARTBEAT_INTERVAL, now=False)
+
+    def _stop_heartbeat(self):
+        if self.heartbeat_loop is not None and self.heartbeat_loop.running:
+            self.heartbeat_loop.stop()
+        self.heartbeat_loop = None
+        self.pending_heartbeats.clear()
+
+    def _send_heartbeat(self):
+        """
+        Pings the LPR over the authenticated channel. A link that stays silent
+        for LPR_HEARTBEAT_MAX_MISSED intervals is treated as half-open and
+        aborted so the factory reconnects, instead of waiting minutes for TCP
+        to notice.
+        """
+        if self.missed_heartbeats >= settings.LPR_HEARTBEAT_MAX_MISSED:
+            print(f"[WARN] {self.transport.getPeer()} missed {self.missed_heartbeats} heartbeats, reconnecting")
+            self.factory.stats.heartbeat_timeouts += 1
+            self._stop_heartbeat()
+            self.transport.abortConnection()
+            return
+
+        heartbeat_id = str(uuid.uuid4())
+        # Only the most recent unanswered pings are kept for RTT matching
+        if len(self.pending_heartbeats) >= settings.LPR_HEARTBEAT_MAX_MISSED:
+            self.pending_heartbeats.pop(next(iter(self.pending_heartbeats)))
+        self.pending_heartbeats[heartbeat_id] = time.monotonic()
+        self.missed_heartbeats += 1
+        self.factory.stats.heartbeats_sent += 1
+        self._send_message(json.dumps({
+            "messageId": heartbeat_id,
+            "messageType": "heartbeat",
+            "messageBody": {}
+        }), log=False)
+
     async def _broadcast_to_socketio(self, event_name, data):
         """Efficiently broadcast a message to all subscribed clients for an event."""
-        # print(" in broadcast ...")
-        try:
-            await emit_to_requested_sids(event_name, data)
-            logger.info(f"[INFO] Emitted event '{event_name}' with data: {data}")
-            # print("send to socket... in broadcast ...")
-        except Exception as e:
-            logger.error(f"[ERROR] Failed to emit event '{event_name}': {e}")
-            # print("couldn't send to socket... in broadcast ...")
+        await broadcast_to_socketio(event_name, data)
 
     # def _handle_plates_data(self, message):
     #     message_body = message["messageBody"]
@@ -163,108 +307,21 @@ class SimpleTCPClient(protocol.Protocol):
     #         asyncio.run, self._broadcast_to_socketio("plates_data", socketio_message)
     #     )
 
-    async def _store_plate_data(self, plate_data):
-        """
-        Stores the plate data in the database.
-        """
-        async with async_session() as session:
-            try:
-                for car in plate_data.get("cars", []):
-                    plate_number = car.get("plate", {}).get("plate", "Unknown")
-                    vehicle = await self._get_or_create_vehicle(session, plate_number, car)
-                    traffic_entry = Traffic(
-                        vehicle_id=vehicle.id,
-                        camera_id=plate_data.get("camera_id"),
-                        # timestamp=plate_data.get("timestamp"),
-                        timestamp=dateutil.parser.isoparse(plate_data.get("timestamp")).replace(tzinfo=None),
-                        ocr_accuracy=car.get("ocr_accuracy", 0.0),
-                        vision_speed=car.get("vision_speed", 0.0)
-                    )
-                    session.add(traffic_entry)
-                await session.commit()
-                print("[INFO] Successfully stored plate data.")
-            except Exception as error:
-                print(f"[ERROR] couldn't save Vehicle/Traffic: {error}")
-                await session.rollback()
-
-
-    async def _get_or_create_vehicle(self, session, plate_number, car_data):
-        """
-        Retrieves or creates a vehicle entry in the database.
-        """
-        result = await session.execute(
-            select(Vehicle).where(Vehicle.plate_number == plate_number)
-        )
-        vehicle = result.scalars().first()
-        if not vehicle:
-            vehicle_class_dict = car_data.get("vehicle_class", {})
-            vehicle_type_dict = car_data.get("vehicle_type", {})
-            vehicle_color_dict = car_data.get("vehicle_color", {})
-
-            # Function to safely convert to string or None
-            def safe_convert(value):
-                if value in [None, "null", "None"]:
-                    return None
-                return str(value)
-
-            vehicle_class_value = safe_convert(vehicle_class_dict.get('class'))
-            vehicle_type_value = safe_convert(vehicle_type_dict.get('class'))
-            vehicle_color_value = safe_convert(vehicle_color_dict.get('class'))
-
-            vehicle = Vehicle(
-                plate_number=plate_number,
-                vehicle_class=vehicle_class_value,
-                vehicle_type=vehicle_type_value,
-                vehicle_color=vehicle_color_value,
-            )
-            session.add(vehicle)
-            # await session.flush()
-            try:
-                await session.flush()
-                print(f"[INFO] Created new vehicle with plate number: {plate_number}")
-            except Exception as e:
-                print(f"[ERROR] Failed to create vehicle '{plate_number}': {e}")
-                await session.rollback()
-                raise e
-        else:
-            print(f"[INFO] Found existing vehicle with plate number: {plate_number}")
-        return vehicle
-
-
     def _handle_plates_data(self, message):
         """
-        Handles plate data from the server and broadcasts it via Socket.IO.
+        Handles plate data from the server. Every read first goes to gate
+        access control and the watchlist, before the per-camera consensus
+        stage (when PLATE_CONSENSUS_WINDOW is set) can hold it back.
         """
         message_body = message["messageBody"]
-        socketio_message = {
-            "messageType": "plates_data",
-            "timestamp": message_body.get("timestamp"),
-            "camera_id": message_body.get("camera_id"),
-            # "full_image": message_body.get("full_image"),
-            "full_image": "sample_full_image",
-            "cars": [
-                {
-                    "plate_number": car.get("plate", {}).get("plate", "Unknown"),
-                    # "plate_image": car.get("plate", {}).get("plate_image", ""),
-                    "plate_image": "sample_plate_image",
-                    "ocr_accuracy": car.get("ocr_accuracy", "Unknown"),
-                    "vision_speed": car.get("vision_speed", 0.0),
-                    "vehicle_class": car.get("vehicle_class", {}),
-                    "vehicle_type": car.get("vehicle_type", {}),
-                    "vehicle_color": car.get("vehicle_color", {})
-                }
-                for car in message_body.get("cars", [])
-            ]
-        }
-        # Queue the message for emission to connected clients
-        # enqueue_message("plates_data", socketio_message)
-        # asyncio.create_task(self._store_plate_data(message_body))
-        # asyncio.create_task(self._broadcast_to_socketio("plates_data", socketio_message))
-        # print(f"plate data to socket is: {socketio_message}")
-        # reactor.callFromThread(
-        #     asyncio.run, self._broadcast_to_socketio("plates_data", socketio_message)
-        # )
-        asyncio.ensure_future(self._broadcast_to_socketio("plates_data", socketio_message))
+        gate_access_control.check(self.factory, message_body, self.message_received_at)
+        matches = watchlist_matcher.match(message_body.get("cars", []))
+        if matches:
+            publish_watchlist_alerts(message.get("messageId"), message_body, matches)
+        if plate_consensus.enabled:
+            plate_consensus.add(message.get("messageId"), message_body)
+        else:
+            publish_plates_data(message.get("messageId"), message_body)
 
     def _handle_command_response(self, message):
         """
@@ -274,16 +331,35 @@ class SimpleTCPClient(protocol.Protocol):
 
     def _handle_live_data(self, message):
         message_body = message["messageBody"]
+        frame_store = get_frame_store_writer()
+        if frame_store is not None and message_body.get("live_image"):
+            self._publish_live_frame(frame_store, message_body)
+            return
+
         live_data = {
             "messageType": "live",
             # "live_image": message_body.get("live_image"),
             "live_image": "sample_live_image",
             "camera_id": message_body.get("camera_id")
         }
-        asyncio.ensure_future(self._broadcast_to_socketio("live_data", live_data))
+        asyncio.ensure_future(self._broadcast_to_socketio("live", live_data))
         # asyncio.create_task(self._broadcast_to_socketio("live", live_data))
         # asyncio.ensure_future(self._broadcast_to_socketio("live", live_data))
 
+    def _publish_live_frame(self, frame_store, message_body):
+        """
+        Decodes the live image once and places it in the shared frame store.
+        Consumers only receive the (camera_id, slot, seq, length) notification.
+        """
+        try:
+            frame = base64.b64decode(message_body["live_image"])
+        except (ValueError, TypeError) as error:
+            print(f"[ERROR] Invalid live image from camera {message_body.get('camera_id')}: {error}")
+            return
+        notification = frame_store.write(message_body.get("camera_id"), frame)
+        if notification is not None:
+            asyncio.ensure_future(live_frame_sink(notification))
+
     def _handle_unknown_message(self, message):
         print(f"[WARN] Received unknown message type: {message.get('messageType')}")
 
@@ -311,6 +387,7 @@ class SimpleTCPClient(protocol.Protocol):
 
     def connectionLost(self, reason):
         print(f"[INFO] Connection lost: {reason}")
+        self._stop_heartbeat()
         if self.factory:
             self.factory.clientConnectionLost(self.transport.connector, reason)
         else:
@@ -328,6 +405,11 @@ class ReconnectingTCPClientFactory(protocol.ReconnectingClientFactory):
         self.server_ip = server_ip
         self.port = port
         self.reconnecting = False  # Add reconnecting flag
+        self.reconnect_call = None
+        self.auth_waiters = []
+        self.stats = LprConnectionStats()
+        # Kept on the factory so the window spans reconnects
+        self.deduplicator = MessageDeduplicator(settings.LPR_DEDUP_WINDOW, settings.LPR_DEDUP_MAX_IDS)
 
     def buildProtocol(self, addr):
         self.resetDelay()
@@ -337,20 +419,53 @@ class ReconnectingTCPClientFactory(protocol.ReconnectingClientFactory):
         self.protocol_instance = client
         return client
 
+    def _connection_down(self):
+        self.authenticated = False
+        if self.protocol_instance:
+            self.protocol_instance.authenticated = False
+        self.stats.set_state(LprConnectionState.BACKOFF if self.continueTrying else LprConnectionState.CLOSED)
+
     def clientConnectionLost(self, connector, reason):
+        self._connection_down()
         if not self.reconnecting:
             print(f"[INFO] Connection lost: {reason}. Reconnecting with SSL context...")
             self.reconnecting = True
             self._attempt_reconnect()
 
     def clientConnectionFailed(self, connector, reason):
+        self._connection_down()
         if not self.reconnecting:
             print(f"[ERROR] Connection failed: {reason}. Retrying with SSL context...")
             self.reconnecting = True
             self._attempt_reconnect()
 
-    def _attempt_reconnect(self):
+    def mark_authenticated(self):
+        self.authenticated = True
+        for waiter in self.auth_waiters:
+            if not waiter.done():
+                waiter.set_result(True)
+        self.auth_waiters.clear()
+
+    async def wait_authenticated(self, timeout: float) -> bool:
+        """
+        Waits until the LPR accepts our token. Returns False on timeout.
+        """
+        if self.authenticated:
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self.auth_waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self.auth_waiters:
+                self.auth_waiters.remove(waiter)
+
+    def _attempt_reconnect(self, delay=None):
         """Reconnect with a new SSL context setup."""
+        if not self.continueTrying:
+            return
         # Create a fresh ClientContextFactory for each reconnect attempt
         class ClientContextFactory(ssl.ClientContextFactory):
             print("Using ssl ...")
@@ -369,16 +484,42 @@ class ReconnectingTCPClientFactory(protocol.ReconnectingClientFactory):
                 return context
 
         # Schedule the reconnect with a fresh SSL context
-        reactor.callLater(self.initialDelay, reactor.connectSSL, self.server_ip, self.port, self, ClientContextFactory())
+        delay = self.initialDelay if delay is None else delay
+        self.reconnect_call = reactor.callLater(delay, self._connect, ClientContextFactory())
+
+    def _connect(self, context_factory):
+        self.reconnect_call = None
+        # The attempt is in flight now, so its failure must be allowed to schedule the next one
+        self.reconnecting = False
+        self.stats.set_state(LprConnectionState.CONNECTING)
+        self.stats.connects += 1
+        self.connector = reactor.connectSSL(self.server_ip, self.port, self, context_factory)
+
+    def close(self):
+        """
+        Stops reconnecting and drops the current connection, if any.
+        """
+        self.stopTrying()
+        if self.reconnect_call is not None and self.reconnect_call.active():
+            self.reconnect_call.cancel()
+        self.reconnect_call = None
+        self.authenticated = False
+        self.stats.set_state(LprConnectionState.CLOSED)
+        if self.protocol_instance and self.protocol_instance.transport:
+            self.protocol_instance.transport.loseConnection()
 
-def connect_to_server(server_ip, port, auth_token):
+def connect_to_server(server_ip, port, auth_token, delay=None):
     factory = ReconnectingTCPClientFactory(server_ip, port, auth_token)
     print(f"factory created ... {factory}")
     # reactor.connectTCP(server_ip, port, factory)
     print(f"Connecting to the factory: {factory}...")
-    factory._attempt_reconnect()  # Start initial connection attempt
+    factory._attempt_reconnect(delay)  # Start initial connection attempt
     return factory
 
+def disconnect_from_server(factory):
+    print(f"Closing connection to {factory.server_ip}:{factory.port}...")
+    factory.close()
+
 def send_command_to_server(factory, command_data):
     if factory.authenticated and factory.protocol_instance:
         print(f"[INFO] Sending command to server: {command_data}")
@@ -387,6 +528,9 @@ def send_command_to_server(factory, command_data):
         print("[ERROR] Cannot send command: Client is not authenticated or connected.")
 
 
+gate_access_control.send_command = send_command_to_server
+
+
 
 
 
@@ -0,0 +1,162 @@
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from settings import settings
+from tcp.manager import connection_manager
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionWarmup:
+    """
+    Opens LPR connections in the background with bounded concurrency.
+
+    Connection attempts are spaced by ``spacing`` seconds plus up to ``jitter``
+    seconds of random delay, and at most ``concurrency`` TLS/authentication
+    handshakes are in flight at once, so a large fleet does not hit the
+    network and the LPRs in the same second. Nothing awaits the warmup itself;
+    its progress is exposed through ``status`` for the readiness endpoint.
+
+    Every ``schedule`` after the previous round finished starts a new round
+    with fresh counters, e.g. for a shard taken over or a single LPR added.
+    Readiness latches once a round has finished successfully, so those later
+    rounds never take the process out of a load balancer.
+    """
+
+    def __init__(self, concurrency: int, spacing: float, jitter: float, auth_timeout: float):
+        self.concurrency = max(1, concurrency)
+        self.spacing = spacing
+        self.jitter = jitter
+        self.auth_timeout = auth_timeout
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.queue: List = []
+        self.task: Optional[asyncio.Task] = None
+        self.in_flight = set()
+        self.started_at: Optional[float] = None
+        self.scheduled = 0
+        self.authenticated = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.time_to_all_authenticated: Optional[float] = None
+        self.completed_at: Optional[str] = None
+        self.warmed_up = False
+
+    def schedule(self, lprs):
+        """
+        Queues LPRs for connection and returns immediately. An empty list
+        still counts as a warmup round, e.g. for a shard without LPRs.
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        if self.started_at is None or self.finished:
+            # A new round of warmup, e.g. after taking over another shard
+            self.started_at = time.monotonic()
+            self.scheduled = self.authenticated = self.timed_out = self.failed = 0
+            self.time_to_all_authenticated = None
+            self.completed_at = None
+        if not lprs:
+            self._complete_if_finished()
+            return
+        self.queue.extend(lprs)
+        self.scheduled += len(lprs)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    @property
+    def finished(self) -> bool:
+        return self.started_at is not None and not self.queue and not self.in_flight
+
+    @property
+    def round_succeeded(self) -> bool:
+        """
+        The current round has finished, and unless there was nothing to
+        connect, at least one of its LPRs authenticated.
+        """
+        return self.finished and (self.scheduled == 0 or self.authenticated > 0)
+
+    @property
+    def ready(self) -> bool:
+        return self.warmed_up
+
+    def status(self) -> dict:
+        # The counters describe the latest round
+        return {
+            "ready": self.ready,
+            "started": self.started_at is not None,
+            "scheduled": self.scheduled,
+            "authenticated": self.authenticated,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+            "pending": len(self.queue) + len(self.in_flight),
+            "completed_at": self.completed_at,
+            # Null while any LPR has not authenticated; timed_out and failed tell why
+            "time_to_all_authenticated": self.time_to_all_authenticated,
+        }
+
+    def _complete_if_finished(self):
+        if self.finished and self.completed_at is None:
+            self.completed_at = datetime.utcnow().isoformat()
+            if self.round_succeeded:
+                self.warmed_up = True
+            logger.info(
+                f"LPR warmup completed: {self.authenticated} authenticated, "
+                f"{self.timed_out} timed out, {self.failed} failed of {self.scheduled}"
+            )
+
+    def _connection_done(self, task: asyncio.Task):
+        self.in_flight.discard(task)
+        self._complete_if_finished()
+
+    async def stop(self):
+        self.queue.clear()
+        for task in [self.task, *self.in_flight]:
+            if task is not None:
+                task.cancel()
+        self.in_flight.clear()
+        self.started_at = None
+        self.scheduled = self.authenticated = self.timed_out = self.failed = 0
+        self.time_to_all_authenticated = None
+        self.completed_at = None
+        self.warmed_up = False
+
+    async def _run(self):
+        while self.queue:
+            # Take the slot before dequeuing so the LPR is never counted as neither pending nor in flight
+            await self.semaphore.acquire()
+            lpr = self.queue.pop(0)
+            task = asyncio.create_task(self._connect(lpr))
+            self.in_flight.add(task)
+            task.add_done_callback(self._connection_done)
+            await asyncio.sleep(self.spacing + random.uniform(0, self.jitter))
+
+    async def _connect(self, lpr):
+        try:
+            factory = await connection_manager.open_connection(lpr, delay=0)
+            if await factory.wait_authenticated(self.auth_timeout):
+                self.authenticated += 1
+            else:
+                # The factory keeps retrying on its own; only the handshake slot is released
+                self.timed_out += 1
+                logger.warning(f"LPR {lpr.id} did not authenticate within {self.auth_timeout}s during warmup")
+        except Exception as error:
+            self.failed += 1
+            logger.error(f"Warmup of LPR {lpr.id} failed: {error}")
+        finally:
+            self.semaphore.release()
+
+        if self.authenticated == self.scheduled and self.time_to_all_authenticated is None:
+            self.time_to_all_authenticated = round(time.monotonic() - self.started_at, 3)
+            logger.info(f"All {self.scheduled} LPRs authenticated in {self.time_to_all_authenticated}s")
+            print(f"[INFO] All {self.scheduled} LPRs authenticated in {self.time_to_all_authenticated}s")
+
+
+lpr_warmup = ConnectionWarmup(
+    concurrency=settings.LPR_WARMUP_CONCURRENCY,
+    spacing=settings.LPR_WARMUP_SPACING,
+    jitter=settings.LPR_WARMUP_JITTER,
+    auth_timeout=settings.LPR_WARMUP_AUTH_TIMEOUT,
+)
@@ -0,0 +1,80 @@
+import math
+import struct
+import asyncio
+from datetime import datetime, timezone
+
+import numpy as np
+
+from traffic.analytics import (
+    AnalyticsCache, accuracy_histogram, as_array, hour_weekday_heatmap, speed_distribution,
+)
+
+FLOAT8_OID = 701
+
+
+def array_send(values):
+    """
+    A one-dimensional float8[] in Postgres' binary array format.
+    """
+    data = struct.pack(">iiIii", 1, 0, FLOAT8_OID, len(values), 1)
+    for value in values:
+        data += struct.pack(">id", 8, value)
+    return data
+
+
+def test_as_array_decodes_binary_float8_arrays():
+    values = as_array(array_send([1.5, -2.0, float("nan"), 1e9]))
+    assert values.dtype == np.float64
+    assert values[:2].tolist() == [1.5, -2.0]
+    assert math.isnan(values[2]) and values[3] == 1e9
+
+
+def test_as_array_of_no_rows():
+    assert as_array(None).size == 0
+    # array_agg over no rows is NULL; an empty array has zero dimensions
+    assert as_array(struct.pack(">iiI", 0, 0, FLOAT8_OID)).size == 0
+
+
+def test_hour_weekday_heatmap_counts_by_weekday_and_hour():
+    monday_8 = datetime(2026, 1, 5, 8, 30, tzinfo=timezone.utc).timestamp()
+    sunday_23 = datetime(2026, 1, 11, 23, 59, tzinfo=timezone.utc).timestamp()
+    heatmap = hour_weekday_heatmap(np.array([monday_8, monday_8 + 60, sunday_23, np.nan]))
+    assert heatmap["total"] == 3
+    assert heatmap["counts"][0][8] == 2
+    assert heatmap["counts"][6][23] == 1
+    assert sum(map(sum, heatmap["counts"])) == 3
+
+
+def test_accuracy_histogram_clips_and_skips_missing_values():
+    histogram = accuracy_histogram(np.array([0.05, 0.95, 1.2, np.nan]), bins=10)
+    assert histogram["total"] == 3
+    assert histogram["counts"][0] == 1 and histogram["counts"][9] == 2
+    assert len(histogram["edges"]) == 11
+
+
+def test_speed_distribution_ignores_unmeasured_speeds():
+    distribution = speed_distribution(np.array([0.0, 10.0, 20.0, 30.0, 1000.0]), bin_width=10.0)
+    assert distribution["total"] == 4
+    assert distribution["max"] == 1000.0
+    assert distribution["percentiles"]["p50"] == 25.0
+    assert len(distribution["counts"]) == 31 and distribution["counts"][-1] == 1
+    assert speed_distribution(np.array([0.0]), bin_width=10.0)["total"] == 0
+
+
+def test_cache_shares_one_computation_between_concurrent_misses():
+    cache = AnalyticsCache(ttl=60, max_entries=10)
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"total": 1}
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_compute("key", produce) for _ in range(5)))
+        assert results == [{"total": 1}] * 5
+        assert await cache.get_or_compute("key", produce) == {"total": 1}
+
+    asyncio.run(main())
+    assert len(calls) == 1
+    assert not cache.pending
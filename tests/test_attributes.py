@@ -0,0 +1,51 @@
+from traffic.attributes import VehicleAttributeVotes
+
+
+def read(plate, **attributes):
+    car = {"plate": {"plate": plate}}
+    for attribute, (value, confidence) in attributes.items():
+        car[attribute] = {"class": value, "conf": confidence}
+    return {"cars": [car]}
+
+
+def test_confidence_weighted_winner_per_attribute():
+    votes = VehicleAttributeVotes(min_weight=1.0, max_vehicles=100)
+    votes.add([
+        read("11a22233", vehicle_color=("white", 0.9), vehicle_type=("sedan", 0.6)),
+        read("11a22233", vehicle_color=("silver", 0.4), vehicle_type=("sedan", 0.7)),
+        read("11a22233", vehicle_color=("white", 0.5), vehicle_type=("suv", 0.9)),
+    ])
+    assert votes.pop_updates() == [
+        {"plate_number": "11a22233", "vehicle_class": None, "vehicle_type": "sedan", "vehicle_color": "white"},
+    ]
+    assert votes.pop_updates() == []
+
+
+def test_a_single_read_does_not_reach_min_weight():
+    votes = VehicleAttributeVotes(min_weight=1.0, max_vehicles=100)
+    votes.add([read("11a22233", vehicle_color=("red", 0.9))])
+    assert votes.pop_updates() == []
+    votes.add([read("11a22233", vehicle_color=("red", 0.9))])
+    assert votes.pop_updates()[0]["vehicle_color"] == "red"
+
+
+def test_null_markers_and_missing_confidence():
+    votes = VehicleAttributeVotes(min_weight=1.0, max_vehicles=100)
+    votes.add([read("11a22233", vehicle_color=("null", 0.9), vehicle_class=("car", None))] * 2)
+    assert votes.pop_updates() == [
+        {"plate_number": "11a22233", "vehicle_class": "car", "vehicle_type": None, "vehicle_color": None},
+    ]
+
+
+def test_failed_flush_is_restored_and_least_recent_vehicles_forgotten():
+    votes = VehicleAttributeVotes(min_weight=0.5, max_vehicles=2)
+    votes.add([read("a", vehicle_color=("red", 0.9))])
+    votes.add([read("b", vehicle_color=("red", 0.9))])
+    updates = votes.pop_updates()
+    votes.restore(updates)
+    assert sorted(update["plate_number"] for update in votes.pop_updates()) == ["a", "b"]
+
+    votes.add([read("c", vehicle_color=("blue", 0.9))])
+    assert list(votes.votes) == ["b", "c"]
+    votes.restore(updates)
+    assert sorted(update["plate_number"] for update in votes.pop_updates()) == ["b", "c"]
@@ -0,0 +1,92 @@
+import asyncio
+
+from tcp.consensus import PlateConsensusTracker, plate_similarity, boxes_continuous
+
+
+def box(left, top, width=100, height=30):
+    return {"left": left, "top": top, "right": left + width, "bottom": top + height}
+
+
+def car(plate, accuracy, left, top=400):
+    return {"plate": {"plate": plate, "first": plate[:2], "letter": plate[2], "second": plate[3:]},
+            "ocr_accuracy": accuracy, "box": box(left, top)}
+
+
+def run(tracker, messages, wait=0.05):
+    async def feed():
+        for message_id, body in messages:
+            tracker.add(message_id, body)
+        await asyncio.sleep(wait)
+        tracker.flush()
+    asyncio.run(feed())
+
+
+def collecting_tracker(**kwargs):
+    published = []
+    tracker = PlateConsensusTracker(window=kwargs.get("window", 0.01),
+                                    max_reads=kwargs.get("max_reads", 50), max_age=kwargs.get("max_age", 10.0))
+    tracker.publish = lambda message_id, body: published.append((message_id, body))
+    return tracker, published
+
+
+def test_plate_similarity():
+    assert plate_similarity("11a22233", "11a22233") == 1.0
+    assert plate_similarity("11a22233", "11a22234") == 1 - 1 / 8
+    assert plate_similarity("", "") == 1.0
+
+
+def test_boxes_continuous():
+    assert boxes_continuous(box(100, 400), box(120, 405))
+    assert not boxes_continuous(box(100, 400), box(900, 400))
+    assert boxes_continuous(None, box(100, 400))
+
+
+def test_reads_of_one_vehicle_collapse_to_the_voted_plate():
+    tracker, published = collecting_tracker()
+    run(tracker, [
+        ("m1", {"camera_id": "1", "cars": [car("11a22233", 0.9, 100)]}),
+        ("m2", {"camera_id": "1", "cars": [car("11a22288", 0.4, 110)]}),
+        ("m3", {"camera_id": "1", "cars": [car("11a22233", 0.8, 120)]}),
+    ])
+    assert len(published) == 1
+    message_id, body = published[0]
+    assert message_id == "m1"
+    assert body["cars"][0]["plate"]["plate"] == "11a22233"
+    assert body["cars"][0]["consensus_reads"] == 3
+
+
+def test_cars_of_one_message_are_never_merged():
+    tracker, published = collecting_tracker()
+    run(tracker, [
+        ("m1", {"camera_id": "1", "cars": [car("11a22233", 0.9, 100), car("11a22234", 0.9, 140)]}),
+    ])
+    plates = sorted(body["cars"][0]["plate"]["plate"] for _, body in published)
+    assert plates == ["11a22233", "11a22234"]
+    assert [message_id for message_id, _ in published].count("m1-1") == 1
+
+
+def test_similar_plates_far_apart_are_different_vehicles():
+    tracker, published = collecting_tracker()
+    run(tracker, [
+        ("m1", {"camera_id": "1", "cars": [car("11a22233", 0.9, 100)]}),
+        ("m2", {"camera_id": "1", "cars": [car("11a22233", 0.9, 1500)]}),
+    ])
+    assert len(published) == 2
+
+
+def test_cameras_are_tracked_separately():
+    tracker, published = collecting_tracker()
+    run(tracker, [
+        ("m1", {"camera_id": "1", "cars": [car("11a22233", 0.9, 100)]}),
+        ("m2", {"camera_id": "2", "cars": [car("11a22233", 0.9, 100)]}),
+    ])
+    assert len(published) == 2
+
+
+def test_full_track_is_closed_and_a_new_one_started():
+    tracker, published = collecting_tracker(window=10.0, max_reads=3)
+    run(tracker, [
+        (f"m{index}", {"camera_id": "1", "cars": [car("11a22233", 0.9, 100)]}) for index in range(5)
+    ], wait=0)
+    assert [body["cars"][0]["consensus_reads"] for _, body in published] == [3, 2]
+    assert tracker.reads_in == 5 and tracker.reads_out == 2
@@ -0,0 +1,43 @@
+import json
+
+from tcp.dedup import MessageDeduplicator, peek_message_id
+
+
+def test_peek_message_id_finds_the_id_after_the_body():
+    message = json.dumps({"messageBody": {"cars": [{"plate": {"plate": "11a22233"}}]}, "messageId": "abc-1"})
+    assert peek_message_id(message) == "abc-1"
+
+
+def test_peek_message_id_tolerates_whitespace_and_missing_ids():
+    assert peek_message_id('{"messageBody": {}, "messageId" :  "abc-2"}') == "abc-2"
+    assert peek_message_id('{"messageBody": {}}') is None
+    assert peek_message_id('{"messageId": 42}') is None
+
+
+def test_repeated_id_is_seen_before_within_the_window():
+    dedup = MessageDeduplicator(window=60, max_size=100)
+    assert not dedup.seen_before("a")
+    assert dedup.seen_before("a")
+    assert not dedup.seen_before("b")
+    assert dedup.contains("a") and not dedup.contains("c")
+
+
+def test_ids_expire_after_the_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("tcp.dedup.time.monotonic", lambda: now[0])
+    dedup = MessageDeduplicator(window=10, max_size=100)
+    dedup.seen_before("a")
+    now[0] += 5
+    dedup.seen_before("b")
+    now[0] += 6
+    assert not dedup.contains("a")
+    assert dedup.contains("b")
+    assert not dedup.seen_before("a")
+
+
+def test_oldest_ids_are_evicted_past_max_size():
+    dedup = MessageDeduplicator(window=60, max_size=2)
+    for message_id in ("a", "b", "c"):
+        dedup.seen_before(message_id)
+    assert list(dedup.seen) == ["b", "c"]
+    assert not dedup.seen_before("a")
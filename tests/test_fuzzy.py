@@ -0,0 +1,25 @@
+import pytest
+
+from traffic.fuzzy import CONFUSABLE_FROM, CONFUSABLE_TO, INDEL_COST, normalize_plate, ocr_edit_distance
+
+
+def test_normalize_plate_folds_confusable_characters():
+    assert len(CONFUSABLE_FROM) == len(CONFUSABLE_TO)
+    assert normalize_plate("B0O8-SZ") == normalize_plate("8oo8-52") == "8008-52"
+
+
+def test_identical_plates_have_no_distance():
+    assert ocr_edit_distance("11A22233", "11a22233") == 0
+
+
+def test_confusable_substitution_is_cheaper_than_any_other():
+    confusable = ocr_edit_distance("11b22233", "11822233")
+    other = ocr_edit_distance("11b22233", "11x22233")
+    assert confusable == pytest.approx(0.2)
+    assert other == 1.0
+    assert ocr_edit_distance("118", "11b") == ocr_edit_distance("11b", "118")
+
+
+def test_dropped_characters_cost_indel_cost():
+    assert ocr_edit_distance("11a22233", "11a2223") == pytest.approx(INDEL_COST)
+    assert ocr_edit_distance("", "abc") == pytest.approx(3 * INDEL_COST)
@@ -0,0 +1,139 @@
+import os
+import json
+import asyncio
+
+from tcp.journal import EventJournal, JournalConsumer, read_segment, replay_dead_letters, RECORD_HEADER
+
+
+def open_journal(root, segment_max_bytes=1 << 20, segment_max_age=3600.0):
+    journal = EventJournal(str(root), segment_max_bytes=segment_max_bytes, segment_max_age=segment_max_age)
+    journal.open()
+    return journal
+
+
+def make_consumer(journal, handler, max_attempts=3, is_transient=lambda error: False):
+    return JournalConsumer(journal, "test", handler, batch_size=10, poll_interval=0.001,
+                           retry_delay=0.001, max_attempts=max_attempts, is_transient=is_transient)
+
+
+async def consume(consumer, until):
+    await consumer.start()
+    try:
+        for _ in range(2000):
+            if until():
+                return
+            await asyncio.sleep(0.001)
+        raise AssertionError("consumer did not catch up")
+    finally:
+        await consumer.stop()
+
+
+def test_append_numbers_records_and_reads_them_back(tmp_path):
+    journal = open_journal(tmp_path)
+    assert [journal.append({"n": n}) for n in range(3)] == [1, 2, 3]
+    records = read_segment(journal.segment_path(journal.segment_base), 0, 10)
+    assert [(seq, json.loads(payload)) for seq, _, payload, _ in records] == [(1, {"n": 0}), (2, {"n": 1}), (3, {"n": 2})]
+    journal.close()
+
+
+def test_segments_roll_by_size_and_are_named_after_their_first_record(tmp_path):
+    journal = open_journal(tmp_path, segment_max_bytes=RECORD_HEADER.size + 1)
+    for n in range(3):
+        journal.append({"n": n})
+    assert journal.segment_bases() == [1, 2, 3]
+    journal.remove_segments_through(2)
+    assert journal.segment_bases() == [3]
+    journal.close()
+
+
+def test_corrupt_record_ends_the_read_and_is_dropped_on_recovery(tmp_path):
+    journal = open_journal(tmp_path)
+    for n in range(3):
+        journal.append({"n": n})
+    path = journal.segment_path(journal.segment_base)
+    journal.close()
+
+    second_end = read_segment(path, 0, 10)[1][3]
+    with open(path, "r+b") as segment:
+        segment.seek(second_end + RECORD_HEADER.size)
+        segment.write(b"X")
+    assert [record[0] for record in read_segment(path, 0, 10)] == [1, 2]
+
+    journal = open_journal(tmp_path)
+    assert journal.next_seq == 3
+    assert os.path.getsize(path) == second_end
+    journal.close()
+
+
+def test_journals_of_concurrent_processes_are_separate(tmp_path):
+    first, second = open_journal(tmp_path), open_journal(tmp_path)
+    assert first.directory != second.directory
+    first.close()
+    second.close()
+
+
+def test_consumer_commits_its_offset_and_resumes_after_it(tmp_path):
+    journal = open_journal(tmp_path, segment_max_bytes=RECORD_HEADER.size + 1)
+    for n in range(5):
+        journal.append({"n": n})
+    seen = []
+
+    async def handler(events):
+        seen.extend(event["n"] for event in events)
+
+    consumer = make_consumer(journal, handler)
+    asyncio.run(consume(consumer, lambda: consumer.committed == 5))
+    assert seen == [0, 1, 2, 3, 4]
+    assert consumer.lag == 0
+
+    journal.append({"n": 5})
+    consumer = make_consumer(journal, handler)
+    asyncio.run(consume(consumer, lambda: consumer.committed == 6))
+    assert seen == [0, 1, 2, 3, 4, 5]
+    journal.close()
+
+
+def test_bad_record_is_dead_lettered_and_replayed(tmp_path):
+    journal = open_journal(tmp_path)
+    for n in range(3):
+        journal.append({"n": n})
+    stored = []
+
+    async def handler(events):
+        if any(event["n"] == 1 for event in events):
+            raise ValueError("bad record")
+        stored.extend(event["n"] for event in events)
+
+    consumer = make_consumer(journal, handler)
+    asyncio.run(consume(consumer, lambda: consumer.committed == 3))
+    assert stored == [0, 2]
+    assert consumer.dead_lettered == 1
+    with open(consumer.dead_letter_path) as dead_letter_file:
+        assert [json.loads(line)["seq"] for line in dead_letter_file] == [2]
+
+    assert asyncio.run(replay_dead_letters(consumer.dead_letter_path, handler)) == (0, 1)
+
+    async def fixed_handler(events):
+        stored.extend(event["n"] for event in events)
+
+    assert asyncio.run(replay_dead_letters(consumer.dead_letter_path, fixed_handler)) == (1, 0)
+    assert stored == [0, 2, 1]
+    assert not os.path.exists(consumer.dead_letter_path)
+    journal.close()
+
+
+def test_outage_is_retried_without_dead_lettering(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.append({"n": 0})
+    calls = []
+
+    async def handler(events):
+        calls.append(events)
+        if len(calls) <= 10:
+            raise ConnectionRefusedError("database is down")
+
+    consumer = make_consumer(journal, handler, max_attempts=2, is_transient=lambda error: isinstance(error, OSError))
+    asyncio.run(consume(consumer, lambda: consumer.committed == 1))
+    assert len(calls) == 11
+    assert consumer.dead_lettered == 0
+    journal.close()
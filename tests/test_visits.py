@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+from lpr.model import GateType
+from traffic.cameras import CameraGate
+from traffic.visits import VisitTracker
+
+
+ENTRANCE = CameraGate(gate_id=1, building_id=10, gate_type=GateType.ENTRANCE)
+EXIT = CameraGate(gate_id=2, building_id=10, gate_type=GateType.EXIT)
+BOTH = CameraGate(gate_id=3, building_id=20, gate_type=GateType.BOTH)
+START = datetime(2026, 1, 5, 8, 0, 0)
+
+
+def at(seconds: float) -> datetime:
+    return START + timedelta(seconds=seconds)
+
+
+def tracker() -> VisitTracker:
+    return VisitTracker(reentry_gap=60, max_dwell=3600, recent_size=10)
+
+
+def test_entrance_and_exit_pair_into_a_visit():
+    visits = tracker()
+    visits.add("11a22233", ENTRANCE, at(0))
+    visits.add("11a22233", ENTRANCE, at(2))
+    assert visits.occupancy_snapshot() == [{"building_id": 10, "occupancy": 1}]
+
+    visits.add("11a22233", EXIT, at(600))
+    assert visits.occupancy_snapshot() == []
+    [visit] = visits.pop_closed()
+    assert visit["entry_gate_id"] == 1 and visit["exit_gate_id"] == 2
+    assert visit["dwell_seconds"] == 600
+
+
+def test_further_reads_of_the_exit_pass_do_not_reopen_the_visit():
+    visits = tracker()
+    visits.add("11a22233", BOTH, at(0))
+    visits.add("11a22233", BOTH, at(600))
+    visits.add("11a22233", BOTH, at(605))
+    assert visits.occupancy_snapshot() == []
+    assert len(visits.pop_closed()) == 1
+
+    visits.add("11a22233", BOTH, at(1200))
+    assert visits.occupancy_snapshot() == [{"building_id": 20, "occupancy": 1}]
+
+
+def test_missed_exit_is_closed_by_the_next_entrance_and_by_expiry():
+    visits = tracker()
+    visits.add("11a22233", ENTRANCE, at(0))
+    visits.add("11a22233", ENTRANCE, at(600))
+    [missed] = visits.pop_closed()
+    assert missed["exited_at"] is None
+    assert visits.occupancy_snapshot() == [{"building_id": 10, "occupancy": 1}]
+
+    visits.add("22b33344", ENTRANCE, at(5000))
+    visits.expire()
+    assert [visit["plate_number"] for visit in visits.pop_closed()] == ["11a22233"]
+    assert visits.occupancy_snapshot() == [{"building_id": 10, "occupancy": 1}]
+
+
+def test_snapshot_resumes_where_the_last_process_stopped():
+    visits = tracker()
+    visits.add("11a22233", ENTRANCE, at(0))
+    visits.add("22b33344", BOTH, at(0))
+    visits.add("22b33344", BOTH, at(600))
+    visits.pop_closed()
+
+    resumed = tracker()
+    resumed.restore_snapshot(visits.snapshot())
+    assert resumed.occupancy_snapshot() == visits.occupancy_snapshot()
+    # Still part of the exit pass, so it does not open a new visit
+    resumed.add("22b33344", BOTH, at(610))
+    resumed.add("11a22233", EXIT, at(900))
+    assert resumed.occupancy_snapshot() == []
+    [visit] = resumed.pop_closed()
+    assert visit["entered_at"] == at(0) and visit["exited_at"] == at(900)
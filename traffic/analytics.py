@@ -0,0 +1,134 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+from settings import settings
+
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+# 1970-01-01 was a Thursday; weekdays count from Monday = 0
+EPOCH_WEEKDAY = 3
+SPEED_PERCENTILES = (50, 75, 90, 95, 99)
+# Faster reads are counted in the last histogram bin, so a bogus speed cannot blow it up
+MAX_HISTOGRAM_SPEED = 300.0
+# Binary float8[] as produced by array_send: ndim, has-nulls flag, element type, then
+# size and lower bound of the single dimension, then (length, value) per element
+ARRAY_HEADER_SIZE = 20
+ARRAY_ELEMENT = np.dtype([("length", ">i4"), ("value", ">f8")])
+
+
+def as_array(data: Optional[bytes]) -> np.ndarray:
+    """
+    Column aggregated by array_send(array_agg(...)) as a float array. The
+    binary array is viewed in place and only byte-swapped, so no Python
+    object is built per value. NULLs must already be NaN, which keeps every
+    element the same size.
+    """
+    if not data or int.from_bytes(data[:4], "big") == 0:
+        return np.empty(0, dtype=np.float64)
+    return np.frombuffer(data, dtype=ARRAY_ELEMENT, offset=ARRAY_HEADER_SIZE)["value"].astype(np.float64)
+
+
+def hour_weekday_heatmap(epochs: np.ndarray) -> dict:
+    """
+    Reads per weekday (rows, Monday first) and hour of day (columns) from
+    timestamps in epoch seconds.
+    """
+    seconds = epochs[~np.isnan(epochs)].astype(np.int64)
+    days, seconds_of_day = np.divmod(seconds, SECONDS_PER_DAY)
+    cells = (days + EPOCH_WEEKDAY) % 7 * 24 + seconds_of_day // SECONDS_PER_HOUR
+    counts = np.bincount(cells, minlength=7 * 24).reshape(7, 24)
+    return {"total": int(seconds.size), "counts": counts.tolist()}
+
+
+def accuracy_histogram(accuracies: np.ndarray, bins: int) -> dict:
+    values = np.clip(accuracies[~np.isnan(accuracies)], 0.0, 1.0)
+    counts, edges = np.histogram(values, bins=bins, range=(0.0, 1.0))
+    return {
+        "total": int(values.size),
+        "mean": float(values.mean()) if values.size else None,
+        "edges": np.round(edges, 6).tolist(),
+        "counts": counts.tolist(),
+    }
+
+
+def speed_distribution(speeds: np.ndarray, bin_width: float) -> dict:
+    """
+    Percentiles and a fixed-width histogram of vision speeds. LPRs report 0
+    when they could not measure a speed, so only positive speeds count.
+    Speeds above MAX_HISTOGRAM_SPEED land in the last bin.
+    """
+    values = speeds[speeds > 0]
+    if not values.size:
+        return {"total": 0, "mean": None, "max": None, "percentiles": {}, "bin_width": bin_width, "counts": []}
+    percentiles = np.percentile(values, SPEED_PERCENTILES)
+    counts = np.bincount((np.minimum(values, MAX_HISTOGRAM_SPEED) // bin_width).astype(np.int64))
+    return {
+        "total": int(values.size),
+        "mean": float(values.mean()),
+        "max": float(values.max()),
+        "percentiles": {f"p{p}": round(float(value), 3) for p, value in zip(SPEED_PERCENTILES, percentiles)},
+        "bin_width": bin_width,
+        "counts": counts.tolist(),
+    }
+
+
+class AnalyticsCache:
+    """
+    Computed analytics by (kind, scope, window), kept for ``ttl`` seconds.
+    Dashboards poll the same few scopes, so most requests skip the query.
+    The oldest entries are evicted past ``max_entries``.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.pending: Dict[Hashable, asyncio.Future] = {}
+
+    async def get_or_compute(self, key: Hashable, produce: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Cached value of ``key``, or the result of ``produce``. Concurrent
+        misses of one key share a single ``produce`` call, so a dashboard
+        refresh runs each query once. A caller that goes away does not
+        cancel it for the others.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        pending = self.pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._produce(key, produce))
+            self.pending[key] = pending
+        return await asyncio.shield(pending)
+
+    async def _produce(self, key: Hashable, produce: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await produce()
+            self.set(key, value)
+            return value
+        finally:
+            self.pending.pop(key, None)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+analytics_cache = AnalyticsCache(settings.TRAFFIC_ANALYTICS_CACHE_TTL, settings.TRAFFIC_ANALYTICS_CACHE_MAX_ENTRIES)
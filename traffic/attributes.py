@@ -0,0 +1,87 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, List
+
+from traffic.crud import safe_convert
+
+logger = logging.getLogger(__name__)
+
+
+VEHICLE_ATTRIBUTES = ("vehicle_class", "vehicle_type", "vehicle_color")
+# Weight of a read that reports a class without a confidence
+DEFAULT_CONFIDENCE = 0.5
+
+
+class VehicleAttributeVotes:
+    """
+    Running confidence-weighted votes on the class, type and color of each
+    vehicle seen by this process.
+
+    Reads only add to the votes; ``pop_updates`` hands out the current
+    winners of vehicles that got new votes, so they can be written in one
+    batch instead of an UPDATE per read. A winner needs ``min_weight`` in
+    total so a single stray read after a restart cannot overwrite a settled
+    value. The least recently seen vehicles are forgotten past ``max_vehicles``.
+    """
+
+    def __init__(self, min_weight: float, max_vehicles: int):
+        self.min_weight = min_weight
+        self.max_vehicles = max_vehicles
+        self.votes: "OrderedDict[str, Dict[str, Dict[str, float]]]" = OrderedDict()
+        self.dirty = set()
+
+    def add(self, events: List[dict]):
+        for event in events:
+            for car in event.get("cars", []):
+                plate_number = car.get("plate", {}).get("plate", "Unknown")
+                vehicle_votes = self.votes.get(plate_number)
+                if vehicle_votes is None:
+                    vehicle_votes = self.votes[plate_number] = {attribute: {} for attribute in VEHICLE_ATTRIBUTES}
+                else:
+                    self.votes.move_to_end(plate_number)
+
+                for attribute in VEHICLE_ATTRIBUTES:
+                    reported = car.get(attribute) or {}
+                    value = safe_convert(reported.get("class"))
+                    if value is None:
+                        continue
+                    confidence = reported.get("conf")
+                    if not isinstance(confidence, (int, float)) or confidence <= 0:
+                        confidence = DEFAULT_CONFIDENCE
+                    attribute_votes = vehicle_votes[attribute]
+                    attribute_votes[value] = attribute_votes.get(value, 0.0) + confidence
+                    self.dirty.add(plate_number)
+
+        while len(self.votes) > self.max_vehicles:
+            plate_number, _ = self.votes.popitem(last=False)
+            self.dirty.discard(plate_number)
+
+    def _winner(self, attribute_votes: Dict[str, float]):
+        if not attribute_votes:
+            return None
+        value = max(attribute_votes, key=attribute_votes.get)
+        if attribute_votes[value] < self.min_weight:
+            return None
+        return value
+
+    def pop_updates(self) -> List[dict]:
+        """
+        Current winners of the vehicles voted on since the last call. An
+        attribute without a winner is None and keeps its stored value.
+        """
+        updates = []
+        for plate_number in self.dirty:
+            winners = {
+                attribute: self._winner(self.votes[plate_number][attribute])
+                for attribute in VEHICLE_ATTRIBUTES
+            }
+            if any(value is not None for value in winners.values()):
+                updates.append({"plate_number": plate_number, **winners})
+        self.dirty = set()
+        return updates
+
+    def restore(self, updates: List[dict]):
+        """
+        Marks vehicles of a failed flush dirty again.
+        """
+        self.dirty.update(update["plate_number"] for update in updates if update["plate_number"] in self.votes)
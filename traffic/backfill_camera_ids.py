@@ -0,0 +1,48 @@
+"""
+Fills traffic.camera_id for rows stored before it became a foreign key to
+cameras, in id ranges of one transaction each.
+
+    python -m traffic.backfill_camera_ids --batch 50000
+
+Safe to run while ingest is writing and to rerun after an interruption;
+rows that already have a camera_id are left alone. Run it before
+traffic.backfill_rollups, which only counts rows with a camera_id.
+"""
+import asyncio
+import argparse
+from sqlalchemy import text
+
+from db.engine import engine
+
+
+BACKFILL_STATEMENT = text("""
+    UPDATE traffic SET camera_id = cameras.id
+    FROM cameras
+    WHERE traffic.id >= :start AND traffic.id < :end
+      AND traffic.camera_id IS NULL AND traffic.source_camera_id = cameras.id::text
+""")
+
+
+async def backfill_camera_ids(batch: int):
+    async with engine.connect() as connection:
+        bounds = await connection.execute(text("SELECT min(id), max(id) FROM traffic WHERE camera_id IS NULL"))
+        first, last = bounds.one()
+    start = first
+    while first is not None and start <= last:
+        end = start + batch
+        async with engine.begin() as connection:
+            result = await connection.execute(BACKFILL_STATEMENT, {"start": start, "end": end})
+        print(f"[INFO] Resolved the camera of {result.rowcount} traffic rows with ids {start}-{end - 1}")
+        start = end
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve traffic.camera_id of rows stored before the camera foreign key")
+    parser.add_argument("--batch", type=int, default=50000, help="ids per transaction")
+    args = parser.parse_args()
+    asyncio.run(backfill_camera_ids(args.batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Rebuilds traffic_hourly_rollups from raw traffic, one day per transaction.
+
+    python -m traffic.backfill_rollups --start 2024-11-01 --end 2024-12-01
+
+Counters of each hour in the range are overwritten with the count from
+raw traffic. Prefer ranges that ingest is no longer writing to.
+"""
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+from db.engine import engine
+
+
+BACKFILL_STATEMENT = text("""
+    INSERT INTO traffic_hourly_rollups (camera_id, hour, count)
+    SELECT camera_id, date_trunc('hour', timestamp), count(*)
+    FROM traffic
+    WHERE camera_id IS NOT NULL AND timestamp >= :start AND timestamp < :end
+    GROUP BY 1, 2
+    ON CONFLICT (camera_id, hour) DO UPDATE SET count = excluded.count
+""")
+CLEAR_STATEMENT = text("DELETE FROM traffic_hourly_rollups WHERE hour >= :start AND hour < :end")
+
+
+async def backfill_rollups(start: datetime, end: datetime):
+    day = start.replace(minute=0, second=0, microsecond=0)
+    while day < end:
+        next_day = min(day.replace(hour=0) + timedelta(days=1), end)
+        async with engine.begin() as connection:
+            # Hours without traffic must not keep a stale counter
+            await connection.execute(CLEAR_STATEMENT, {"start": day, "end": next_day})
+            result = await connection.execute(BACKFILL_STATEMENT, {"start": day, "end": next_day})
+        print(f"[INFO] Rebuilt {result.rowcount} hourly rollups for {day:%Y-%m-%d}")
+        day = next_day
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild hourly traffic rollups from raw traffic")
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--end", type=datetime.fromisoformat, default=datetime.utcnow())
+    args = parser.parse_args()
+    asyncio.run(backfill_rollups(args.start, args.end))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark of the traffic analytics over synthetic traffic columns.
+
+Generates the columns get_traffic_columns would return for ``--rows``
+reads, then times each analytic. With --from-binary a column also starts
+out as the binary float8[] array_send returns, and turning it into an
+array is timed too. No database is involved.
+
+    python -m traffic.bench_analytics --rows 10000000 --repeat 5 --output analytics.json
+"""
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from traffic.analytics import (
+    ARRAY_ELEMENT, accuracy_histogram, as_array, hour_weekday_heatmap, speed_distribution,
+)
+
+
+def synthetic_columns(rows: int, days: int, seed: int) -> dict:
+    generator = np.random.default_rng(seed)
+    end = datetime.utcnow().timestamp()
+    timestamps = np.sort(generator.uniform(end - days * 86400, end, rows))
+    accuracies = generator.beta(8, 2, rows)
+    # Some LPRs send no accuracy
+    accuracies[generator.random(rows) < 0.01] = np.nan
+    speeds = np.abs(generator.normal(35, 15, rows))
+    # and no speed for a fifth of the reads
+    speeds[generator.random(rows) < 0.2] = 0.0
+    return {"timestamp": timestamps, "ocr_accuracy": accuracies, "vision_speed": speeds}
+
+
+def array_send(values: np.ndarray) -> bytes:
+    """
+    The bytes Postgres' array_send returns for a float8[] without NULLs.
+    """
+    elements = np.empty(values.size, dtype=ARRAY_ELEMENT)
+    elements["length"] = 8
+    elements["value"] = values
+    header = np.array([1, 0, 701, values.size, 1], dtype=">i4").tobytes()
+    return header + elements.tobytes()
+
+
+def timed(function, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return {"best_ms": round(min(samples) * 1000, 3), "mean_ms": round(sum(samples) / len(samples) * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the traffic analytics")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--from-binary", action="store_true", help="also time converting array_send bytes to arrays")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    columns = synthetic_columns(args.rows, args.days, args.seed)
+    print(f"[INFO] Generated {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    results = {
+        "rows": args.rows,
+        "heatmap": timed(lambda: hour_weekday_heatmap(columns["timestamp"]), args.repeat),
+        "ocr_accuracy": timed(lambda: accuracy_histogram(columns["ocr_accuracy"], 20), args.repeat),
+        "vision_speed": timed(lambda: speed_distribution(columns["vision_speed"], 5.0), args.repeat),
+    }
+    if args.from_binary:
+        data = array_send(columns["vision_speed"])
+        assert np.array_equal(as_array(data), columns["vision_speed"])
+        results["from_binary"] = timed(lambda: as_array(data), args.repeat)
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import zlib
+import asyncio
+import logging
+from typing import List
+from fastapi import HTTPException, Request, status
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from traffic.crud import TrafficOperation
+from traffic.cameras import camera_directory
+from lpr.model import DBLpr
+from traffic.schema import PlatesDataMessage
+
+logger = logging.getLogger(__name__)
+
+
+# Built once; validates a whole upload in a single call into pydantic-core
+plates_data_messages = TypeAdapter(List[PlatesDataMessage])
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+async def read_upload(request: Request) -> bytes:
+    """
+    Reads the request body, refusing it as soon as it grows past
+    BULK_INGEST_MAX_BYTES instead of buffering whatever was sent.
+    """
+    too_large = HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "upload too large")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.BULK_INGEST_MAX_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.BULK_INGEST_MAX_BYTES:
+            raise too_large
+    return bytes(body)
+
+
+def decompress_upload(body: bytes) -> bytes:
+    """
+    Gunzips an upload unless it is plain NDJSON, refusing to inflate it past
+    BULK_INGEST_MAX_BYTES. Concatenated gzip members, as written by
+    appending to a .gz file or by parallel compressors, are inflated one
+    after another.
+    """
+    if not body.startswith(GZIP_MAGIC):
+        if len(body) > settings.BULK_INGEST_MAX_BYTES:
+            raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "upload too large")
+        return body
+
+    members = []
+    size = 0
+    remaining = body
+    while remaining:
+        try:
+            decompressor = zlib.decompressobj(wbits=31)
+            member = decompressor.decompress(remaining, settings.BULK_INGEST_MAX_BYTES + 1 - size)
+        except zlib.error:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "body is not valid gzip")
+        size += len(member)
+        if size > settings.BULK_INGEST_MAX_BYTES:
+            raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "upload too large")
+        if not decompressor.eof:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "gzip body is truncated")
+        members.append(member)
+        remaining = decompressor.unused_data
+    return b"".join(members)
+
+
+def parse_plates_data_upload(body: bytes) -> List[dict]:
+    """
+    Parses gzip (or plain) NDJSON of plates_data messages into the events
+    stored by TrafficOperation.store_plate_events.
+    """
+    lines = [line for line in decompress_upload(body).split(b"\n") if line.strip()]
+    try:
+        # NDJSON lines joined into one JSON array, so validation is a single pass
+        messages = plates_data_messages.validate_json(b"[" + b",".join(lines) + b"]")
+    except ValidationError as error:
+        # The first errors only, without the offending input that may hold whole images
+        details = error.errors(include_url=False, include_context=False, include_input=False)[:20]
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, details)
+    return [{"message_id": message["messageId"], **message["messageBody"]} for message in messages]
+
+
+async def parse_plates_data_upload_in_thread(body: bytes) -> List[dict]:
+    # Inflating and validating a large upload would otherwise stall the loop, and the reactor with it
+    return await asyncio.to_thread(parse_plates_data_upload, body)
+
+
+async def check_upload_cameras(session: AsyncSession, lpr: DBLpr, events: List[dict]):
+    """
+    Rejects an upload with reads from cameras outside the uploading LPR's
+    gate, so an LPR token only writes traffic for its own cameras.
+    """
+    gates = await camera_directory.resolve_gates(session, (event.get("camera_id") for event in events))
+    foreign = sorted(
+        str(camera_id) for camera_id, gate in gates.items()
+        if gate is None or gate.gate_id != lpr.gate_id
+    )
+    if foreign:
+        raise HTTPException(
+            status.HTTP_403_FORBIDDEN,
+            f"Cameras not attached to the gate of LPR {lpr.id}: {', '.join(foreign[:20])}",
+        )
+
+
+async def ingest_plate_events(session: AsyncSession, events: List[dict]) -> int:
+    """
+    Stores events in transactions of up to BULK_INGEST_BATCH_READS plate
+    reads and returns how many events were stored, i.e. not duplicates.
+    A failure keeps the batches before it; re-uploading is safe since
+    their messageIds are skipped.
+    """
+    operation = TrafficOperation(session)
+    stored = 0
+    batch, batch_reads = [], 0
+    for event in events:
+        batch.append(event)
+        batch_reads += max(len(event["cars"]), 1)
+        if batch_reads >= settings.BULK_INGEST_BATCH_READS:
+            stored += len(await operation.store_plate_events(batch))
+            batch, batch_reads = [], 0
+    if batch:
+        stored += len(await operation.store_plate_events(batch))
+    logger.info(f"Bulk ingested {stored} of {len(events)} plates_data messages")
+    return stored
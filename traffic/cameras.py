@@ -0,0 +1,66 @@
+import time
+import logging
+from typing import Dict, Iterable, NamedTuple, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from settings import settings
+from lpr.model import DBCamera, DBGate, GateType
+
+logger = logging.getLogger(__name__)
+
+
+# An unknown camera id triggers a reload at most this often
+MISS_RELOAD_INTERVAL = 5.0
+
+
+class CameraGate(NamedTuple):
+    gate_id: int
+    building_id: int
+    gate_type: GateType
+
+
+class CameraDirectory:
+    """
+    Cached mapping from the camera id an LPR reports (a string) to
+    cameras.id and the gate the camera watches, so ingest resolves it
+    without a query per read.
+
+    The mapping is reloaded every ``ttl`` seconds, and sooner when an id
+    shows up that it does not know, e.g. right after a camera was created.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.mapping: Dict[str, int] = {}
+        self.gates: Dict[int, CameraGate] = {}
+        self.loaded_at = 0.0
+
+    async def reload(self, session: AsyncSession):
+        result = await session.execute(
+            select(DBCamera.id, DBCamera.gate_id, DBGate.building_id, DBGate.gate_type)
+            .join(DBGate, DBCamera.gate_id == DBGate.id)
+        )
+        rows = result.all()
+        self.mapping = {str(row.id): row.id for row in rows}
+        self.gates = {row.id: CameraGate(row.gate_id, row.building_id, row.gate_type) for row in rows}
+        self.loaded_at = time.monotonic()
+
+    async def _reload_if_stale(self, session: AsyncSession, source_ids: set):
+        age = time.monotonic() - self.loaded_at
+        unknown = any(source_id is not None and str(source_id) not in self.mapping for source_id in source_ids)
+        if age >= self.ttl or (unknown and age >= MISS_RELOAD_INTERVAL):
+            await self.reload(session)
+
+    async def resolve(self, session: AsyncSession, source_ids: Iterable[Optional[str]]) -> Dict[Optional[str], Optional[int]]:
+        source_ids = set(source_ids)
+        await self._reload_if_stale(session, source_ids)
+        return {source_id: self.mapping.get(str(source_id)) for source_id in source_ids}
+
+    async def resolve_gates(self, session: AsyncSession, source_ids: Iterable[Optional[str]]) -> Dict[Optional[str], Optional[CameraGate]]:
+        source_ids = set(source_ids)
+        await self._reload_if_stale(session, source_ids)
+        return {source_id: self.gates.get(self.mapping.get(str(source_id))) for source_id in source_ids}
+
+
+camera_directory = CameraDirectory(settings.CAMERA_DIRECTORY_TTL)
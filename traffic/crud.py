@@ -0,0 +1,464 @@
+import math
+import base64
+import logging
+import dateutil.parser
+from collections import Counter
+from datetime import datetime
+from fastapi import HTTPException, status
+from typing import Dict, List, Optional
+from sqlalchemy import ARRAY, Float, String, any_, bindparam, cast, func, insert, literal_column, or_, text, tuple_, update
+from sqlalchemy.future import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from traffic.model import IngestedMessage, Vehicle, Visit, Traffic, TrafficHourlyRollup
+from lpr.model import DBCamera, DBGate
+from traffic.cameras import camera_directory
+from traffic.fuzzy import CONFUSABLE_FROM, CONFUSABLE_TO, normalize_plate, ocr_edit_distance
+
+logger = logging.getLogger(__name__)
+
+# Only a positive answer is cached, so installing the extension later needs no restart
+pg_trgm_installed = False
+
+
+def encode_traffic_cursor(timestamp: datetime, traffic_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{traffic_id}".encode()).decode()
+
+
+def decode_traffic_cursor(cursor: str):
+    try:
+        timestamp, traffic_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(traffic_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "invalid cursor")
+
+
+def event_timestamp(event: dict) -> datetime:
+    """
+    Timestamp of a plates_data event as a naive datetime in the LPR's clock time.
+    """
+    timestamp = event.get("timestamp")
+    if isinstance(timestamp, str):
+        timestamp = dateutil.parser.isoparse(timestamp)
+    return timestamp.replace(tzinfo=None)
+
+
+def safe_convert(value):
+    """
+    Converts an LPR attribute class to a string, treating its null markers as None.
+    """
+    if value in [None, "null", "None"]:
+        return None
+    return str(value)
+
+
+def traffic_scope_filters(
+    camera_id: Optional[int] = None,
+    gate_id: Optional[int] = None,
+    building_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> list:
+    """
+    Traffic filters for a camera, gate or building and a time range. Gates
+    and buildings resolve to camera ids, so the camera indexes drive the scan.
+    """
+    filters = []
+    if camera_id is not None:
+        filters.append(Traffic.camera_id == camera_id)
+    if gate_id is not None:
+        filters.append(Traffic.camera_id.in_(
+            select(DBCamera.id).where(DBCamera.gate_id == gate_id)
+        ))
+    if building_id is not None:
+        filters.append(Traffic.camera_id.in_(
+            select(DBCamera.id)
+            .join(DBGate, DBCamera.gate_id == DBGate.id)
+            .where(DBGate.building_id == building_id)
+        ))
+    # Timestamps are stored naive, in the clock time the LPR reported
+    if start is not None:
+        filters.append(Traffic.timestamp >= start.replace(tzinfo=None))
+    if end is not None:
+        filters.append(Traffic.timestamp < end.replace(tzinfo=None))
+    return filters
+
+
+class TrafficOperation:
+    def __init__(self, db_session: AsyncSession) -> None:
+        self.db_session = db_session
+
+    async def search_vehicles(
+        self,
+        first: Optional[str] = None,
+        letter: Optional[str] = None,
+        second: Optional[str] = None,
+        city_code: Optional[int] = None,
+        plate_type: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 10,
+    ):
+        """
+        Finds vehicles by any combination of plate components. Every filter
+        is an equality on an indexed column, so Postgres combines the
+        indexes instead of scanning plate_number.
+        """
+        filters = []
+        if first is not None:
+            filters.append(Vehicle.plate_first == first)
+        if letter is not None:
+            filters.append(Vehicle.plate_letter == letter)
+        if second is not None:
+            filters.append(Vehicle.plate_second == second)
+        if city_code is not None:
+            filters.append(Vehicle.plate_city_code == city_code)
+        if plate_type is not None:
+            filters.append(Vehicle.plate_type == plate_type)
+
+        total_query = await self.db_session.execute(select(func.count(Vehicle.id)).where(*filters))
+        total_records = total_query.scalar_one()
+        total_pages = math.ceil(total_records / page_size) if page_size else 1
+        offset = (page - 1) * page_size
+
+        query = await self.db_session.execute(
+            select(Vehicle).where(*filters).order_by(Vehicle.id).offset(offset).limit(page_size)
+        )
+        vehicles = query.scalars().all()
+        return {
+            "items": vehicles,
+            "total_records": total_records,
+            "total_pages": total_pages,
+            "current_page": page,
+            "page_size": page_size,
+        }
+
+    async def search_traffic(
+        self,
+        camera_id: Optional[int] = None,
+        gate_id: Optional[int] = None,
+        building_id: Optional[int] = None,
+        plate: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ):
+        """
+        Traffic newest first, paginated by a (timestamp, id) cursor so every
+        page is an index range scan from where the previous one stopped.
+        The plate filter resolves to vehicle ids first, so the composite
+        indexes drive the scan.
+        """
+        filters = traffic_scope_filters(camera_id, gate_id, building_id, start, end)
+        if plate is not None:
+            filters.append(Traffic.vehicle_id.in_(select(Vehicle.id).where(Vehicle.plate_number == plate)))
+        if cursor is not None:
+            filters.append(tuple_(Traffic.timestamp, Traffic.id) < tuple_(*decode_traffic_cursor(cursor)))
+
+        query = await self.db_session.execute(
+            select(Traffic)
+            .options(joinedload(Traffic.vehicle))
+            .where(*filters)
+            .order_by(Traffic.timestamp.desc(), Traffic.id.desc())
+            .limit(limit + 1)
+        )
+        entries = query.scalars().all()
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = encode_traffic_cursor(entries[-1].timestamp, entries[-1].id)
+        return {"items": entries, "next_cursor": next_cursor}
+
+    async def get_traffic_columns(
+        self,
+        columns: List[str],
+        camera_id: Optional[int] = None,
+        gate_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Dict[str, Optional[bytes]]:
+        """
+        Whole traffic columns of a scope, each aggregated by the server into
+        one binary float8 array (NULLs as NaN), so the driver decodes a single
+        bytes object per column instead of a float per row;
+        traffic.analytics.as_array turns them into NumPy arrays. "timestamp"
+        comes back in epoch seconds of the LPR clock.
+        """
+        expressions = {
+            "timestamp": cast(func.extract("epoch", Traffic.timestamp), Float),
+            "ocr_accuracy": Traffic.ocr_accuracy,
+            "vision_speed": Traffic.vision_speed,
+        }
+        query = await self.db_session.execute(
+            select(*(
+                func.array_send(func.array_agg(func.coalesce(cast(expressions[column], Float), literal_column("'NaN'::float8"))))
+                for column in columns
+            ))
+            .where(*traffic_scope_filters(camera_id, gate_id, None, start, end))
+        )
+        row = query.one()
+        return dict(zip(columns, row))
+
+    async def fuzzy_search_vehicles(self, plate: str, limit: int = 10):
+        """
+        Finds vehicles whose plate may be an OCR misread of ``plate``.
+
+        The trigram index on the confusion-folded plate narrows millions of
+        vehicles down to FUZZY_PLATE_CANDIDATES, which are then ranked by
+        OCR-aware edit distance. Answers 503 while the pg_trgm extension is
+        not installed; python -m db.prepare_vehicle_search installs it.
+        """
+        await self._require_pg_trgm()
+        # Literal arguments, so the expression matches the one the index was built on
+        folded_plate = func.translate(
+            func.lower(Vehicle.plate_number),
+            literal_column(f"'{CONFUSABLE_FROM}'"),
+            literal_column(f"'{CONFUSABLE_TO}'"),
+        )
+        normalized = normalize_plate(plate)
+        await self.db_session.execute(
+            text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"),
+            {"threshold": str(settings.FUZZY_PLATE_MIN_SIMILARITY)},
+        )
+        query = await self.db_session.execute(
+            select(Vehicle)
+            .where(folded_plate.op("%")(normalized))
+            .order_by(func.similarity(folded_plate, normalized).desc())
+            .limit(settings.FUZZY_PLATE_CANDIDATES)
+        )
+        candidates = query.scalars().all()
+        ranked = sorted(
+            ({"vehicle": vehicle, "distance": round(ocr_edit_distance(plate, vehicle.plate_number), 3)} for vehicle in candidates),
+            key=lambda match: match["distance"],
+        )
+        return ranked[:limit]
+
+    async def _require_pg_trgm(self):
+        global pg_trgm_installed
+        if pg_trgm_installed:
+            return
+        result = await self.db_session.execute(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"))
+        pg_trgm_installed = bool(result.scalar())
+        if not pg_trgm_installed:
+            raise HTTPException(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "Fuzzy plate search needs the pg_trgm extension; run python -m db.prepare_vehicle_search",
+            )
+
+    async def _claim_message_ids(self, events: List[dict]) -> List[dict]:
+        """
+        Records the message_id of each event and returns the events whose id
+        was not recorded before, keeping the first of duplicates in the batch.
+        Events without an id are always kept.
+        """
+        fresh, seen = [], set()
+        for event in events:
+            message_id = event.get("message_id")
+            if message_id is None:
+                fresh.append(event)
+            elif message_id not in seen:
+                seen.add(message_id)
+                fresh.append(event)
+        if not seen:
+            return fresh
+        result = await self.db_session.execute(
+            pg_insert(IngestedMessage)
+            .values([{"message_id": message_id} for message_id in seen])
+            .on_conflict_do_nothing(index_elements=[IngestedMessage.message_id])
+            .returning(IngestedMessage.message_id)
+        )
+        claimed = set(result.scalars().all())
+        return [event for event in fresh if event.get("message_id") is None or event["message_id"] in claimed]
+
+    async def store_plate_events(self, events: List[dict]) -> List[dict]:
+        """
+        Stores a batch of plates_data events in one transaction: one insert
+        of the new vehicles, one lookup of all their ids and one insert for
+        all traffic rows. Vehicles keep
+        the attributes of their first read. Events whose message_id was
+        stored before are skipped; the stored events are returned.
+        """
+        try:
+            events = await self._claim_message_ids(events)
+        except Exception:
+            await self.db_session.rollback()
+            raise
+        vehicles = {}
+        reads = []
+        for event in events:
+            timestamp = event_timestamp(event)
+            for car in event.get("cars", []):
+                plate_number = car.get("plate", {}).get("plate", "Unknown")
+                if plate_number not in vehicles:
+                    plate = car.get("plate", {})
+                    vehicles[plate_number] = {
+                        "plate_number": plate_number,
+                        "plate_first": safe_convert(plate.get("first")),
+                        "plate_letter": safe_convert(plate.get("letter")),
+                        "plate_second": safe_convert(plate.get("second")),
+                        "plate_city_code": plate.get("city_code") if isinstance(plate.get("city_code"), int) else None,
+                        "plate_type": safe_convert(plate.get("plate_type")),
+                        "vehicle_class": safe_convert(car.get("vehicle_class", {}).get("class")),
+                        "vehicle_type": safe_convert(car.get("vehicle_type", {}).get("class")),
+                        "vehicle_color": safe_convert(car.get("vehicle_color", {}).get("class")),
+                    }
+                reads.append((plate_number, event.get("camera_id"), timestamp, car))
+        if not reads:
+            await self.db_session.commit()
+            return events
+
+        try:
+            # Inserting in plate order makes concurrent batches take the unique index locks in
+            # the same order; existing vehicles are left untouched and looked up afterwards
+            rows = [vehicles[plate_number] for plate_number in sorted(vehicles)]
+            await self.db_session.execute(
+                pg_insert(Vehicle).values(rows).on_conflict_do_nothing(index_elements=[Vehicle.plate_number])
+            )
+            result = await self.db_session.execute(
+                select(Vehicle.plate_number, Vehicle.id).where(
+                    Vehicle.plate_number == any_(bindparam("plates", list(vehicles), type_=ARRAY(String)))
+                )
+            )
+            vehicle_ids = dict(result.all())
+            camera_ids = await camera_directory.resolve(self.db_session, (read[1] for read in reads))
+
+            traffic_rows = [
+                {
+                    "vehicle_id": vehicle_ids[plate_number],
+                    "source_camera_id": camera_id,
+                    "camera_id": camera_ids[camera_id],
+                    "timestamp": timestamp,
+                    "ocr_accuracy": car.get("ocr_accuracy", 0.0),
+                    "vision_speed": car.get("vision_speed", 0.0),
+                }
+                for plate_number, camera_id, timestamp, car in reads
+            ]
+            await self.db_session.execute(insert(Traffic), traffic_rows)
+            await self._add_to_hourly_rollups(traffic_rows)
+            await self.db_session.commit()
+            logger.info(f"Stored {len(reads)} plate reads from {len(events)} events")
+        except Exception as error:
+            logger.error(f"Couldn't save Vehicle/Traffic batch: {error}")
+            await self.db_session.rollback()
+            raise
+        return events
+
+    async def _add_to_hourly_rollups(self, traffic_rows: List[dict]):
+        """
+        Counts a batch per camera and hour in memory and adds the counts with
+        one upsert, in the same transaction as the traffic rows, so a retried
+        batch never counts twice. Reads of unknown cameras are not counted.
+        """
+        counts = Counter(
+            (row["camera_id"], row["timestamp"].replace(minute=0, second=0, microsecond=0))
+            for row in traffic_rows
+            if row["camera_id"] is not None
+        )
+        if not counts:
+            return
+        # Sorted, so concurrent batches lock shared counters in the same order
+        statement = pg_insert(TrafficHourlyRollup).values([
+            {"camera_id": camera_id, "hour": hour, "count": count}
+            for (camera_id, hour), count in sorted(counts.items())
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[TrafficHourlyRollup.camera_id, TrafficHourlyRollup.hour],
+            set_={"count": TrafficHourlyRollup.count + statement.excluded.count},
+        )
+        await self.db_session.execute(statement)
+
+    async def get_traffic_rollups(
+        self,
+        group_by: str = "camera",
+        interval: str = "hour",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        camera_id: Optional[int] = None,
+        gate_id: Optional[int] = None,
+        building_id: Optional[int] = None,
+    ):
+        """
+        Traffic counts per camera, gate or building and per hour or day,
+        summed from the hourly rollups instead of raw traffic.
+        """
+        keys = {"camera": DBCamera.id, "gate": DBGate.id, "building": DBGate.building_id}
+        if group_by not in keys or interval not in ("hour", "day"):
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "group_by must be camera, gate or building and interval hour or day")
+        key = keys[group_by]
+        bucket = TrafficHourlyRollup.hour if interval == "hour" else func.date_trunc("day", TrafficHourlyRollup.hour)
+
+        filters = []
+        if start is not None:
+            filters.append(TrafficHourlyRollup.hour >= start.replace(tzinfo=None))
+        if end is not None:
+            filters.append(TrafficHourlyRollup.hour < end.replace(tzinfo=None))
+        if camera_id is not None:
+            filters.append(DBCamera.id == camera_id)
+        if gate_id is not None:
+            filters.append(DBGate.id == gate_id)
+        if building_id is not None:
+            filters.append(DBGate.building_id == building_id)
+
+        query = await self.db_session.execute(
+            select(key.label("key"), bucket.label("bucket"), func.sum(TrafficHourlyRollup.count).label("count"))
+            .join(DBCamera, TrafficHourlyRollup.camera_id == DBCamera.id)
+            .join(DBGate, DBCamera.gate_id == DBGate.id)
+            .where(*filters)
+            .group_by(key, bucket)
+            .order_by(bucket, key)
+        )
+        return [{"key": row.key, "bucket": row.bucket, "count": row.count} for row in query.all()]
+
+    async def store_visits(self, visits: List[dict]):
+        """
+        Stores closed visits; visits stored before are skipped.
+        """
+        if not visits:
+            return
+        try:
+            await self.db_session.execute(
+                pg_insert(Visit).values(visits).on_conflict_do_nothing(
+                    index_elements=[Visit.building_id, Visit.plate_number, Visit.entered_at]
+                )
+            )
+            await self.db_session.commit()
+        except Exception as error:
+            logger.error(f"Couldn't save visits: {error}")
+            await self.db_session.rollback()
+            raise
+
+    async def update_vehicle_attributes(self, updates: List[dict]):
+        """
+        Writes voted vehicle attributes in one executemany. None keeps the
+        stored value, and rows that would not change are not touched.
+        """
+        if not updates:
+            return
+        new_values = {
+            attribute: func.coalesce(bindparam(f"new_{attribute}", type_=String), getattr(Vehicle, attribute))
+            for attribute in ("vehicle_class", "vehicle_type", "vehicle_color")
+        }
+        statement = (
+            update(Vehicle)
+            .where(Vehicle.plate_number == bindparam("target_plate"))
+            .where(or_(*(getattr(Vehicle, attribute).is_distinct_from(value) for attribute, value in new_values.items())))
+            .values(**new_values)
+        )
+        try:
+            connection = await self.db_session.connection()
+            await connection.execute(statement, [
+                {
+                    "target_plate": row["plate_number"],
+                    **{f"new_{attribute}": row[attribute] for attribute in new_values},
+                }
+                for row in updates
+            ])
+            await self.db_session.commit()
+            logger.info(f"Updated attributes of up to {len(updates)} vehicles")
+        except Exception as error:
+            logger.error(f"Couldn't update vehicle attributes: {error}")
+            await self.db_session.rollback()
+            raise
@@ -0,0 +1,99 @@
+import io
+import csv
+import json
+import zlib
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from sqlalchemy.future import select
+
+from settings import settings
+from db.engine import engine
+from traffic.model import Traffic, Vehicle
+from traffic.crud import traffic_scope_filters
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_COLUMNS = (
+    Traffic.id,
+    Traffic.timestamp,
+    Traffic.camera_id,
+    Traffic.source_camera_id,
+    Traffic.vehicle_id,
+    Vehicle.plate_number,
+    Vehicle.vehicle_class,
+    Vehicle.vehicle_type,
+    Vehicle.vehicle_color,
+    Traffic.ocr_accuracy,
+    Traffic.vision_speed,
+)
+EXPORT_FIELDS = [column.name for column in EXPORT_COLUMNS]
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_rows(rows, export_format: str, header: bool) -> bytes:
+    buffer = io.StringIO()
+    if export_format == "csv":
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(EXPORT_FIELDS)
+        writer.writerows([_format_value(value) for value in row] for row in rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps({field: _format_value(value) for field, value in zip(EXPORT_FIELDS, row)}))
+            buffer.write("\n")
+    return buffer.getvalue().encode()
+
+
+async def stream_traffic_export(
+    export_format: str = "csv",
+    compress: bool = False,
+    camera_id: Optional[int] = None,
+    gate_id: Optional[int] = None,
+    building_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Traffic joined with its vehicle, oldest first, as CSV or NDJSON chunks
+    of TRAFFIC_EXPORT_CHUNK_ROWS rows, optionally gzipped.
+
+    Rows come from a server-side cursor on a connection of its own, held
+    only while the response is being sent, so memory stays flat however
+    large the range is.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    query = (
+        select(*EXPORT_COLUMNS)
+        .outerjoin(Vehicle, Traffic.vehicle_id == Vehicle.id)
+        .where(*traffic_scope_filters(camera_id, gate_id, building_id, start, end))
+        .order_by(Traffic.timestamp, Traffic.id)
+        .execution_options(yield_per=settings.TRAFFIC_EXPORT_CHUNK_ROWS)
+    )
+    exported = 0
+    try:
+        async with engine.connect() as connection:
+            result = await connection.stream(query)
+            header = True
+            async for rows in result.partitions():
+                chunk = _encode_rows(rows, export_format, header)
+                header = False
+                exported += len(rows)
+                yield compressor.compress(chunk) if compressor else chunk
+            if header and export_format == "csv":
+                # No rows; still send the header
+                chunk = _encode_rows([], export_format, header)
+                yield compressor.compress(chunk) if compressor else chunk
+    except Exception as error:
+        logger.error(f"Traffic export failed after {exported} rows: {error}")
+        raise
+    if compressor:
+        yield compressor.flush()
+    logger.info(f"Exported {exported} traffic rows")
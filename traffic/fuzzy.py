@@ -0,0 +1,50 @@
+from typing import Dict, Tuple
+
+
+# Characters OCR commonly mistakes for each other, folded onto one symbol so
+# that a misread plate and the stored plate share trigrams. Used verbatim in
+# the trigram index expression, so changing it requires a new index.
+CONFUSABLE_FROM = "odqbilszg"
+CONFUSABLE_TO = "000811526"
+
+# Cost of substituting one character of a confusable pair; any other substitution costs 1
+CONFUSION_COSTS: Dict[Tuple[str, str], float] = {}
+for pair, cost in (
+    ("0o", 0.2), ("0d", 0.4), ("0q", 0.4), ("od", 0.4),
+    ("8b", 0.2), ("1i", 0.2), ("1l", 0.3), ("17", 0.5),
+    ("5s", 0.2), ("2z", 0.3), ("6g", 0.3), ("6b", 0.5), ("38", 0.5), ("58", 0.6),
+):
+    CONFUSION_COSTS[(pair[0], pair[1])] = cost
+    CONFUSION_COSTS[(pair[1], pair[0])] = cost
+
+# Dropped or extra characters are common at the plate edges, so indels cost a little less
+INDEL_COST = 0.8
+
+
+def normalize_plate(plate: str) -> str:
+    return plate.lower().translate(str.maketrans(CONFUSABLE_FROM, CONFUSABLE_TO))
+
+
+def substitution_cost(first: str, second: str) -> float:
+    if first == second:
+        return 0.0
+    return CONFUSION_COSTS.get((first, second), 1.0)
+
+
+def ocr_edit_distance(first: str, second: str) -> float:
+    """
+    Edit distance where swapping characters OCR confuses (8/B, 0/O, ...)
+    is cheap and dropping a character costs INDEL_COST.
+    """
+    first, second = first.lower(), second.lower()
+    previous = [j * INDEL_COST for j in range(len(second) + 1)]
+    for i, first_char in enumerate(first, 1):
+        current = [i * INDEL_COST]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(
+                previous[j] + INDEL_COST,
+                current[j - 1] + INDEL_COST,
+                previous[j - 1] + substitution_cost(first_char, second_char),
+            ))
+        previous = current
+    return previous[-1]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -9,6 +9,12 @@ class Vehicle(Base):
     __tablename__ = "vehicles"
     id = Column(Integer, primary_key=True, index=True)
     plate_number = Column(String, unique=True, index=True)
+    # Components of the plate as reported by the LPR, for structured search
+    plate_first = Column(String, nullable=True, index=True)
+    plate_letter = Column(String, nullable=True, index=True)
+    plate_second = Column(String, nullable=True, index=True)
+    plate_city_code = Column(Integer, nullable=True, index=True)
+    plate_type = Column(String, nullable=True, index=True)
     vehicle_class = Column(String, nullable=True)
     vehicle_type = Column(String, nullable=True)
     vehicle_color = Column(String, nullable=True)
@@ -24,13 +30,70 @@ class Vehicle(Base):
 
 class Traffic(Base):
     __tablename__ = "traffic"
-    id = Column(Integer, primary_key=True, index=True)
-    camera_id = Column(String, index=True)
-    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), index=True)
-    timestamp = Column(DateTime, default=func.now())
+    # Range partitioned on timestamp; partitions are created ahead and dropped
+    # on expiry by traffic/partitions.py, so the key must be part of the PK
+    __table_args__ = (
+        Index("ix_traffic_timestamp_brin", "timestamp", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+    # Lookups by id, camera or vehicle alone use the primary key and the keyset indexes below
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Camera id as reported by the LPR, and the camera it resolved to at ingest
+    source_camera_id = Column(String)
+    camera_id = Column(Integer, ForeignKey("cameras.id", ondelete="SET NULL"), nullable=True)
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"))
+    timestamp = Column(DateTime, primary_key=True, nullable=False, default=func.now())
     ocr_accuracy = Column(Float, nullable=True)
     vision_speed = Column(Float, nullable=True)
 
     vehicle = relationship("Vehicle", back_populates="traffic_entries")
 
 # Vehicle.traffic_entries = relationship("Traffic", back_populates="vehicle")
+
+
+class TrafficHourlyRollup(Base):
+    """
+    Traffic count per camera and hour, kept up to date by ingest. Gate,
+    building and daily figures aggregate these rows.
+    """
+    __tablename__ = "traffic_hourly_rollups"
+    camera_id = Column(Integer, ForeignKey("cameras.id", ondelete="CASCADE"), primary_key=True)
+    hour = Column(DateTime, primary_key=True, index=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class Visit(Base):
+    """
+    A plate's stay in a building, paired from its entrance and exit reads by
+    traffic/visits.py. exited_at is NULL when the exit was never read.
+    Open visits are not stored; ingest keeps them in its journal directory.
+    """
+    __tablename__ = "visits"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    plate_number = Column(String, nullable=False, index=True)
+    building_id = Column(Integer, ForeignKey("buildings.id", ondelete="CASCADE"), nullable=False, index=True)
+    entry_gate_id = Column(Integer, ForeignKey("gates.id", ondelete="SET NULL"), nullable=True)
+    exit_gate_id = Column(Integer, ForeignKey("gates.id", ondelete="SET NULL"), nullable=True)
+    entered_at = Column(DateTime, nullable=False, index=True)
+    exited_at = Column(DateTime, nullable=True)
+    dwell_seconds = Column(Float, nullable=True)
+
+
+class IngestedMessage(Base):
+    """
+    messageIds of stored plates_data messages, so a message that arrives
+    again, live or in a bulk upload, is not stored twice. Expired by
+    traffic/partitions.py after INGESTED_MESSAGE_RETENTION_DAYS.
+    """
+    __tablename__ = "ingested_messages"
+    message_id = Column(String, primary_key=True)
+    ingested_at = Column(DateTime, nullable=False, default=func.now(), index=True)
+
+
+# Keyset pagination walks these newest first; id breaks timestamp ties
+Index("ix_traffic_camera_id_timestamp", Traffic.camera_id, Traffic.timestamp.desc(), Traffic.id.desc())
+Index("ix_traffic_source_camera_id_timestamp", Traffic.source_camera_id, Traffic.timestamp.desc(), Traffic.id.desc())
+Index("ix_traffic_vehicle_id_timestamp", Traffic.vehicle_id, Traffic.timestamp.desc(), Traffic.id.desc())
+Index("ix_traffic_timestamp_id", Traffic.timestamp.desc(), Traffic.id.desc())
+# A visit closed again while ingest replays its journal after a crash is stored once
+Index("ux_visits_building_plate_entered", Visit.building_id, Visit.plate_number, Visit.entered_at, unique=True)
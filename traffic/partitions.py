@@ -0,0 +1,182 @@
+import re
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+
+from settings import settings
+from db.engine import engine
+
+logger = logging.getLogger(__name__)
+
+
+# Only one worker maintains partitions at a time
+PARTITION_LOCK_KEY = 0x545046
+PARTITION_BOUND_PATTERN = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def partition_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "month":
+        return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_partition_start(start: datetime, granularity: str) -> datetime:
+    if granularity == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def parse_bound(value: str) -> Optional[datetime]:
+    """
+    Parses one side of a range partition bound; None for MINVALUE/MAXVALUE.
+    """
+    value = value.strip("'")
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value)
+
+
+async def _traffic_partitions(connection) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """
+    Range partitions of traffic as (name, lower, upper); the default partition is left out.
+    """
+    result = await connection.execute(text(
+        "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+        "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = 'traffic'::regclass"
+    ))
+    partitions = []
+    for name, bound in result.all():
+        match = PARTITION_BOUND_PATTERN.search(bound)
+        if match:
+            partitions.append((name, parse_bound(match.group(1)), parse_bound(match.group(2))))
+    return partitions
+
+
+def _overlaps(start: datetime, end: datetime, partitions) -> bool:
+    for _, lower, upper in partitions:
+        if (lower is None or lower < end) and (upper is None or start < upper):
+            return True
+    return False
+
+
+async def _traffic_columns(connection) -> List[str]:
+    result = await connection.execute(text(
+        "SELECT quote_ident(attname) FROM pg_attribute "
+        "WHERE attrelid = 'traffic'::regclass AND attnum > 0 AND NOT attisdropped ORDER BY attnum"
+    ))
+    return list(result.scalars().all())
+
+
+async def _create_partition(connection, name: str, start: datetime, end: datetime):
+    """
+    Creates one range partition. Rows the default partition caught in that
+    range (late bulk uploads, skewed LPR clocks) would make CREATE ... PARTITION
+    OF fail, so they are moved into a standalone table that is then attached.
+    """
+    bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    in_range = {"start": start, "end": end}
+    # Keeps new rows of the range from landing in the default partition while it is emptied
+    await connection.execute(text("LOCK TABLE traffic_default IN EXCLUSIVE MODE"))
+    stray = await connection.execute(
+        text("SELECT EXISTS (SELECT 1 FROM traffic_default WHERE timestamp >= :start AND timestamp < :end)"),
+        in_range,
+    )
+    if not stray.scalar():
+        await connection.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF traffic {bounds}"))
+        return
+
+    columns = ", ".join(await _traffic_columns(connection))
+    await connection.execute(text(f"CREATE TABLE {name} (LIKE traffic INCLUDING DEFAULTS)"))
+    moved = await connection.execute(
+        text(
+            f"WITH moved AS ("
+            f"DELETE FROM traffic_default WHERE timestamp >= :start AND timestamp < :end RETURNING {columns}"
+            f") INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+        ),
+        in_range,
+    )
+    # The matching CHECK lets ATTACH skip scanning the new partition
+    await connection.execute(text(
+        f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds "
+        f"CHECK (timestamp >= '{start.isoformat()}' AND timestamp < '{end.isoformat()}')"
+    ))
+    await connection.execute(text(f"ALTER TABLE traffic ATTACH PARTITION {name} {bounds}"))
+    await connection.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds"))
+    logger.info(f"Moved {moved.rowcount} rows from traffic_default into {name}")
+
+
+async def maintain_traffic_partitions(now: Optional[datetime] = None):
+    """
+    Creates the traffic partitions for the next TRAFFIC_PARTITIONS_AHEAD
+    periods and drops whole partitions older than TRAFFIC_RETENTION_DAYS,
+    so expiry never runs a DELETE. A default partition catches rows with
+    timestamps outside every partition, e.g. from an LPR with a bad clock.
+    Also forgets messageIds ingested before INGESTED_MESSAGE_RETENTION_DAYS.
+
+    Every step runs in its own transaction, so one partition that cannot be
+    created does not hold back the others or retention.
+    """
+    granularity = settings.TRAFFIC_PARTITION_GRANULARITY
+    now = now or datetime.utcnow()
+    async with engine.connect() as connection:
+        locked = await connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+        await connection.commit()
+        if not locked.scalar():
+            return
+        try:
+            await _maintain_traffic_partitions(connection, granularity, now)
+        finally:
+            await connection.rollback()
+            # The connection goes back to the pool, so drop the session lock explicitly
+            await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PARTITION_LOCK_KEY})
+            await connection.commit()
+
+
+async def _maintain_traffic_partitions(connection, granularity: str, now: datetime):
+    async with connection.begin():
+        await connection.execute(text("CREATE TABLE IF NOT EXISTS traffic_default PARTITION OF traffic DEFAULT"))
+        partitions = await _traffic_partitions(connection)
+
+    start = partition_start(now, granularity)
+    for _ in range(settings.TRAFFIC_PARTITIONS_AHEAD + 1):
+        end = next_partition_start(start, granularity)
+        if not _overlaps(start, end, partitions):
+            name = f"traffic_p{start:%Y%m%d}"
+            try:
+                async with connection.begin():
+                    await _create_partition(connection, name, start, end)
+                partitions.append((name, start, end))
+                logger.info(f"Created traffic partition {name}")
+            except Exception as error:
+                logger.error(f"Couldn't create traffic partition {name}: {error}")
+        start = end
+
+    if settings.TRAFFIC_RETENTION_DAYS > 0:
+        expiry = now - timedelta(days=settings.TRAFFIC_RETENTION_DAYS)
+        for name, _, upper in partitions:
+            if upper is not None and upper <= expiry:
+                try:
+                    async with connection.begin():
+                        await connection.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                    logger.info(f"Dropped expired traffic partition {name}")
+                except Exception as error:
+                    logger.error(f"Couldn't drop expired traffic partition {name}: {error}")
+
+    if settings.INGESTED_MESSAGE_RETENTION_DAYS > 0:
+        async with connection.begin():
+            await connection.execute(
+                text("DELETE FROM ingested_messages WHERE ingested_at < :expiry"),
+                {"expiry": now - timedelta(days=settings.INGESTED_MESSAGE_RETENTION_DAYS)},
+            )
+
+
+async def run_partition_maintenance():
+    while True:
+        await asyncio.sleep(settings.TRAFFIC_PARTITION_MAINTENANCE_INTERVAL)
+        try:
+            await maintain_traffic_partitions()
+        except Exception as error:
+            logger.error(f"Traffic partition maintenance failed: {error}")
@@ -0,0 +1,274 @@
+import os
+import json
+import asyncio
+import logging
+from typing import List, Optional
+from minio.error import S3Error, ServerError
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from urllib3.exceptions import HTTPError
+
+from settings import settings
+from db.engine import async_session
+from tcp.journal import JournalConsumer, event_journal
+from traffic.crud import TrafficOperation, event_timestamp
+from traffic.cameras import camera_directory
+from traffic.attributes import VehicleAttributeVotes
+from traffic.visits import VisitTracker
+from utils.minio_utils import upload_vehicle_full_image, upload_vehicle_plate_image
+
+logger = logging.getLogger(__name__)
+
+
+# S3 error codes of an overloaded or unavailable MinIO rather than a bad request
+TRANSIENT_S3_CODES = {"InternalError", "ServiceUnavailable", "SlowDown", "RequestTimeout", "XMinioServerNotInitialized"}
+
+consumers: List[JournalConsumer] = []
+visits_consumer: Optional[JournalConsumer] = None
+# Journal sequence the last saved visit snapshot covers; segments after it are kept for replay
+visit_snapshot_seq: Optional[int] = None
+maintenance_task = None
+attribute_flush_task = None
+visit_flush_task = None
+vehicle_attribute_votes = VehicleAttributeVotes(
+    min_weight=settings.VEHICLE_ATTRIBUTE_MIN_WEIGHT,
+    max_vehicles=settings.VEHICLE_ATTRIBUTE_MAX_VEHICLES,
+)
+visit_tracker = VisitTracker(
+    reentry_gap=settings.VISIT_REENTRY_GAP,
+    max_dwell=settings.VISIT_MAX_DWELL,
+    recent_size=settings.VISIT_RECENT_MAX,
+)
+
+
+def is_transient_failure(error: Exception) -> bool:
+    """
+    Whether a consumer failed because Postgres or MinIO is unreachable, as
+    opposed to something in the records themselves. The journal consumers
+    retry the former until it recovers instead of dead-lettering reads.
+    """
+    if isinstance(error, S3Error):
+        return error.code in TRANSIENT_S3_CODES
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (
+        OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError,
+        OSError, ServerError, HTTPError,
+    ))
+
+
+async def persist_plate_events(events: List[dict]):
+    async with async_session() as session:
+        stored = await TrafficOperation(session).store_plate_events(events)
+    # Counted only once stored, so a retried batch does not vote twice
+    vehicle_attribute_votes.add(stored)
+
+
+async def flush_vehicle_attributes():
+    updates = vehicle_attribute_votes.pop_updates()
+    if not updates:
+        return
+    try:
+        async with async_session() as session:
+            await TrafficOperation(session).update_vehicle_attributes(updates)
+    except Exception:
+        vehicle_attribute_votes.restore(updates)
+        raise
+
+
+async def _flush_vehicle_attributes_periodically():
+    while True:
+        await asyncio.sleep(settings.VEHICLE_ATTRIBUTE_FLUSH_INTERVAL)
+        try:
+            await flush_vehicle_attributes()
+        except Exception as error:
+            logger.error(f"Vehicle attribute flush failed: {error}")
+
+
+async def track_visits(events: List[dict]):
+    async with async_session() as session:
+        gates = await camera_directory.resolve_gates(session, (event.get("camera_id") for event in events))
+    for event in events:
+        gate = gates.get(event.get("camera_id"))
+        if gate is None:
+            continue
+        timestamp = event_timestamp(event)
+        for car in event.get("cars", []):
+            plate_number = car.get("plate", {}).get("plate")
+            if plate_number:
+                visit_tracker.add(plate_number, gate, timestamp)
+
+
+def _visit_snapshot_path() -> str:
+    return os.path.join(event_journal.directory, "visits.snapshot")
+
+
+def _load_visit_snapshot() -> Optional[dict]:
+    try:
+        with open(_visit_snapshot_path()) as snapshot_file:
+            return json.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+
+
+def _save_visit_snapshot(seq: int, state: dict):
+    global visit_snapshot_seq
+    temp_path = f"{_visit_snapshot_path()}.tmp"
+    with open(temp_path, "w") as snapshot_file:
+        json.dump({"seq": seq, "state": state}, snapshot_file)
+    os.replace(temp_path, _visit_snapshot_path())
+    visit_snapshot_seq = seq
+
+
+async def flush_visits():
+    """
+    Stores the visits closed since the last flush, then saves the open ones
+    together with the visits consumer's offset. After a crash the tracker
+    resumes from that snapshot and the consumer replays the reads after it;
+    visits closed again by the replay are skipped by store_visits.
+    """
+    visit_tracker.expire()
+    # Taken together, before any await lets the consumer move on
+    closed = visit_tracker.pop_closed()
+    state = visit_tracker.snapshot()
+    seq = visits_consumer.committed
+    if closed:
+        try:
+            async with async_session() as session:
+                await TrafficOperation(session).store_visits(closed)
+        except Exception:
+            visit_tracker.restore(closed)
+            raise
+    _save_visit_snapshot(seq, state)
+
+
+async def _flush_visits_periodically():
+    while True:
+        await asyncio.sleep(settings.VISIT_FLUSH_INTERVAL)
+        try:
+            await flush_visits()
+        except Exception as error:
+            logger.error(f"Visit flush failed: {error}")
+
+
+def _upload_images(events: List[dict]):
+    for event in events:
+        message_id = event.get("message_id")
+        if not message_id:
+            continue
+        if settings.MINIO_FULL_IMAGE_BUCKET and event.get("full_image"):
+            upload_vehicle_full_image(event["full_image"], f"{message_id}.jpg", "image/jpeg")
+        if settings.MINIO_PLATE_IMAGE_BUCKET:
+            for index, car in enumerate(event.get("cars", [])):
+                plate_image = car.get("plate", {}).get("plate_image")
+                if plate_image:
+                    upload_vehicle_plate_image(plate_image, f"{message_id}-{index}.jpg", "image/jpeg")
+
+
+async def upload_plate_event_images(events: List[dict]):
+    # Object names derive from the messageId, so retrying a batch overwrites instead of duplicating
+    await asyncio.to_thread(_upload_images, events)
+
+
+async def _maintain_journal():
+    """
+    Periodically fsyncs the journal, rolls an idle segment once it is too
+    old, and deletes segments every consumer has moved past.
+    """
+    while True:
+        await asyncio.sleep(settings.JOURNAL_FSYNC_INTERVAL)
+        try:
+            event_journal.sync()
+            event_journal.roll_if_due()
+            consumed = min(consumer.committed for consumer in consumers)
+            if visit_snapshot_seq is not None:
+                consumed = min(consumed, visit_snapshot_seq)
+            event_journal.remove_segments_through(consumed)
+        except Exception as error:
+            logger.error(f"Event journal maintenance failed: {error}")
+
+
+def journal_status() -> dict:
+    return {
+        "directory": event_journal.directory,
+        "next_seq": event_journal.next_seq,
+        "consumers": [consumer.status() for consumer in consumers],
+    }
+
+
+async def start_persistence():
+    """
+    Opens the event journal of this process and starts the consumers that
+    persist its events to Postgres and MinIO and pair them into visits.
+    """
+    global maintenance_task, attribute_flush_task, visit_flush_task, visits_consumer, visit_snapshot_seq
+    if not settings.JOURNAL_DIR:
+        logger.warning("JOURNAL_DIR is not set, plate reads will not be persisted")
+        return
+
+    event_journal.open()
+    visits_consumer = JournalConsumer(
+        event_journal, "visits", track_visits,
+        batch_size=settings.JOURNAL_CONSUMER_BATCH_SIZE,
+        poll_interval=settings.JOURNAL_CONSUMER_POLL_INTERVAL,
+        retry_delay=settings.JOURNAL_CONSUMER_RETRY_DELAY,
+        max_attempts=settings.JOURNAL_CONSUMER_MAX_ATTEMPTS,
+        is_transient=is_transient_failure,
+    )
+    snapshot = _load_visit_snapshot()
+    if snapshot is not None:
+        visit_tracker.restore_snapshot(snapshot["state"])
+        visits_consumer.rewind(snapshot["seq"])
+        visit_snapshot_seq = snapshot["seq"]
+    consumers.append(JournalConsumer(
+        event_journal, "traffic_db", persist_plate_events,
+        batch_size=settings.JOURNAL_CONSUMER_BATCH_SIZE,
+        poll_interval=settings.JOURNAL_CONSUMER_POLL_INTERVAL,
+        retry_delay=settings.JOURNAL_CONSUMER_RETRY_DELAY,
+        max_attempts=settings.JOURNAL_CONSUMER_MAX_ATTEMPTS,
+        is_transient=is_transient_failure,
+    ))
+    consumers.append(JournalConsumer(
+        event_journal, "images", upload_plate_event_images,
+        batch_size=settings.JOURNAL_CONSUMER_BATCH_SIZE,
+        poll_interval=settings.JOURNAL_CONSUMER_POLL_INTERVAL,
+        retry_delay=settings.JOURNAL_CONSUMER_RETRY_DELAY,
+        max_attempts=settings.JOURNAL_CONSUMER_MAX_ATTEMPTS,
+        is_transient=is_transient_failure,
+    ))
+    consumers.append(visits_consumer)
+    for consumer in consumers:
+        await consumer.start()
+    maintenance_task = asyncio.create_task(_maintain_journal())
+    attribute_flush_task = asyncio.create_task(_flush_vehicle_attributes_periodically())
+    visit_flush_task = asyncio.create_task(_flush_visits_periodically())
+
+
+async def stop_persistence():
+    global maintenance_task, attribute_flush_task, visit_flush_task, visits_consumer, visit_snapshot_seq
+    for background_task in (maintenance_task, attribute_flush_task, visit_flush_task):
+        if background_task is not None:
+            background_task.cancel()
+            try:
+                await background_task
+            except asyncio.CancelledError:
+                pass
+    maintenance_task = None
+    attribute_flush_task = None
+    visit_flush_task = None
+    for consumer in consumers:
+        await consumer.stop()
+    consumers.clear()
+    try:
+        await flush_vehicle_attributes()
+    except Exception as error:
+        logger.error(f"Final vehicle attribute flush failed: {error}")
+    if visits_consumer is not None:
+        try:
+            await flush_visits()
+        except Exception as error:
+            logger.error(f"Final visit flush failed: {error}")
+    visits_consumer = None
+    visit_snapshot_seq = None
+    event_journal.close()
+
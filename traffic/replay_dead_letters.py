@@ -0,0 +1,49 @@
+"""
+Feeds records the journal consumers gave up on back to Postgres and MinIO,
+once whatever made them fail has been fixed.
+
+    python -m traffic.replay_dead_letters --consumer traffic_db
+
+Reads ``deadletter/<consumer>.jsonl`` of every journal under JOURNAL_DIR.
+Records that fail again stay in the file with their new error, so it can be
+rerun; records that were stored in the meantime are skipped by their
+messageId. Visits are not replayed: pairing a read long after the fact
+would open or close the wrong visit.
+"""
+import os
+import glob
+import asyncio
+import argparse
+
+from settings import settings
+from db.engine import engine
+from tcp.journal import dead_letter_path, replay_dead_letters
+from traffic.persistence import persist_plate_events, upload_plate_event_images, flush_vehicle_attributes
+
+
+HANDLERS = {
+    "traffic_db": persist_plate_events,
+    "images": upload_plate_event_images,
+}
+
+
+async def replay(consumer: str, root: str):
+    handler = HANDLERS[consumer]
+    for directory in sorted(glob.glob(os.path.join(root, "journal-*"))):
+        replayed, failed = await replay_dead_letters(dead_letter_path(directory, consumer), handler)
+        if replayed or failed:
+            print(f"[INFO] {directory}: replayed {replayed} dead-lettered '{consumer}' records, {failed} failed again")
+    await flush_vehicle_attributes()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay records a journal consumer moved to its dead-letter file")
+    parser.add_argument("--consumer", choices=sorted(HANDLERS), required=True, help="consumer whose records to replay")
+    parser.add_argument("--journal-dir", default=settings.JOURNAL_DIR or "journal", help="directory holding the journals")
+    args = parser.parse_args()
+    asyncio.run(replay(args.consumer, args.journal_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import asyncio
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from db.engine import async_session, get_db
+from traffic.schema import (
+    AccuracyHistogram, BuildingOccupancy, BulkIngestResult, SpeedDistribution, TrafficHeatmap, TrafficPage, TrafficRollup,
+    VehicleMatch, VehiclePagination, VisitInfo,
+)
+from traffic.crud import TrafficOperation
+from traffic.persistence import journal_status, visit_tracker
+from traffic.bulk import check_upload_cameras, ingest_plate_events, parse_plates_data_upload_in_thread, read_upload
+from traffic.export import EXPORT_MEDIA_TYPES, stream_traffic_export
+from traffic.analytics import accuracy_histogram, analytics_cache, as_array, hour_weekday_heatmap, speed_distribution
+from auth.access_level import get_authenticated_lpr, get_current_active_user
+from lpr.model import DBLpr
+from tcp import ipc
+from user.schema import UserInDB
+
+
+traffic_router = APIRouter(prefix="/v1")
+
+
+@traffic_router.get("/vehicles/search", response_model=VehiclePagination)
+async def api_search_vehicles(
+    first: Optional[str] = None,
+    letter: Optional[str] = None,
+    second: Optional[str] = None,
+    city_code: Optional[int] = None,
+    plate_type: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 10,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    return await TrafficOperation(db).search_vehicles(first, letter, second, city_code, plate_type, page, page_size)
+
+
+@traffic_router.get("/vehicles/fuzzy", response_model=List[VehicleMatch])
+async def api_fuzzy_search_vehicles(
+    plate: str = Query(..., min_length=3),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    return await TrafficOperation(db).fuzzy_search_vehicles(plate, limit)
+
+
+@traffic_router.get("/traffic", response_model=TrafficPage)
+async def api_search_traffic(
+    camera_id: Optional[int] = None,
+    gate_id: Optional[int] = None,
+    building_id: Optional[int] = None,
+    plate: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    return await TrafficOperation(db).search_traffic(camera_id, gate_id, building_id, plate, start, end, cursor, limit)
+
+
+@traffic_router.post("/traffic/bulk", response_model=BulkIngestResult)
+async def api_bulk_ingest_plates_data(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    lpr: DBLpr = Depends(get_authenticated_lpr),
+):
+    """
+    Catch-up upload of plates_data messages an LPR buffered while offline,
+    as NDJSON, gzipped or not. Messages already stored are skipped by
+    messageId, so a failed upload can simply be sent again. Every read must
+    come from a camera on the LPR's own gate.
+    """
+    events = await parse_plates_data_upload_in_thread(await read_upload(request))
+    await check_upload_cameras(db, lpr, events)
+    stored = await ingest_plate_events(db, events)
+    return {"received": len(events), "stored": stored, "duplicates": len(events) - stored}
+
+
+@traffic_router.get("/traffic/export", response_class=StreamingResponse)
+async def api_export_traffic(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    camera_id: Optional[int] = None,
+    gate_id: Optional[int] = None,
+    building_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    filename = f"traffic.{format}.gz" if gzip else f"traffic.{format}"
+    return StreamingResponse(
+        stream_traffic_export(format, gzip, camera_id, gate_id, building_id, start, end),
+        media_type="application/gzip" if gzip else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@traffic_router.get("/traffic/rollups", response_model=List[TrafficRollup])
+async def api_get_traffic_rollups(
+    group_by: str = Query("camera", pattern="^(camera|gate|building)$"),
+    interval: str = Query("hour", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    camera_id: Optional[int] = None,
+    gate_id: Optional[int] = None,
+    building_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    return await TrafficOperation(db).get_traffic_rollups(group_by, interval, start, end, camera_id, gate_id, building_id)
+
+
+async def _traffic_analytics(key, columns, camera_id, gate_id, hours, compute):
+    """
+    Runs ``compute`` on the traffic columns of the last ``hours`` of a camera
+    or gate, or of every camera when neither is given. Results are cached
+    per (kind, scope, window) for TRAFFIC_ANALYTICS_CACHE_TTL seconds.
+
+    Parsing and computing run in a thread, since a long window takes long
+    enough to stall the loop and the Twisted reactor on it. The query has
+    its own session, as it may outlive the request that started it.
+    """
+    async def produce():
+        start = datetime.utcnow() - timedelta(hours=hours)
+        async with async_session() as session:
+            texts = await TrafficOperation(session).get_traffic_columns(columns, camera_id, gate_id, start)
+        return await asyncio.to_thread(lambda: compute(*(as_array(texts[column]) for column in columns)))
+
+    return await analytics_cache.get_or_compute(key, produce)
+
+
+@traffic_router.get("/traffic/analytics/heatmap", response_model=TrafficHeatmap)
+async def api_traffic_heatmap(
+    camera_id: Optional[int] = None,
+    gate_id: Optional[int] = None,
+    hours: int = Query(24 * 7, ge=1, le=24 * 366),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    key = ("heatmap", camera_id, gate_id, hours)
+    return await _traffic_analytics(key, ["timestamp"], camera_id, gate_id, hours, hour_weekday_heatmap)
+
+
+@traffic_router.get("/traffic/analytics/ocr-accuracy", response_model=AccuracyHistogram)
+async def api_traffic_accuracy_histogram(
+    camera_id: Optional[int] = None,
+    gate_id: Optional[int] = None,
+    hours: int = Query(24, ge=1, le=24 * 366),
+    bins: int = Query(20, ge=1, le=200),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    key = ("ocr_accuracy", camera_id, gate_id, hours, bins)
+    return await _traffic_analytics(
+        key, ["ocr_accuracy"], camera_id, gate_id, hours,
+        lambda accuracies: accuracy_histogram(accuracies, bins),
+    )
+
+
+@traffic_router.get("/traffic/analytics/speed", response_model=SpeedDistribution)
+async def api_traffic_speed_distribution(
+    camera_id: Optional[int] = None,
+    gate_id: Optional[int] = None,
+    hours: int = Query(24, ge=1, le=24 * 366),
+    bin_width: float = Query(5.0, gt=0),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    key = ("vision_speed", camera_id, gate_id, hours, bin_width)
+    return await _traffic_analytics(
+        key, ["vision_speed"], camera_id, gate_id, hours,
+        lambda speeds: speed_distribution(speeds, bin_width),
+    )
+
+
+@traffic_router.get("/occupancy", response_model=List[BuildingOccupancy])
+async def api_get_occupancy(
+    building_id: Optional[int] = None,
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    """
+    Vehicles currently inside each building, from the in-memory visit
+    tracker of the process that ingests the LPRs.
+    """
+    if ipc.ingest_client is not None:
+        return await ipc.ingest_client.request("occupancy", {"building_id": building_id})
+    return visit_tracker.occupancy_snapshot(building_id)
+
+
+@traffic_router.get("/visits/recent", response_model=List[VisitInfo])
+async def api_get_recent_visits(
+    building_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    """
+    Most recently closed visits, newest first, from memory.
+    """
+    if ipc.ingest_client is not None:
+        return await ipc.ingest_client.request("recent_visits", {"building_id": building_id, "limit": limit})
+    return visit_tracker.recent_visits(building_id, limit)
+
+
+@traffic_router.get("/journal")
+async def api_get_journal_status(
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    """
+    Offset, lag and dead-lettered record count of every journal consumer.
+    """
+    if ipc.ingest_client is not None:
+        return await ipc.ingest_client.request("journal_status", {})
+    return journal_status()
@@ -0,0 +1,140 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Any, Dict, List, Literal, Optional
+from typing_extensions import NotRequired, TypedDict
+
+from lpr.schema import Pagination
+
+
+class VehicleInDB(BaseModel):
+    id: int
+    plate_number: str
+    plate_first: Optional[str] = None
+    plate_letter: Optional[str] = None
+    plate_second: Optional[str] = None
+    plate_city_code: Optional[int] = None
+    plate_type: Optional[str] = None
+    vehicle_class: Optional[str] = None
+    vehicle_type: Optional[str] = None
+    vehicle_color: Optional[str] = None
+    is_active: bool
+    owner_id: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class VehicleMatch(BaseModel):
+    vehicle: VehicleInDB
+    distance: float
+
+
+class TrafficInDB(BaseModel):
+    id: int
+    camera_id: Optional[int] = None
+    source_camera_id: Optional[str] = None
+    vehicle_id: Optional[int] = None
+    timestamp: datetime
+    ocr_accuracy: Optional[float] = None
+    vision_speed: Optional[float] = None
+    vehicle: Optional[VehicleInDB] = None
+
+    class Config:
+        from_attributes = True
+
+
+class TrafficPage(BaseModel):
+    items: List[TrafficInDB]
+    # Pass back as ``cursor`` for the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+
+class TrafficRollup(BaseModel):
+    # Camera, gate or building id, depending on group_by
+    key: int
+    bucket: datetime
+    count: int
+
+
+class TrafficHeatmap(BaseModel):
+    total: int
+    # Rows are weekdays from Monday, columns hours of the day
+    counts: List[List[int]]
+
+
+class AccuracyHistogram(BaseModel):
+    total: int
+    mean: Optional[float] = None
+    edges: List[float]
+    counts: List[int]
+
+
+class SpeedDistribution(BaseModel):
+    total: int
+    mean: Optional[float] = None
+    max: Optional[float] = None
+    percentiles: Dict[str, float]
+    bin_width: float
+    # counts[i] is the number of reads in [i * bin_width, (i + 1) * bin_width)
+    counts: List[int]
+
+
+class BuildingOccupancy(BaseModel):
+    building_id: int
+    occupancy: int
+
+
+class VisitInfo(BaseModel):
+    plate_number: str
+    building_id: int
+    entry_gate_id: Optional[int] = None
+    exit_gate_id: Optional[int] = None
+    entered_at: datetime
+    # None when the exit was never read
+    exited_at: Optional[datetime] = None
+    dwell_seconds: Optional[float] = None
+
+
+class BulkIngestResult(BaseModel):
+    received: int
+    stored: int
+    duplicates: int
+
+
+# Shape of a plates_data message in a bulk upload. TypedDicts validate
+# straight into the dicts TrafficOperation.store_plate_events takes.
+PlateComponents = TypedDict("PlateComponents", {
+    "plate": str,
+    "first": NotRequired[Optional[str]],
+    "letter": NotRequired[Optional[str]],
+    "second": NotRequired[Optional[str]],
+    "city_code": NotRequired[Optional[int]],
+    "plate_type": NotRequired[Optional[str]],
+})
+VehicleAttributeRead = TypedDict("VehicleAttributeRead", {
+    "class": NotRequired[Any],
+    "conf": NotRequired[Optional[float]],
+})
+PlateReadCar = TypedDict("PlateReadCar", {
+    "plate": PlateComponents,
+    "ocr_accuracy": NotRequired[Optional[float]],
+    "vision_speed": NotRequired[Optional[float]],
+    "vehicle_class": NotRequired[VehicleAttributeRead],
+    "vehicle_type": NotRequired[VehicleAttributeRead],
+    "vehicle_color": NotRequired[VehicleAttributeRead],
+})
+PlatesDataBody = TypedDict("PlatesDataBody", {
+    "camera_id": str,
+    "timestamp": datetime,
+    "cars": List[PlateReadCar],
+})
+PlatesDataMessage = TypedDict("PlatesDataMessage", {
+    "messageId": str,
+    "messageType": Literal["plates_data"],
+    "messageBody": PlatesDataBody,
+})
+
+
+VehiclePagination = Pagination[VehicleInDB]
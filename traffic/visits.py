@@ -0,0 +1,193 @@
+import logging
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from lpr.model import GateType
+from traffic.cameras import CameraGate
+
+logger = logging.getLogger(__name__)
+
+
+class OpenVisit:
+    __slots__ = ("plate_number", "building_id", "entry_gate_id", "entered_at", "last_seen")
+
+    def __init__(self, plate_number: str, building_id: int, entry_gate_id: Optional[int], entered_at: datetime):
+        self.plate_number = plate_number
+        self.building_id = building_id
+        self.entry_gate_id = entry_gate_id
+        self.entered_at = entered_at
+        self.last_seen = entered_at
+
+    def as_row(self) -> dict:
+        return {
+            "plate_number": self.plate_number,
+            "building_id": self.building_id,
+            "entry_gate_id": self.entry_gate_id,
+            "exit_gate_id": None,
+            "entered_at": self.entered_at,
+            "exited_at": None,
+            "dwell_seconds": None,
+        }
+
+
+class VisitTracker:
+    """
+    Pairs the entrance and exit reads of each plate per building into
+    visits, incrementally as reads arrive, and keeps the number of open
+    visits of every building as its live occupancy.
+
+    An LPR reads a passing car many times, so reads of a plate within
+    ``reentry_gap`` seconds of its last read belong to the same pass. At a
+    gate of type BOTH a new pass toggles the visit: it enters when outside
+    and exits when inside. A new pass through an ENTRANCE while a visit is
+    open means the exit was missed; the old visit is closed without an
+    exit time. Visits not seen for ``max_dwell`` seconds are closed the
+    same way by ``expire``. Time is the LPRs' clock, not this process's.
+    Further reads of the pass that closed a visit are remembered in
+    ``exited`` and ignored, so they do not open it again.
+
+    Closed visits wait in ``closed`` until ``pop_closed`` hands them out
+    for persistence in one batch. ``snapshot`` and ``restore_snapshot``
+    carry the rest of the state across a restart.
+    """
+
+    def __init__(self, reentry_gap: float, max_dwell: float, recent_size: int):
+        self.reentry_gap = timedelta(seconds=reentry_gap)
+        self.max_dwell = timedelta(seconds=max_dwell)
+        self.open: Dict[Tuple[int, str], OpenVisit] = {}
+        self.occupancy: Counter = Counter()
+        self.closed: List[dict] = []
+        self.recent = deque(maxlen=recent_size)
+        # (building, plate) -> (gate id, last read) of the pass that closed the visit
+        self.exited: Dict[Tuple[int, str], Tuple[int, datetime]] = {}
+        self.latest: Optional[datetime] = None
+
+    def _open(self, plate_number: str, gate: CameraGate, timestamp: datetime):
+        self.open[(gate.building_id, plate_number)] = OpenVisit(plate_number, gate.building_id, gate.gate_id, timestamp)
+        self.occupancy[gate.building_id] += 1
+
+    def _close(self, visit: OpenVisit, exit_gate_id: Optional[int], exited_at: Optional[datetime]):
+        del self.open[(visit.building_id, visit.plate_number)]
+        self.occupancy[visit.building_id] -= 1
+        if not self.occupancy[visit.building_id]:
+            del self.occupancy[visit.building_id]
+        row = visit.as_row()
+        if exited_at is not None:
+            row.update(
+                exit_gate_id=exit_gate_id,
+                exited_at=exited_at,
+                dwell_seconds=(exited_at - visit.entered_at).total_seconds(),
+            )
+        self.closed.append(row)
+        self.recent.append(row)
+        if exited_at is not None:
+            self.exited[(visit.building_id, visit.plate_number)] = (exit_gate_id, exited_at)
+
+    def _is_exit_pass(self, key: Tuple[int, str], gate: CameraGate, timestamp: datetime) -> bool:
+        exit_pass = self.exited.get(key)
+        if exit_pass is None:
+            return False
+        gate_id, last_seen = exit_pass
+        if gate_id != gate.gate_id or timestamp - last_seen > self.reentry_gap:
+            del self.exited[key]
+            return False
+        if timestamp > last_seen:
+            self.exited[key] = (gate_id, timestamp)
+        return True
+
+    def add(self, plate_number: str, gate: CameraGate, timestamp: datetime):
+        if self.latest is None or timestamp > self.latest:
+            self.latest = timestamp
+        key = (gate.building_id, plate_number)
+        visit = self.open.get(key)
+        if visit is None:
+            if self._is_exit_pass(key, gate, timestamp):
+                return
+            if gate.gate_type is not GateType.EXIT:
+                self._open(plate_number, gate, timestamp)
+            return
+        if timestamp < visit.last_seen:
+            # Late read of a pass already counted
+            return
+        new_pass = timestamp - visit.last_seen > self.reentry_gap
+        if gate.gate_type is GateType.EXIT or (gate.gate_type is GateType.BOTH and new_pass):
+            self._close(visit, gate.gate_id, timestamp)
+        elif gate.gate_type is GateType.ENTRANCE and new_pass:
+            self._close(visit, None, None)
+            self._open(plate_number, gate, timestamp)
+        else:
+            visit.last_seen = timestamp
+
+    def expire(self):
+        """
+        Closes visits without an exit once nothing was read of them for max_dwell.
+        """
+        if self.latest is None:
+            return
+        cutoff = self.latest - self.max_dwell
+        for visit in [visit for visit in self.open.values() if visit.last_seen < cutoff]:
+            self._close(visit, None, None)
+        exited_cutoff = self.latest - self.reentry_gap
+        self.exited = {key: exit_pass for key, exit_pass in self.exited.items() if exit_pass[1] >= exited_cutoff}
+
+    def pop_closed(self) -> List[dict]:
+        closed, self.closed = self.closed, []
+        return closed
+
+    def restore(self, closed: List[dict]):
+        """
+        Puts back closed visits whose persistence failed, ahead of newer ones.
+        """
+        self.closed = closed + self.closed
+
+    def snapshot(self) -> dict:
+        """
+        Open visits, exit passes and the latest read time as plain JSON.
+        """
+        return {
+            "latest": self.latest.isoformat() if self.latest else None,
+            "open": [
+                [visit.plate_number, visit.building_id, visit.entry_gate_id,
+                 visit.entered_at.isoformat(), visit.last_seen.isoformat()]
+                for visit in self.open.values()
+            ],
+            "exited": [
+                [building_id, plate_number, gate_id, last_seen.isoformat()]
+                for (building_id, plate_number), (gate_id, last_seen) in self.exited.items()
+            ],
+        }
+
+    def restore_snapshot(self, snapshot: dict):
+        """
+        Resumes from a ``snapshot`` taken by an earlier process.
+        """
+        self.latest = datetime.fromisoformat(snapshot["latest"]) if snapshot.get("latest") else None
+        self.open.clear()
+        self.occupancy.clear()
+        for plate_number, building_id, entry_gate_id, entered_at, last_seen in snapshot.get("open", []):
+            visit = OpenVisit(plate_number, building_id, entry_gate_id, datetime.fromisoformat(entered_at))
+            visit.last_seen = datetime.fromisoformat(last_seen)
+            self.open[(building_id, plate_number)] = visit
+            self.occupancy[building_id] += 1
+        self.exited = {
+            (building_id, plate_number): (gate_id, datetime.fromisoformat(last_seen))
+            for building_id, plate_number, gate_id, last_seen in snapshot.get("exited", [])
+        }
+        logger.info(f"Restored {len(self.open)} open visits")
+
+    def occupancy_snapshot(self, building_id: Optional[int] = None) -> List[dict]:
+        return [
+            {"building_id": building, "occupancy": count}
+            for building, count in sorted(self.occupancy.items())
+            if building_id is None or building == building_id
+        ]
+
+    def recent_visits(self, building_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+        visits = []
+        for row in reversed(self.recent):
+            if building_id is None or row["building_id"] == building_id:
+                visits.append(row)
+                if len(visits) >= limit:
+                    break
+        return visits
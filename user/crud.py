@@ -12,6 +12,7 @@ from user.validator import validate_image_size, validate_image_extension, valida
 from auth.access_level import get_user
 from auth.auth import get_password_hash
 from utils.minio_utils import upload_profile_image, delete_profile_image
+from db.listener import ACCESS_CHANGES_CHANNEL, notify_channel
 
 logger = logging.getLogger(__name__)
 
@@ -96,6 +97,7 @@ class UserOperation:
                     setattr(db_user, key, value)
 
                 self.db_session.add(db_user)
+                await notify_channel(self.db_session, ACCESS_CHANGES_CHANNEL, f"user:{user_id}")
                 await self.db_session.commit()
                 await self.db_session.refresh(db_user)
                 return db_user
@@ -113,6 +115,7 @@ class UserOperation:
             db_user = await self.get_user(user_id)
             try:
                 db_user = await self.db_session.merge(db_user)
+                await notify_channel(self.db_session, ACCESS_CHANGES_CHANNEL, f"user:{user_id}")
                 await self.db_session.delete(db_user)
                 await self.db_session.commit()
                 return db_user
@@ -133,6 +136,7 @@ class UserOperation:
             try:
                 user = await self.db_session.merge(user)
                 user.is_active = not user.is_active
+                await notify_channel(self.db_session, ACCESS_CHANGES_CHANNEL, f"user:{user_id}")
                 await self.db_session.commit()
                 await self.db_session.refresh(user)
                 return user
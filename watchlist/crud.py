@@ -0,0 +1,69 @@
+import logging
+from fastapi import HTTPException, status
+from sqlalchemy.future import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.listener import notify_channel
+from watchlist.model import DBWatchlistEntry
+from watchlist.schema import WatchlistEntryCreate, WatchlistEntryUpdate
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel the plate matchers listen on to reload the watchlist
+WATCHLIST_CHANGES_CHANNEL = "watchlist_changes"
+
+
+class WatchlistOperation:
+    def __init__(self, db_session: AsyncSession) -> None:
+        self.db_session = db_session
+
+    async def get_entry(self, entry_id: int):
+        query = await self.db_session.execute(select(DBWatchlistEntry).where(DBWatchlistEntry.id == entry_id))
+        entry = query.scalar_one_or_none()
+        if entry is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "Watchlist entry not found")
+        return entry
+
+    async def get_entries(self, active_only: bool = False):
+        query = select(DBWatchlistEntry).order_by(DBWatchlistEntry.id)
+        if active_only:
+            query = query.where(DBWatchlistEntry.is_active.is_(True))
+        result = await self.db_session.execute(query)
+        return result.scalars().all()
+
+    async def _commit_change(self, entry: DBWatchlistEntry):
+        try:
+            await self.db_session.flush()
+            # Delivered to the matchers only if the change commits
+            await notify_channel(self.db_session, WATCHLIST_CHANGES_CHANNEL, entry.id)
+            await self.db_session.commit()
+        except IntegrityError:
+            await self.db_session.rollback()
+            raise HTTPException(status.HTTP_409_CONFLICT, "Plate is already on the watchlist")
+        except SQLAlchemyError as error:
+            await self.db_session.rollback()
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(error))
+
+    async def create_entry(self, entry: WatchlistEntryCreate):
+        db_entry = DBWatchlistEntry(**entry.dict())
+        self.db_session.add(db_entry)
+        await self._commit_change(db_entry)
+        await self.db_session.refresh(db_entry)
+        logger.info(f"Added plate {db_entry.plate_number} to the watchlist")
+        return db_entry
+
+    async def update_entry(self, entry_id: int, entry: WatchlistEntryUpdate):
+        db_entry = await self.get_entry(entry_id)
+        for key, value in entry.dict(exclude_unset=True).items():
+            setattr(db_entry, key, value)
+        await self._commit_change(db_entry)
+        await self.db_session.refresh(db_entry)
+        return db_entry
+
+    async def delete_entry(self, entry_id: int):
+        db_entry = await self.get_entry(entry_id)
+        await self.db_session.delete(db_entry)
+        await self._commit_change(db_entry)
+        logger.info(f"Removed plate {db_entry.plate_number} from the watchlist")
+        return db_entry
@@ -0,0 +1,64 @@
+import logging
+from typing import Dict, List
+
+from db.engine import async_session
+from db.listener import db_listener
+from traffic.fuzzy import normalize_plate
+from watchlist.crud import WATCHLIST_CHANGES_CHANNEL, WatchlistOperation
+
+logger = logging.getLogger(__name__)
+
+
+class WatchlistMatcher:
+    """
+    In-memory copy of the active watchlist, keyed by the OCR-folded plate
+    (traffic.fuzzy.normalize_plate) so 0/O or 8/B misreads still match.
+
+    Checking a read is a dict lookup per car, so it runs inline on every
+    plates_data message without touching the database. The copy is rebuilt
+    whenever a watchlist change is notified, and after the listener
+    reconnects since notifications may have been missed meanwhile.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, dict] = {}
+
+    async def reload(self, payload=None):
+        try:
+            async with async_session() as session:
+                entries = await WatchlistOperation(session).get_entries(active_only=True)
+        except Exception as error:
+            # Keep matching against the previous copy
+            logger.error(f"Couldn't reload the watchlist: {error}")
+            return
+        # Swapped in one assignment, so matching never sees a half-built dict
+        self.entries = {
+            normalize_plate(entry.plate_number): {
+                "watchlist_id": entry.id,
+                "plate_number": entry.plate_number,
+                "reason": entry.reason,
+                "description": entry.description,
+            }
+            for entry in entries
+        }
+        logger.info(f"Loaded {len(self.entries)} watchlist entries")
+
+    def match(self, cars: List[dict]) -> List[dict]:
+        """
+        Watchlist entries hit by the cars of one read, with the plate as read.
+        """
+        if not self.entries:
+            return []
+        matches = []
+        for car in cars:
+            read_plate = car.get("plate", {}).get("plate")
+            if not read_plate:
+                continue
+            entry = self.entries.get(normalize_plate(read_plate))
+            if entry is not None:
+                matches.append({**entry, "read_plate": read_plate, "ocr_accuracy": car.get("ocr_accuracy")})
+        return matches
+
+
+watchlist_matcher = WatchlistMatcher()
+db_listener.subscribe(WATCHLIST_CHANGES_CHANNEL, watchlist_matcher.reload, on_reconnect=watchlist_matcher.reload)
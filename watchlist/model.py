@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, func
+
+from db.engine import Base
+
+
+class DBWatchlistEntry(Base):
+    __tablename__ = "watchlist"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    plate_number = Column(String, unique=True, index=True, nullable=False)
+    # e.g. "stolen" or "banned"
+    reason = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    is_active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=func.now())
+    updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
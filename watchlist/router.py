@@ -0,0 +1,57 @@
+from typing import List
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.engine import get_db
+from watchlist.crud import WatchlistOperation
+from watchlist.schema import WatchlistEntryCreate, WatchlistEntryInDB, WatchlistEntryUpdate
+from auth.access_level import get_admin_or_staff_user, get_current_active_user
+from user.schema import UserInDB
+
+
+watchlist_router = APIRouter(prefix="/v1")
+
+
+@watchlist_router.get("/watchlist", response_model=List[WatchlistEntryInDB])
+async def api_get_watchlist(
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    return await WatchlistOperation(db).get_entries()
+
+
+@watchlist_router.get("/watchlist/{entry_id}", response_model=WatchlistEntryInDB)
+async def api_get_watchlist_entry(
+    entry_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_active_user),
+):
+    return await WatchlistOperation(db).get_entry(entry_id)
+
+
+@watchlist_router.post("/watchlist", response_model=WatchlistEntryInDB, status_code=status.HTTP_201_CREATED)
+async def api_create_watchlist_entry(
+    entry: WatchlistEntryCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_admin_or_staff_user),
+):
+    return await WatchlistOperation(db).create_entry(entry)
+
+
+@watchlist_router.put("/watchlist/{entry_id}", response_model=WatchlistEntryInDB)
+async def api_update_watchlist_entry(
+    entry_id: int,
+    entry: WatchlistEntryUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_admin_or_staff_user),
+):
+    return await WatchlistOperation(db).update_entry(entry_id, entry)
+
+
+@watchlist_router.delete("/watchlist/{entry_id}", response_model=WatchlistEntryInDB)
+async def api_delete_watchlist_entry(
+    entry_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_admin_or_staff_user),
+):
+    return await WatchlistOperation(db).delete_entry(entry_id)
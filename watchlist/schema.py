@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class WatchlistEntryBase(BaseModel):
+    plate_number: str
+    reason: str
+    description: Optional[str] = None
+    is_active: bool = True
+
+
+class WatchlistEntryCreate(WatchlistEntryBase):
+    pass
+
+
+class WatchlistEntryUpdate(BaseModel):
+    plate_number: Optional[str] = None
+    reason: Optional[str] = None
+    description: Optional[str] = None
+    is_active: Optional[bool] = None
+
+
+class WatchlistEntryInDB(WatchlistEntryBase):
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True